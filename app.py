@@ -172,7 +172,12 @@ def main(args_paths):
 
     wiki_index = index.WikiIndex(args_paths)
 
-    if wiki_index.openOrBuild():
+    if args_paths.update:
+        ready = wiki_index.update(args_paths.update, args_paths.deleted)
+    else:
+        ready = wiki_index.openOrBuild()
+
+    if ready:
         main = MainWindow(wiki_index)
         main.show()
         sys.exit(app.exec_())
@@ -185,12 +190,12 @@ if __name__ == '__main__':
         '--index_dir',
         type=str,
         default='files/indexdir',
-        help='Folder indice whoosh.')
+        help='Folder indice whoosh: contiene una generazione per ogni build e il file CURRENT con quella in uso.')
     p.add_argument(
         '--corpus',
         type=str,
         default='files/filtered.xml',
-        help='File xml filtrato.')
+        help='File xml filtrato. Può essere anche un dump compresso (.bz2, .gz, .zst).')
     p.add_argument(
         '--google_links',
         type=str,
@@ -199,13 +204,138 @@ if __name__ == '__main__':
     p.add_argument(
         '--interwiki_links',
         type=str,
-        default='files/interwiki.prefix',
-        help='File per gli interwiki links.')
+        default='files/prefixes.json',
+        help='Snapshot json dei prefissi dei link (interwiki e namespace), o vecchio file pickle degli interwiki.')
     p.add_argument(
         '--pagerank',
         type=str,
         default='files/table.rank',
-        help='File dove salvo il pagerank calcolato')
+        help='File dove salvo il pagerank calcolato (solo il nome viene usato, il file è salvato nella '
+             'generazione dell\'indice)')
+    p.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Processi usati per filtrare il testo delle pagine durante la creazione dell\'indice.')
+    p.add_argument(
+        '--queue_depth',
+        type=int,
+        default=256,
+        help='Numero massimo di pagine lette ma non ancora indicizzate (usato se workers > 1).')
+
+    p.add_argument(
+        '--multistream_index',
+        type=str,
+        default=None,
+        help='File indice (offset:id:titolo) del dump multistream. Se specificato, il corpus '\
+             'viene letto in parallelo da \'workers\' processi.')
+    p.add_argument(
+        '--checkpoint_pages',
+        type=int,
+        default=0,
+        help='Durante la creazione dell\'indice esegue un checkpoint ogni n pagine (0 = disabilitato).')
+    p.add_argument(
+        '--checkpoint_minutes',
+        type=float,
+        default=0,
+        help='Durante la creazione dell\'indice esegue un checkpoint ogni n minuti (0 = disabilitato).')
+    p.add_argument(
+        '--resume',
+        action='store_true',
+        help='Riprende la creazione dell\'indice dall\'ultimo checkpoint.')
+    p.add_argument(
+        '--procs',
+        type=int,
+        default=0,
+        help='Processi del writer dell\'indice (0 = scelti in base a core, memoria e corpus).')
+    p.add_argument(
+        '--limitmb',
+        type=int,
+        default=0,
+        help='MB di memoria per ogni processo del writer (0 = scelti in base alla memoria disponibile).')
+    p.add_argument(
+        '--merge',
+        type=str,
+        default='auto',
+        choices=['auto', 'merge', 'multisegment', 'optimize'],
+        help='Strategia dei segmenti: merge ad ogni commit, un segmento per processo, oppure un segmento '
+             'per processo e merge finale (auto = scelta in base al corpus).')
+    p.add_argument(
+        '--update',
+        type=str,
+        default=None,
+        help='Dump delle pagine modificate (es: adds-changes giornaliero) con cui aggiornare l\'indice '
+             'esistente invece di ricrearlo.')
+    p.add_argument(
+        '--deleted',
+        type=str,
+        default=None,
+        help='File con gli id delle pagine eliminate (uno per riga), usato con --update.')
+    p.add_argument(
+        '--stats_interval',
+        type=float,
+        default=10,
+        help='Secondi tra una riga e l\'altra delle statistiche di creazione dell\'indice (build_stats.jsonl).')
+    p.add_argument(
+        '--cleaner',
+        type=str,
+        default='scanner',
+        choices=['scanner', 'regex'],
+        help='Pulizia del testo: \'scanner\' (lineare, rimuove template e blocchi annidati) oppure '
+             '\'regex\' (stesso risultato delle sostituzioni originali).')
+    p.add_argument(
+        '--clean_budget',
+        type=float,
+        default=0.5,
+        help='Secondi a disposizione per la pulizia di una pagina con lo scanner, oltre i quali viene '
+             'fatta una pulizia più semplice (0 = senza limite).')
+    p.add_argument(
+        '--strip',
+        type=str,
+        default='',
+        help='Parti ripetitive da rimuovere interamente dal testo con lo scanner, separate da virgola '
+             '(infobox,navbox,table,citation). Di default non viene rimosso niente. Non disponibile '
+             'con --cleaner regex.')
+    p.add_argument(
+        '--parsed_store',
+        type=str,
+        default=None,
+        help='File delle pagine filtrate: se esiste l\'indice viene creato da questo file senza rileggere '
+             'il dump, altrimenti viene scritto durante la lettura del dump. Non viene usato con '
+             '--multistream_index.')
+    p.add_argument(
+        '--redirects',
+        type=str,
+        default='files/redirects.tsv',
+        help='File dove vengono salvati i redirect letti dal dump, usati per risolvere i link del grafo '
+             'del pagerank. Viene salvato nella cartella di ogni generazione dell\'indice con lo stesso nome.')
+    p.add_argument(
+        '--bigrams',
+        action='store_true',
+        help='Crea l\'indice con il campo dei bigrammi del testo, usato per le query di più parole e '
+             'le frasi tra virgolette (il testo non ha le posizioni).')
+    p.add_argument(
+        '--stem_table',
+        type=str,
+        default='files/stems.table',
+        help='Tabella forma -> stem condivisa dagli analizzatori (python -m indexing.analysis.formTable). '
+             'Se non esiste lo stemming usa solo una cache LRU.')
+    p.add_argument(
+        '--lemma_table',
+        type=str,
+        default='files/lemmas.table',
+        help='Tabella forma -> lemma condivisa dagli analizzatori (python -m indexing.analysis.formTable '
+             '--kind lemma). Se non esiste la lemmatizzazione usa solo una cache LRU.')
+    p.add_argument(
+        '--cache_size',
+        type=int,
+        default=256,
+        help='Numero massimo di risultati delle query nella cache (0 = cache disabilitata).')
+    p.add_argument(
+        '--cache_ttl',
+        type=float,
+        default=300,
+        help='Secondi dopo i quali un risultato nella cache scade (0 = nessuna scadenza).')
 
     args_paths = p.parse_args()   
 
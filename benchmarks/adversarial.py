@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark della pulizia del testo su pagine costruite per far esplodere il backtracking delle regex
+(template, gallery, link a file e link esterni non chiusi, annidamenti profondi, parole lunghe).
+
+Per ogni pagina misuro il tempo di:
+    legacy  : FilterWikiText.getCleanedLegacy (22 re.sub originali)
+    regex   : FilterWikiText.getCleaned (stesso risultato di legacy)
+    scanner : FilterWikiText.getCleanedScanner (stripMarkup lineare, con e senza budget)
+Viene anche misurato il throughput sulle pagine normali del file indicato.
+
+Uso:  python -m benchmarks.adversarial --size 5000 --budget 0.05
+"""
+
+import argparse
+import time
+
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+
+def adversarialPages(size):
+    """
+    Pagine patologiche, ognuna formata da circa 'size' ripetizioni di un frammento.
+
+    :param size: numero di ripetizioni
+    return dict nome -> testo
+    """
+    return {'template_unclosed': '{{cite web |url=a ' * size,
+            'template_nested': '{{coord|' * size + 'x' + '}}' * size,
+            'template_unbalanced': '{{lang|x}} }} {{lang|y ' * size,
+            'gallery_unclosed': '<gallery>A.jpg\n' * size,
+            'file_unclosed': '[[File:a.jpg|thumb|' * size,
+            'file_nested': '[[File:a.jpg|' + '[[link]] ' * size + ']]',
+            'http_unclosed': '[http://example ' * size,
+            'ref_unclosed': '<ref name="x">{{cite|url=y}} ' * size,
+            'domain_words': ' ' + 'a.com.org.it.en' * size + ' ',
+            'tags_unclosed': '<div class="x" ' * size,
+            }
+
+
+def timeClean(clean, text):
+    """
+    :param clean: funzione di pulizia
+    :param text: testo da pulire
+    return secondi impiegati
+    """
+    start = time.perf_counter()
+    clean(text)
+    return time.perf_counter() - start
+
+
+def main(args):
+    cleaners = [('legacy', FilterWikiText.getCleanedLegacy),
+                ('regex', FilterWikiText.getCleaned),
+                ('scanner', lambda text: FilterWikiText.getCleanedScanner(text)),
+                ('budget', lambda text: FilterWikiText.getCleanedScanner(text, args.budget)),
+                ]
+    pages = adversarialPages(args.size)
+
+    print('{:<20} {:>8}'.format('page', 'KB') + ''.join('{:>10}'.format(name) for name, _ in cleaners))
+    worst = dict((name, 0.0) for name, _ in cleaners)
+    for page_name, text in pages.items():
+        row = '{:<20} {:>8.1f}'.format(page_name, len(text) / 1024)
+        for name, clean in cleaners:
+            seconds = timeClean(clean, text)
+            worst[name] = max(worst[name], seconds)
+            row += '{:>10.4f}'.format(seconds)
+        print(row)
+    print('{:<29}'.format('max') + ''.join('{:>10.4f}'.format(worst[name]) for name, _ in cleaners))
+
+    texts = [page.text for page in saxReader.iterPages(args.source, valid_only=True)]
+    total_mb = sum(len(text.encode('utf-8')) for text in texts) * args.repeat / 2**20
+    print('\nThroughput su '+args.source+' :')
+    for name, clean in cleaners:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                clean(text)
+        print('{:<10} {:>8.2f} MB/s'.format(name, total_mb / (time.perf_counter() - start)))
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Tempo di pulizia di pagine patologiche.')
+    p.add_argument(
+        '--size',
+        type=int,
+        default=5000,
+        help='Ripetizioni del frammento di ogni pagina patologica.')
+    p.add_argument(
+        '--budget',
+        type=float,
+        default=0.05,
+        help='Secondi a disposizione per lo scanner nella colonna \'budget\'.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml con pagine normali per la misura del throughput.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte pulire ogni pagina normale.')
+
+    main(p.parse_args())
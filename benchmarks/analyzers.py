@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Costo ed efficacia degli analizzatori di indexing/analysis/analyzers.py sul campo 'text'.
+
+Le pagine del file vengono filtrate una volta; con '--scale n' il corpus viene ingrandito
+aggiungendo n-1 copie di ogni pagina con id (numerici, come richiesto dal file del testo) e titolo
+diversi (le copie non sono mai rilevanti per l'evaluation). Per ogni analizzatore viene creato, in
+un processo separato, un indice con lo schema di WikiIndex e il campo 'text' analizzato con
+quell'analizzatore, e viene misurato:
+    tokens/s   : token prodotti al secondo dal solo analizzatore
+    pages/s    : pagine indicizzate al secondo (add_document e commit)
+    peak MB    : memoria di picco del processo durante la build, oltre a quella delle pagine
+    index MB   : dimensione dei segmenti dell'indice
+    postings   : numero di coppie (termine, documento) del campo 'text'
+    ms/query   : tempo medio delle query dell'evaluation (chiavi di files/google_links.json)
+    MAP        : Mean Average Precision dell'Evaluator, senza query expansion e pagerank
+
+I risultati vengono scritti in un file json ('--dest') per confrontare versioni diverse:
+
+    {"label": ..., "date": ..., "source": ..., "pages": ..., "scale": ..., "settings": {...},
+     "columns": [...], "rows": [[...], ...]}
+
+Uso:  python -m benchmarks.analyzers --source files/filtered.xml --scale 4 --dest bench_analyzers.json
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import os
+import pickle
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from whoosh.fields import TEXT
+
+from indexing import textStore
+from indexing.analysis import analyzers
+from indexing.evaluation import Evaluator
+from indexing.index import WikiIndex, setFormTables
+from indexing.searching.searcher import WikiSearcher
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+from .common import BenchIndex, buildIndex, dirSize, writeTextStore
+
+ANALYZERS = {'simple': analyzers.SimpleAnalyzer_,
+             'standard': analyzers.StandardAnalyzer_,
+             'stemming': analyzers.StemmingAnalyzer_,
+             'bulk_stemming': analyzers.BulkStemmingAnalyzer_,
+             'accent_stemming': analyzers.AccentStemmingAnalyzer,
+             'lemmatizing': analyzers.LemmatizingAnalyzer,
+             }
+
+COLUMNS = ['analyzer', 'tokens', 'tokens_s', 'pages_s', 'peak_mb', 'index_mb', 'postings', 'ms_query', 'map']
+
+
+def maxRss():
+    """
+    return memoria di picco del processo in MB
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+def readPages(args):
+    """
+    :param args: argomenti (source, interwiki_links, limit, scale)
+    return lista di dict ritornati da FilterWikiText.filterPage (con le copie se scale > 1)
+    """
+    wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0)
+    pages = []
+    for n, page in enumerate(saxReader.iterPages(args.source, valid_only=True)):
+        if args.limit is not None and n >= args.limit:
+            break
+        pages.append(wiki_filter.filterPage(page.title, page.id, page.text))
+
+    scaled = list(pages)
+    id_step = max([int(data_parsed['id']) for data_parsed in pages], default=0) + 1
+    for copy_n in range(1, max(1, args.scale)):
+        for data_parsed in pages:
+            scaled.append(dict(data_parsed, id=str(int(data_parsed['id']) + copy_n * id_step),
+                               title=data_parsed['title']+' ('+str(copy_n)+')'))
+    return scaled
+
+
+def analyzerSchema(name):
+    """
+    :param name: nome dell'analizzatore (chiave di ANALYZERS)
+    return schema di WikiIndex con il campo 'text' analizzato dall'analizzatore
+    """
+    schema = WikiIndex.getSchema()()
+    schema.remove('text')
+    schema.add('text', TEXT(analyzer=ANALYZERS[name](), stored=False, phrase=False))
+    return schema
+
+
+def runAnalyzer(name, path_pages, path_dir, args):
+    """
+    Misure di un analizzatore; viene eseguita in un processo separato per misurarne la memoria.
+
+    :param name: nome dell'analizzatore
+    :param path_pages: file pickle con le pagine filtrate
+    :param path_dir: cartella dell'indice
+    :param args: argomenti da linea di comando
+    return lista di valori nell'ordine di COLUMNS
+    """
+    setFormTables(args)
+    with open(path_pages, 'rb') as fp:
+        pages = pickle.load(fp)
+    base_rss = maxRss()
+
+    analyzer = ANALYZERS[name]()
+    tokens = 0
+    start = time.perf_counter()
+    for data_parsed in pages:
+        for _ in analyzer(data_parsed['text']):
+            tokens += 1
+    tokens_s = tokens / max(time.perf_counter() - start, 1e-9)
+
+    schema = analyzerSchema(name)
+    start = time.perf_counter()
+    ix = buildIndex(path_dir, pages, schema, args.limitmb)
+    pages_s = len(pages) / max(time.perf_counter() - start, 1e-9)
+    peak_mb = maxRss() - base_rss
+    index_mb = dirSize(path_dir) / 2**20
+
+    writeTextStore(path_dir, pages)
+
+    with ix.reader() as reader:
+        postings = sum(reader.doc_frequency('text', term) for term in reader.field_terms('text'))
+
+    settings = {'limit': 10, 'exp': False, 'page_rank': False, 'text_boost': 1.0, 'title_boost': 1.0,
+                'weighting': args.weighting, 'group': args.group}
+    searcher = WikiSearcher(ix, None, textStore.TextStore.open(path_dir))
+
+    with open(args.google_links, 'r') as fp:
+        queries = list(json.load(fp))
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            searcher.search(query, **settings)
+    ms_query = (time.perf_counter() - start) * 1000 / (len(queries) * args.repeat)
+
+    evaluation_map = Evaluator(BenchIndex(args, searcher), copy.copy(settings)).MAP()
+
+    searcher.text_store.close()
+    ix.close()
+    return [name, tokens, round(tokens_s), round(pages_s, 1), round(peak_mb, 1), round(index_mb, 3),
+            postings, round(ms_query, 3), evaluation_map]
+
+
+def main(args):
+    names = [name.strip() for name in args.analyzers.split(',') if name.strip()]
+    for name in names:
+        if name not in ANALYZERS:
+            raise ValueError('Analizzatore non valido: '+name+' (validi: '+', '.join(ANALYZERS)+')')
+
+    pages = readPages(args)
+    n_pages = len(pages)
+    print('Pagine : '+str(n_pages)+' (scale '+str(args.scale)+')')
+
+    dir_out = tempfile.mkdtemp(prefix='bench_analyzers_')
+    rows = []
+    try:
+        path_pages = os.path.join(dir_out, 'pages.pkl')
+        with open(path_pages, 'wb') as fp:
+            pickle.dump(pages, fp, pickle.HIGHEST_PROTOCOL)
+        del pages
+
+        print('{:<16} {:>10} {:>10} {:>8} {:>8} {:>9} {:>10} {:>9} {:>6}'.format(
+              'analyzer', 'tokens', 'tokens/s', 'pages/s', 'peak MB', 'index MB', 'postings', 'ms/query', 'MAP'))
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                row = executor.submit(runAnalyzer, name, path_pages,
+                                      os.path.join(dir_out, name), args).result()
+            rows.append(row)
+            print('{:<16} {:>10} {:>10} {:>8} {:>8} {:>9} {:>10} {:>9} {:>6}'.format(*row))
+    finally:
+        shutil.rmtree(dir_out)
+
+    result = {'label': args.label,
+              'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'source': args.source,
+              'pages': n_pages,
+              'scale': args.scale,
+              'settings': {'weighting': args.weighting, 'group': args.group, 'repeat': args.repeat,
+                           'limitmb': args.limitmb},
+              'columns': COLUMNS,
+              'rows': rows,
+              }
+    with open(args.dest, 'w') as fp:
+        json.dump(result, fp, indent=1)
+    print('Risultati scritti in '+args.dest)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Costo ed efficacia degli analizzatori del testo.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--google_links',
+        type=str,
+        default='files/google_links.json',
+        help='File json delle query dell\'evaluation e dei link rilevanti.')
+    p.add_argument(
+        '--analyzers',
+        type=str,
+        default=','.join(ANALYZERS),
+        help='Analizzatori da confrontare, separati da virgola.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--scale',
+        type=int,
+        default=1,
+        help='Copie di ogni pagina nel corpus (ingrandimento sintetico).')
+    p.add_argument(
+        '--limitmb',
+        type=int,
+        default=256,
+        help='MB del writer dell\'indice.')
+    p.add_argument(
+        '--weighting',
+        type=str,
+        default='BM25F',
+        choices=['BM25F', 'TF_IDF', 'FREQUENCY'],
+        help='Weighting delle query.')
+    p.add_argument(
+        '--group',
+        type=str,
+        default='AND',
+        choices=['AND', 'OR'],
+        help='Concatenazione dei token delle query.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Quante volte eseguire ogni query.')
+    p.add_argument(
+        '--stem_table',
+        type=str,
+        default='files/stems.table',
+        help='Tabella forma -> stem (vedi indexing/analysis/formTable.py).')
+    p.add_argument(
+        '--lemma_table',
+        type=str,
+        default='files/lemmas.table',
+        help='Tabella forma -> lemma (vedi indexing/analysis/formTable.py).')
+    p.add_argument(
+        '--label',
+        type=str,
+        default='',
+        help='Etichetta dei risultati (es: versione o commit).')
+    p.add_argument(
+        '--dest',
+        type=str,
+        default='bench_analyzers.json',
+        help='File json dove scrivere la tabella dei risultati.')
+
+    main(p.parse_args())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Campo dei bigrammi (WikiIndex.getSchema(bigrams=True)) a confronto con le posizioni nel campo
+'text' ('phrase=True') per le query di più parole.
+
+Le pagine del file vengono filtrate e indicizzate tre volte in una cartella temporanea:
+    base       : schema di WikiIndex (phrase=False, senza bigrammi)
+    bigrams    : schema di WikiIndex con il campo dei bigrammi
+    positions  : schema di WikiIndex con 'text' e 'title' phrase=True (posizioni salvate)
+e per ogni modo di eseguire le query dell'evaluation con WikiSearcher viene misurato:
+    index MB   : dimensione dell'indice
+    ms/query   : tempo medio delle query di più parole (chiavi di files/google_links.json)
+    MAP        : Mean Average Precision dell'Evaluator, senza query expansion e pagerank
+Le query sono eseguite senza virgolette (per 'bigrams' i bigrammi aumentano lo score) oppure tra
+virgolette come frasi (per 'bigrams' i bigrammi sono obbligatori, per 'positions' è una ricerca
+di frase di whoosh).
+
+Uso:  python -m benchmarks.bigrams --source files/filtered.xml --repeat 20
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from whoosh.fields import TEXT
+
+from indexing import textStore
+from indexing.analysis.analyzers import BulkStemmingAnalyzer_, StandardAnalyzer_
+from indexing.evaluation import Evaluator
+from indexing.index import WikiIndex, setFormTables
+from indexing.searching.searcher import WikiSearcher
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+from .common import BenchIndex, buildIndex, dirSize, writeTextStore
+
+
+def positionsSchema():
+    """
+    Le posizioni servono anche nel titolo: le frasi vengono cercate in entrambi i campi.
+
+    return schema di WikiIndex con le posizioni nei campi 'text' e 'title'
+    """
+    schema = WikiIndex.getSchema()()
+    schema.remove('text')
+    schema.remove('title')
+    schema.add('text', TEXT(analyzer=BulkStemmingAnalyzer_(), stored=False, phrase=True))
+    schema.add('title', TEXT(analyzer=StandardAnalyzer_(), stored=True, phrase=True))
+    return schema
+
+
+SCHEMAS = {'base': lambda: WikiIndex.getSchema(),
+           'bigrams': lambda: WikiIndex.getSchema(bigrams=True),
+           'positions': positionsSchema,
+           }
+
+# (schema, query tra virgolette)
+RUNS = [('base', False), ('bigrams', False), ('bigrams', True), ('positions', True)]
+
+
+def buildSchemaIndex(path_dir, pages, name):
+    """
+    :param path_dir: cartella dell'indice
+    :param pages: lista di dict ritornati da FilterWikiText.filterPage
+    :param name: nome dello schema (chiave di SCHEMAS)
+    return (indice whoosh, dimensione dell'indice in MB, senza il file del testo)
+    """
+    ix = buildIndex(path_dir, pages, SCHEMAS[name]())
+    size = dirSize(path_dir) / 2**20
+    writeTextStore(path_dir, pages)
+    return ix, size
+
+
+def main(args):
+    setFormTables(args)
+    wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0)
+    pages = [wiki_filter.filterPage(page.title, page.id, page.text)
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+    with open(args.google_links, 'r') as fp:
+        queries = [query for query in json.load(fp) if len(query.split()) > 1]
+    print('Pagine : '+str(len(pages))+', query di più parole : '+str(len(queries)))
+
+    settings = {'limit': 10, 'exp': False, 'page_rank': False, 'text_boost': 1.0, 'title_boost': 1.0,
+                'weighting': 'BM25F', 'group': args.group}
+
+    dir_out = tempfile.mkdtemp(prefix='bench_bigrams_')
+    try:
+        built = {}
+        print('{:<10} {:>7} {:>9} {:>9} {:>6}'.format('schema', 'quoted', 'index MB', 'ms/query', 'MAP'))
+        for name, quoted in RUNS:
+            if name not in built:
+                path_dir = os.path.join(dir_out, name)
+                ix, size = buildSchemaIndex(path_dir, pages, name)
+                built[name] = (ix, size, WikiSearcher(ix, None, textStore.TextStore.open(path_dir)))
+            ix, size, searcher = built[name]
+            bench_index = BenchIndex(args, searcher, quoted)
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for query in queries:
+                    bench_index.query(query, **settings)
+            latency = (time.perf_counter() - start) * 1000 / max(1, len(queries) * args.repeat)
+
+            evaluation_map = Evaluator(bench_index, copy.copy(settings)).MAP()
+            print('{:<10} {:>7} {:>9.3f} {:>9.3f} {:>6}'.format(
+                  name, 'yes' if quoted else 'no', size, latency, evaluation_map))
+
+        for ix, _, searcher in built.values():
+            searcher.text_store.close()
+            ix.close()
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Campo dei bigrammi a confronto con le posizioni.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--google_links',
+        type=str,
+        default='files/google_links.json',
+        help='File json delle query dell\'evaluation e dei link rilevanti.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--group',
+        type=str,
+        default='AND',
+        choices=['AND', 'OR'],
+        help='Concatenazione dei token delle query.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte eseguire ogni query.')
+    p.add_argument(
+        '--stem_table',
+        type=str,
+        default='files/stems.table',
+        help='Tabella forma -> stem (vedi indexing/analysis/formTable.py).')
+    p.add_argument(
+        '--lemma_table',
+        type=str,
+        default='files/lemmas.table',
+        help='Tabella forma -> lemma (vedi indexing/analysis/formTable.py).')
+
+    main(p.parse_args())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Effetto della riduzione del contenuto (FilterWikiText 'strip', vedi filterText.stripOptions)
+sull'indice.
+
+Per ogni configurazione (nessuna riduzione, ogni tipo da solo, tutti i tipi) le pagine del file
+vengono filtrate e indicizzate con lo schema di WikiIndex in una cartella temporanea, e viene
+misurato:
+    text MB   : dimensione del testo pulito
+    index MB  : dimensione della cartella dell'indice
+    terms     : termini distinti del campo 'text'
+    postings  : numero di coppie (termine, documento) del campo 'text'
+    ms/query  : tempo medio delle query dell'evaluation (chiavi di files/google_links.json) con BM25F
+
+Uso:  python -m benchmarks.boilerplate --source files/filtered.xml --repeat 20
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText, STRIP_KINDS
+
+from .common import buildIndex, dirSize, queryLatency
+
+
+def countPostings(ix):
+    """
+    :param ix: indice whoosh
+    return (termini distinti, numero di posting) del campo 'text'
+    """
+    with ix.reader() as reader:
+        terms = postings = 0
+        for term in reader.field_terms('text'):
+            terms += 1
+            postings += reader.doc_frequency('text', term)
+    return terms, postings
+
+
+def main(args):
+    raw = [(page.title, page.id, page.text)
+           for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+    with open(args.google_links, 'r') as fp:
+        queries = list(json.load(fp))
+    print('Pagine : '+str(len(raw))+', query : '+str(len(queries)))
+
+    configs = [('none', [])] + [(kind, [kind]) for kind in STRIP_KINDS] + [('all', list(STRIP_KINDS))]
+
+    dir_out = tempfile.mkdtemp(prefix='bench_strip_')
+    try:
+        print('{:<10} {:>9} {:>9} {:>9} {:>11} {:>9}'.format(
+              'strip', 'text MB', 'index MB', 'terms', 'postings', 'ms/query'))
+        for name, kinds in configs:
+            wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0, strip=kinds)
+            pages = [wiki_filter.filterPage(title, id_page, text) for title, id_page, text in raw]
+            text_mb = sum(len(data_parsed['text'].encode('utf-8')) for data_parsed in pages) / 2**20
+
+            path_dir = os.path.join(dir_out, name)
+            ix = buildIndex(path_dir, pages)
+            terms, postings = countPostings(ix)
+            latency = queryLatency(ix, queries, args.repeat)
+
+            print('{:<10} {:>9.2f} {:>9.2f} {:>9} {:>11} {:>9.3f}'.format(
+                  name, text_mb, dirSize(path_dir) / 2**20, terms, postings, latency))
+            ix.close()
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Effetto della riduzione del contenuto sull\'indice.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--google_links',
+        type=str,
+        default='files/google_links.json',
+        help='File json delle query dell\'evaluation.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte eseguire ogni query.')
+
+    main(p.parse_args())
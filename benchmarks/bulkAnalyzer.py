@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verifica e velocità di BulkStemmingAnalyzer_ rispetto a StemmingAnalyzer_
+(vedi indexing/analysis/bulkAnalyzer.py).
+
+Verifica: per il testo pulito di ogni pagina del file, per dei casi limite (maiuscole che
+cambiano lunghezza in minuscolo, sigma finale, punti, cifre, underscore, ..) e per 'fuzz' stringhe
+casuali, i due analizzatori devono produrre:
+    - gli stessi termini, sia in fase di indicizzazione sia di query;
+    - gli stessi valori del campo 'text' di WikiIndex ('field.index': termine, frequenza, peso);
+    - gli stessi token con posizioni e caratteri (usati dagli highlights).
+Al primo termine diverso viene stampato il caso e il programma termina con errore.
+Gli stessi controlli su un corpus fisso sono in tests/test_bulkAnalyzer.py.
+
+Velocità: secondi e MB/s di 'field.index' sul testo delle pagine, ripetuto 'repeat' volte.
+
+Uso:  python -m benchmarks.bulkAnalyzer --source files/filtered.xml --fuzz 20000
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from whoosh.fields import TEXT
+
+from indexing.analysis.analyzers import StemmingAnalyzer_, BulkStemmingAnalyzer_
+from indexing.index import setFormTables
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+
+EDGE_CASES = ['',
+              '   \n\t ',
+              'The quick brown foxes were running and jumping over the lazy dogs',
+              'İSTANBUL İstanbul KELVİN',
+              'ΟΔΟΣ ΣΑΣ Σ ΟΔΟΣ. ΌΣΟΣ-ΣΟΦΟΣ',
+              'U.S.A. a.b.c. e.g. 3.14 1.000.000 ..dot.. end.',
+              'snake_case __init__ _ __ foo_bar_ 2nd 10th',
+              'Straße STRASSE ǅungla ǄUNGLA ﬁnancial ﬃ',
+              'Ⅻ ½ ٣٤ 𝔘𝔫𝔦𝔠𝔬𝔡𝔢 ＦＵＬＬＷＩＤＴＨ',
+              'a I an on of in it is to be',
+              "don't can't it's rock'n'roll",
+              'Ab AB aB ab ABC ABCs',
+              'naïve café résumé NAÏVE CAFÉ',
+              '\x00 \x01 nul\x00byte',
+              ]
+
+ALPHABET = 'aeiouAEIOUbcdlmnrsStTyY .._\'-0123456789ÉéİıΣσςßẞǅǄﬁ\x00 \n'
+
+
+def fuzzCases(n, seed):
+    """
+    :param n: numero di stringhe
+    :param seed: seme
+    return lista di stringhe casuali
+    """
+    rnd = random.Random(seed)
+    return [''.join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 60))) for _ in range(n)]
+
+
+def terms(analyzer, text, **kwargs):
+    """
+    return lista dei termini non stopword (come 'unstopped' di whoosh)
+    """
+    return [token.text for token in analyzer(text, **kwargs) if not token.stopped]
+
+
+def tokens(analyzer, text):
+    """
+    return lista di (termine, posizione, inizio, fine, stopword) con posizioni e caratteri
+    """
+    return [(token.text, token.pos, token.startchar, token.endchar, token.stopped)
+            for token in analyzer(text, positions=True, chars=True, removestops=False, mode='query')]
+
+
+def verify(texts, reference, bulk):
+    """
+    :param texts: lista di testi
+    :param reference: StemmingAnalyzer_
+    :param bulk: BulkStemmingAnalyzer_
+    return None se i termini sono uguali, altrimenti (testo, controllo, atteso, ottenuto)
+    """
+    field_reference = TEXT(analyzer=reference, phrase=False)
+    field_bulk = TEXT(analyzer=bulk, phrase=False)
+
+    for text in texts:
+        checks = (('index', lambda a, f: terms(a, text)),
+                  ('query', lambda a, f: terms(a, text, mode='query')),
+                  ('field', lambda a, f: sorted(f.index(text))),
+                  ('chars', lambda a, f: tokens(a, text)),
+                  )
+        for name, check in checks:
+            expected, got = check(reference, field_reference), check(bulk, field_bulk)
+            if expected != got:
+                return text, name, expected, got
+    return None
+
+
+def indexTime(analyzer, texts, repeat):
+    """
+    :param analyzer: analizzatore
+    :param texts: lista di testi
+    :param repeat: ripetizioni
+    return secondi di 'field.index' su tutti i testi
+    """
+    field = TEXT(analyzer=analyzer, phrase=False)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            list(field.index(text))
+    return time.perf_counter() - start
+
+
+def main(args):
+    setFormTables(args)
+    wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0)
+    texts = [wiki_filter.filterPage(page.title, page.id, page.text)['text']
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+    cases = EDGE_CASES + fuzzCases(args.fuzz, args.seed)
+    print('Pagine : '+str(len(texts))+', casi limite : '+str(len(cases)))
+
+    reference, bulk = StemmingAnalyzer_(), BulkStemmingAnalyzer_()
+    mismatch = verify(cases + texts, reference, bulk)
+    if mismatch is not None:
+        text, name, expected, got = mismatch
+        print('! Termini diversi ('+name+') per il testo : '+repr(text[:200]))
+        print('  StemmingAnalyzer_     : '+repr(expected[:20]))
+        print('  BulkStemmingAnalyzer_ : '+repr(got[:20]))
+        sys.exit(1)
+    print('Termini identici')
+
+    mb = sum(len(text.encode('utf-8')) for text in texts) * args.repeat / 2**20
+    print('{:<22} {:>9} {:>9}'.format('analyzer', 'sec', 'MB/s'))
+    for name, analyzer in (('StemmingAnalyzer_', reference), ('BulkStemmingAnalyzer_', bulk)):
+        seconds = indexTime(analyzer, texts, args.repeat)
+        print('{:<22} {:>9.3f} {:>9.2f}'.format(name, seconds, mb / seconds if seconds else 0))
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Verifica e velocità di BulkStemmingAnalyzer_.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--fuzz',
+        type=int,
+        default=20000,
+        help='Numero di stringhe casuali da verificare.')
+    p.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seme delle stringhe casuali.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Ripetizioni della misura di velocità.')
+    p.add_argument(
+        '--stem_table',
+        type=str,
+        default='files/stems.table',
+        help='Tabella forma -> stem (vedi indexing/analysis/formTable.py).')
+    p.add_argument(
+        '--lemma_table',
+        type=str,
+        default='files/lemmas.table',
+        help='Tabella forma -> lemma (vedi indexing/analysis/formTable.py).')
+
+    main(p.parse_args())
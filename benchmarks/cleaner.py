@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confronto tra FilterWikiText.getCleaned e l'implementazione originale getCleanedLegacy.
+
+1) Differenziale: per ogni pagina del file (anche un dump compresso) controllo che i due metodi
+   diano lo stesso testo; le pagine diverse vengono stampate con la prima posizione di differenza.
+   Il controllo viene ripetuto anche su testi casuali formati dai frammenti che interessano i
+   pattern (template, link esterni, domini, tag), per coprire casi annidati o adiacenti.
+2) Throughput: MB/s e pagine/s dei due metodi sulle stesse pagine.
+
+Uso:  python -m benchmarks.cleaner --source files/filtered.xml --repeat 20
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+
+FRAGMENTS = ['{{', '}}', 'url=', 'lang', 'reflist', 'commons', 'coord', '[http', 'http', '[', ']',
+             '.com', '.org', '.it', '.en', '<gallery', '</gallery>', '[[File:', '[[Media:', ']]',
+             '<', '>', '/', '*', ':', '|', '=', 'a', 'b', '.', ' ', ' ', '\n', '\t', ' ']
+
+
+def firstDifference(a, b):
+    """
+    :param a: prima stringa
+    :param b: seconda stringa
+    return indice del primo carattere diverso
+    """
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i
+    return min(len(a), len(b))
+
+
+def differential(texts, cases, seed):
+    """
+    Controllo che getCleaned e getCleanedLegacy diano lo stesso risultato.
+
+    :param texts: lista di (titolo, testo) delle pagine
+    :param cases: numero di testi casuali da controllare
+    :param seed: seme per i testi casuali
+    return numero di testi diversi
+    """
+    diff = 0
+    for title, text in texts:
+        new, old = FilterWikiText.getCleaned(text), FilterWikiText.getCleanedLegacy(text)
+        if new != old:
+            diff += 1
+            pos = firstDifference(new, old)
+            print('! Diverso: '+title+' alla posizione '+str(pos)+' : '+
+                  repr(new[pos:pos + 40])+' / '+repr(old[pos:pos + 40]))
+
+    rnd = random.Random(seed)
+    for _ in range(cases):
+        text = ''.join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(0, 20)))
+        if FilterWikiText.getCleaned(text) != FilterWikiText.getCleanedLegacy(text):
+            diff += 1
+            print('! Diverso: '+repr(text))
+
+    print('Pagine controllate : '+str(len(texts))+', testi casuali : '+str(cases)+', diversi : '+str(diff))
+    return diff
+
+
+def throughput(texts, repeat):
+    """
+    Misura di MB/s e pagine/s dei due metodi.
+
+    :param texts: lista di (titolo, testo) delle pagine
+    :param repeat: quante volte pulire ogni pagina
+    """
+    total_mb = sum(len(text.encode('utf-8')) for _, text in texts) * repeat / 2**20
+    total_pages = len(texts) * repeat
+
+    print('{:<8} {:>8} {:>10} {:>10}'.format('cleaner', 'sec', 'MB/s', 'pages/s'))
+    for name, clean in (('legacy', FilterWikiText.getCleanedLegacy), ('new', FilterWikiText.getCleaned)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, text in texts:
+                clean(text)
+        seconds = time.perf_counter() - start
+        print('{:<8} {:>8.2f} {:>10.2f} {:>10.1f}'.format(name, seconds, total_mb / seconds,
+                                                         total_pages / seconds))
+
+
+def main(args):
+    texts = [(page.title, page.text)
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+
+    diff = differential(texts, args.cases, args.seed)
+    throughput(texts, args.repeat)
+
+    return 1 if diff else 0
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Differenziale e throughput della pulizia del testo.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte pulire ogni pagina per la misura del throughput.')
+    p.add_argument(
+        '--cases',
+        type=int,
+        default=20000,
+        help='Numero di testi casuali per il differenziale.')
+    p.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seme per i testi casuali.')
+
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Funzioni comuni dei benchmark: creazione dell'indice delle pagine filtrate (con lo schema di
+WikiIndex o uno schema del benchmark), dimensione della cartella, tempo medio delle query e
+indice minimo per l'Evaluator.
+"""
+
+import os
+import time
+
+from whoosh import index, scoring
+from whoosh.qparser import MultifieldParser
+
+from indexing import textStore
+from indexing.index import WikiIndex, documentFields
+
+
+def dirSize(path_dir):
+    """
+    :param path_dir: cartella
+    return dimensione in byte dei file della cartella
+    """
+    return sum(os.path.getsize(os.path.join(path_dir, name)) for name in os.listdir(path_dir))
+
+
+def writeTextStore(path_dir, pages):
+    """
+    Scrittura del file del testo delle pagine nella cartella dell'indice (vedi indexing/textStore.py).
+
+    :param path_dir: cartella dell'indice
+    :param pages: lista di dict ritornati da FilterWikiText.filterPage
+    """
+    with textStore.TextStoreWriter(os.path.join(path_dir, textStore.STORE_FILE)) as store_writer:
+        for data_parsed in pages:
+            store_writer.add(data_parsed['id'], data_parsed['text'])
+
+
+def buildIndex(path_dir, pages, schema=None, limitmb=256, text_store=False):
+    """
+    Creazione dell'indice delle pagine filtrate.
+
+    :param path_dir: cartella dell'indice (viene creata)
+    :param pages: lista di dict ritornati da FilterWikiText.filterPage
+    :param schema: schema dell'indice (None = schema di WikiIndex)
+    :param limitmb: MB del writer
+    :param text_store: se True scrive anche il file del testo (vedi 'writeTextStore')
+    return indice whoosh
+    """
+    os.makedirs(path_dir)
+    ix = index.create_in(path_dir, schema if schema is not None else WikiIndex.getSchema())
+    writer = ix.writer(limitmb=limitmb)
+    for data_parsed in pages:
+        writer.add_document(**documentFields(writer.schema, data_parsed['id'], data_parsed['title'],
+                                             data_parsed['text']))
+    writer.commit()
+
+    if text_store:
+        writeTextStore(path_dir, pages)
+    return ix
+
+
+def queryLatency(ix, queries, repeat=1, limit=10):
+    """
+    Tempo medio di esecuzione delle query, con lo stesso parser e weighting di WikiSearcher.
+
+    :param ix: indice whoosh
+    :param queries: lista di query
+    :param repeat: quante volte eseguire ogni query
+    :param limit: risultati per query
+    return millisecondi per query
+    """
+    parser = MultifieldParser(['text', 'title'], ix.schema)
+    parsed = [parser.parse(query) for query in queries]
+
+    with ix.searcher(weighting=scoring.BM25F()) as searcher:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in parsed:
+                searcher.search(query, limit=limit)
+        seconds = time.perf_counter() - start
+
+    return seconds * 1000 / max(1, len(parsed) * repeat)
+
+
+class BenchIndex:
+    """
+    Indice minimo per l'Evaluator: gli argomenti e la funzione 'query' di WikiIndex, con le query
+    eventualmente tra virgolette.
+    """
+
+    def __init__(self, args_paths, searcher, quoted=False):
+        self.args_paths = args_paths
+        self.searcher = searcher
+        self.quoted = quoted
+
+    def query(self, text, **settings):
+        return self.searcher.search('"'+text+'"' if self.quoted else text, **settings)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark della lettura del dump compresso rispetto al file xml non compresso.
+
+Dal file xml di partenza viene creato un corpus sintetico (ripetendo le pagine 'repeat' volte),
+che viene poi compresso in bz2, gzip e, se disponibile, zstandard.
+Per ogni formato misuro il tempo del solo parsing SAX (senza filtraggio del testo), sia con la
+decompressione nel thread separato sia con la decompressione nel thread del parser.
+
+Uso:  python -m benchmarks.decompression --source files/filtered.xml --repeat 200
+"""
+
+import argparse
+import bz2
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from indexing.xmlParsing import dumpStream, saxReader
+
+
+def makeCorpus(path_source, repeat, dir_out):
+    """
+    Creazione del corpus sintetico non compresso e delle sue versioni compresse.
+
+    :param path_source: file xml di partenza
+    :param repeat: quante volte ripetere le pagine del file di partenza
+    :param dir_out: cartella dove salvare i file
+    return dict formato -> path
+    """
+    with open(path_source, 'rb') as fp:
+        data = fp.read()
+    pages = b''.join(re.findall(rb'<page>.*?</page>\s*', data, flags=re.DOTALL))
+
+    paths = {'xml': os.path.join(dir_out, 'corpus.xml')}
+    with open(paths['xml'], 'wb') as fp:
+        fp.write(b'<wikimedia>\n')
+        for _ in range(repeat):
+            fp.write(pages)
+        fp.write(b'</wikimedia>')
+
+    compressors = {'bz2': lambda path: bz2.open(path, 'wb'),
+                   'gz': lambda path: gzip.open(path, 'wb'),
+                   }
+    try:
+        import zstandard
+        compressors['zst'] = lambda path: zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    except ImportError:
+        print('zstandard non installato: formato .zst non misurato')
+
+    for ext, opener in compressors.items():
+        paths[ext] = paths['xml'] + '.' + ext
+        with open(paths['xml'], 'rb') as fin, opener(paths[ext]) as fout:
+            shutil.copyfileobj(fin, fout, 1 << 20)
+
+    return paths
+
+
+def timeParse(path_file, threaded):
+    """
+    Tempo di parsing del file.
+
+    :param path_file: file da parsare
+    :param threaded: decompressione in un thread separato
+    return (secondi, pagine lette)
+    """
+    start = time.perf_counter()
+    with dumpStream.openCorpus(path_file, threaded=threaded) as stream:
+        pages = sum(1 for _ in saxReader.iterPages(stream))
+    return time.perf_counter() - start, pages
+
+
+def main(args):
+    dir_out = tempfile.mkdtemp(prefix='bench_dump_')
+    try:
+        paths = makeCorpus(args.source, args.repeat, dir_out)
+        xml_mb = os.path.getsize(paths['xml']) / 2**20
+
+        print('{:<6} {:<9} {:>10} {:>8} {:>10} {:>12}'.format(
+              'format', 'mode', 'input MB', 'sec', 'xml MB/s', 'input MB/s'))
+        for ext, path_file in paths.items():
+            input_mb = os.path.getsize(path_file) / 2**20
+            modes = ['inline'] if ext == 'xml' else ['inline', 'threaded']
+            for mode in modes:
+                best = min(timeParse(path_file, mode == 'threaded')[0] for _ in range(args.runs))
+                print('{:<6} {:<9} {:>10.1f} {:>8.2f} {:>10.1f} {:>12.1f}'.format(
+                      ext, mode, input_mb, best, xml_mb / best, input_mb / best))
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Benchmark MB/s del parsing di dump compressi e non compressi.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml da cui creare il corpus sintetico.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=200,
+        help='Numero di ripetizioni delle pagine del file di partenza.')
+    p.add_argument(
+        '--runs',
+        type=int,
+        default=3,
+        help='Numero di esecuzioni per formato (viene preso il tempo migliore).')
+
+    main(p.parse_args())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confronto tra il filtraggio in due passaggi (getLinkAndCategory + getCleanedScanner) e il
+filtraggio in un solo passaggio FilterWikiText.lexPage.
+
+Per ogni pagina controllo che link, categorie e testo siano uguali, poi misuro pagine/s dei due modi
+e il tempo peggiore sulle pagine patologiche di benchmarks.adversarial (LINK_PATTERN di 
+getLinkAndCategory è quadratico con molti '[[' non chiusi).
+
+Sulle pagine di files/filtered.xml i due modi hanno la stessa velocità ('vs 2-pass' tra 0.9x e
+1.1x in più esecuzioni, entro il rumore della misura): la ricerca dei link nel ciclo dello scanner costa quanto il passaggio di
+LINK_PATTERN, che è codice C, e la maggior parte del tempo resta nel ciclo sui token, nella
+risoluzione dei link e nelle sostituzioni finali, comuni ai due modi. Il passaggio unico non
+dimezza il costo per pagina; il vantaggio è il tempo lineare sulle pagine patologiche.
+
+Uso:  python -m benchmarks.lexer --source files/filtered.xml --repeat 20
+"""
+
+import argparse
+import itertools
+import sys
+import time
+
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+from .adversarial import adversarialPages
+
+
+def twoPass(wiki_filter, text, title):
+    """
+    :param wiki_filter: FilterWikiText
+    :param text: testo della pagina
+    :param title: titolo della pagina
+    return dict con link, categorie e testo pulito
+    """
+    res = wiki_filter.getLinkAndCategory(text, title)
+    res['text'] = FilterWikiText.getCleanedScanner(text)[0]
+    return res
+
+
+def onePass(wiki_filter, text, title):
+    """
+    :param wiki_filter: FilterWikiText
+    :param text: testo della pagina
+    :param title: titolo della pagina
+    return dict con link, categorie e testo pulito
+    """
+    return wiki_filter.lexPage(text, title)[0]
+
+
+def main(args):
+    wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0)
+    pages = [(page.title, page.text)
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+
+    diff = 0
+    for title, text in pages:
+        if twoPass(wiki_filter, text, title) != onePass(wiki_filter, text, title):
+            diff += 1
+            print('! Diverso: '+title)
+    print('Pagine controllate : '+str(len(pages))+', diverse : '+str(diff))
+
+    print('{:<8} {:>8} {:>10} {:>10}'.format('mode', 'sec', 'pages/s', 'vs 2-pass'))
+    baseline = None
+    for name, filter_page in (('2-pass', twoPass), ('1-pass', onePass)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for title, text in pages:
+                filter_page(wiki_filter, text, title)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print('{:<8} {:>8.2f} {:>10.1f} {:>9.2f}x'.format(name, seconds, len(pages) * args.repeat / seconds,
+                                                          baseline / seconds))
+
+    print('\nTempo peggiore su pagine patologiche (size '+str(args.size)+') :')
+    for name, filter_page in (('2-pass', twoPass), ('1-pass', onePass)):
+        worst = 0.0
+        for text in adversarialPages(args.size).values():
+            start = time.perf_counter()
+            filter_page(wiki_filter, text, 'x')
+            worst = max(worst, time.perf_counter() - start)
+        print('{:<8} {:>8.4f}'.format(name, worst))
+
+    return 1 if diff else 0
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Filtraggio in uno o due passaggi.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte filtrare ogni pagina.')
+    p.add_argument(
+        '--size',
+        type=int,
+        default=2000,
+        help='Ripetizioni del frammento di ogni pagina patologica.')
+
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confronto tra il testo salvato nei campi memorizzati dell'indice ('stored') e il file del testo
+separato (vedi indexing/textStore.py).
+
+Le pagine del file vengono filtrate e indicizzate due volte in una cartella temporanea: con lo
+schema di WikiIndex più il testo 'stored', e con lo schema di WikiIndex più il file del testo.
+Per ognuna viene misurato:
+    index MB   : dimensione della cartella dell'indice (compreso il file del testo)
+    ms/query   : tempo medio di query con BM25F e lettura di titolo e id dei primi 'limit' risultati
+    ms/highl.  : tempo medio per gli highlights dei primi 'limit' risultati
+
+Uso:  python -m benchmarks.textStore --source files/filtered.xml --repeat 20
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from whoosh import scoring
+from whoosh.fields import TEXT
+from whoosh.qparser import MultifieldParser
+
+from indexing import textStore
+from indexing.index import WikiIndex
+from indexing.xmlParsing import saxReader
+from indexing.xmlParsing.filterText import FilterWikiText
+
+from . import common
+from .common import dirSize
+
+
+def storedSchema():
+    """
+    return schema di WikiIndex con il testo 'stored' (come prima del file del testo)
+    """
+    schema = WikiIndex.getSchema()()
+    analyzer = schema['text'].analyzer
+    schema.remove('text')
+    schema.add('text', TEXT(analyzer=analyzer, stored=True, phrase=False))
+    return schema
+
+
+def buildIndex(path_dir, pages, stored):
+    """
+    :param path_dir: cartella dell'indice
+    :param pages: lista di dict ritornati da FilterWikiText.filterPage
+    :param stored: se True il testo è 'stored', altrimenti viene scritto il file del testo
+    return (indice whoosh, TextStore o None)
+    """
+    if stored:
+        return common.buildIndex(path_dir, pages, storedSchema()), None
+
+    ix = common.buildIndex(path_dir, pages, text_store=True)
+    return ix, textStore.TextStore.open(path_dir)
+
+
+def measure(ix, text_store, queries, limit, repeat):
+    """
+    :param ix: indice whoosh
+    :param text_store: TextStore (None = testo 'stored')
+    :param queries: lista di query
+    :param limit: risultati per query
+    :param repeat: quante volte eseguire ogni query
+    return (millisecondi per query, millisecondi per gli highlights di una query)
+    """
+    parser = MultifieldParser(['text', 'title'], ix.schema)
+    parsed = [parser.parse(query) for query in queries]
+    query_time = highlight_time = 0.0
+
+    with ix.searcher(weighting=scoring.BM25F()) as searcher:
+        for _ in range(repeat):
+            for query in parsed:
+                start = time.perf_counter()
+                results = searcher.search(query, limit=limit)
+                rows = [(result['title'], result['id_page']) for result in results]
+                middle = time.perf_counter()
+
+                for result, (_, id_page) in zip(results, rows):
+                    if text_store is None:
+                        result.highlights('text', top=2)
+                    else:
+                        result.highlights('text', text=text_store.get(id_page), top=2)
+                end = time.perf_counter()
+
+                query_time += middle - start
+                highlight_time += end - middle
+
+    runs = len(parsed) * repeat
+    return query_time * 1000 / runs, highlight_time * 1000 / runs
+
+
+def main(args):
+    wiki_filter = FilterWikiText(args.interwiki_links, clean_budget=0)
+    pages = [wiki_filter.filterPage(page.title, page.id, page.text)
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+    with open(args.google_links, 'r') as fp:
+        queries = list(json.load(fp))
+    print('Pagine : '+str(len(pages))+', query : '+str(len(queries)))
+
+    dir_out = tempfile.mkdtemp(prefix='bench_text_store_')
+    try:
+        print('{:<11} {:>9} {:>9} {:>10}'.format('text', 'index MB', 'ms/query', 'ms/highl.'))
+        for name, stored in (('stored', True), ('text.store', False)):
+            path_dir = os.path.join(dir_out, name)
+            ix, text_store = buildIndex(path_dir, pages, stored)
+            query_ms, highlight_ms = measure(ix, text_store, queries, args.results, args.repeat)
+
+            print('{:<11} {:>9.2f} {:>9.3f} {:>10.3f}'.format(
+                  name, dirSize(path_dir) / 2**20, query_ms, highlight_ms))
+            if text_store is not None:
+                text_store.close()
+            ix.close()
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Testo stored nell\'indice o nel file del testo separato.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--interwiki_links',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--google_links',
+        type=str,
+        default='files/google_links.json',
+        help='File json delle query dell\'evaluation.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+    p.add_argument(
+        '--results',
+        type=int,
+        default=10,
+        help='Risultati mostrati per query.')
+    p.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='Quante volte eseguire ogni query.')
+
+    main(p.parse_args())
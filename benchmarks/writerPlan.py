@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matrice di configurazioni del writer whoosh su un corpus sintetico, per controllare le scelte di
+indexing/writerPlan.py.
+
+Il corpus è formato da documenti di parole casuali con distribuzione di Zipf (come il testo
+naturale). Per ogni combinazione di procs, limitmb e strategia dei segmenti viene creato l'indice
+con lo schema di WikiIndex, eseguendo un commit intermedio ogni 'checkpoint' documenti come
+durante una build con checkpoint, e viene misurato:
+    sec       : tempo di creazione (add_document e commit)
+    segments  : segmenti dell'indice finale
+    ms/query  : tempo medio di query di due parole con BM25F
+La riga scelta da writerPlan per questa macchina e questo corpus è indicata con '*'.
+
+Uso:  python -m benchmarks.writerPlan --docs 20000 --procs 1,2,4 --limitmb 32,256
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from whoosh import index
+
+from indexing import writerPlan
+from indexing.index import WikiIndex
+
+from .common import queryLatency
+
+
+def syntheticCorpus(docs, words, vocabulary, seed):
+    """
+    :param docs: numero di documenti
+    :param words: parole per documento
+    :param vocabulary: parole distinte
+    :param seed: seme
+    return (lista di (id, titolo, testo), lista di parole del vocabolario)
+    """
+    rnd = random.Random(seed)
+    vocab = ['w' + format(n, 'x') for n in range(vocabulary)]
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary)]
+
+    corpus = []
+    for id_page in range(docs):
+        text = ' '.join(rnd.choices(vocab, weights, k=words))
+        corpus.append((str(id_page), text[:40], text))
+    return corpus, vocab
+
+
+def buildWithPlan(path_dir, corpus, plan, checkpoint):
+    """
+    :param path_dir: cartella dell'indice
+    :param corpus: lista di (id, titolo, testo)
+    :param plan: piano del writer (vedi writerPlan.planWriter)
+    :param checkpoint: documenti tra un commit e l'altro (0 = solo commit finale)
+    return (indice, secondi)
+    """
+    os.makedirs(path_dir)
+    ix = index.create_in(path_dir, WikiIndex.getSchema())
+
+    start = time.perf_counter()
+    writer = ix.writer(**writerPlan.writerKwargs(plan))
+    for n, (id_page, title, text) in enumerate(corpus, 1):
+        writer.add_document(id_page=id_page, title=title, text=text)
+        if checkpoint and n % checkpoint == 0 and n < len(corpus):
+            writer.commit()
+            writer = ix.writer(**writerPlan.writerKwargs(plan))
+    writer.commit(optimize=plan['optimize'])
+
+    return ix, time.perf_counter() - start
+
+
+def main(args):
+    corpus, vocab = syntheticCorpus(args.docs, args.words, args.vocabulary, args.seed)
+    corpus_mb = sum(len(text) for _, _, text in corpus) / 2**20
+    rnd = random.Random(args.seed + 1)
+    queries = [' '.join(rnd.sample(vocab[:args.vocabulary // 10], 2)) for _ in range(args.queries)]
+
+    chosen = writerPlan.planWriter(writerPlan.cpuCount(), writerPlan.availableMemory(), corpus_mb)
+    print('Corpus : '+str(args.docs)+' documenti, '+str(round(corpus_mb, 1))+' MB')
+    print('Piano  : '+writerPlan.describe(chosen)+'\n')
+
+    procs_list = sorted(set([int(n) for n in args.procs.split(',')] + [chosen['procs']]))
+    limitmb_list = sorted(set([int(n) for n in args.limitmb.split(',')] + [chosen['limitmb']]))
+
+    dir_out = tempfile.mkdtemp(prefix='bench_writer_plan_')
+    try:
+        print('  {:>5} {:>8} {:>13} {:>8} {:>9} {:>9}'.format(
+              'procs', 'limitmb', 'merge', 'sec', 'segments', 'ms/query'))
+        for procs in procs_list:
+            for limitmb in limitmb_list:
+                for merge in writerPlan.STRATEGIES:
+                    if procs == 1 and merge == 'multisegment':
+                        continue
+                    plan = writerPlan.planWriter(procs, None, corpus_mb, procs=procs, limitmb=limitmb,
+                                                 merge=merge)
+                    path_dir = os.path.join(dir_out, '{}_{}_{}'.format(procs, limitmb, merge))
+                    ix, seconds = buildWithPlan(path_dir, corpus, plan, args.checkpoint)
+
+                    with ix.reader() as reader:
+                        segments = len(list(reader.leaf_readers()))
+                    latency = queryLatency(ix, queries)
+
+                    mark = '*' if (procs, limitmb, merge) == \
+                                  (chosen['procs'], chosen['limitmb'], chosen['merge']) else ' '
+                    print('{} {:>5} {:>8} {:>13} {:>8.2f} {:>9} {:>9.3f}'.format(
+                          mark, procs, limitmb, merge, seconds, segments, latency))
+                    ix.close()
+                    shutil.rmtree(path_dir)
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Matrice di configurazioni del writer dell\'indice.')
+    p.add_argument(
+        '--docs',
+        type=int,
+        default=20000,
+        help='Documenti del corpus sintetico.')
+    p.add_argument(
+        '--words',
+        type=int,
+        default=300,
+        help='Parole per documento.')
+    p.add_argument(
+        '--vocabulary',
+        type=int,
+        default=50000,
+        help='Parole distinte del corpus.')
+    p.add_argument(
+        '--procs',
+        type=str,
+        default='1,2,4',
+        help='Valori di procs da provare, separati da virgola.')
+    p.add_argument(
+        '--limitmb',
+        type=str,
+        default='32,256',
+        help='Valori di limitmb da provare, separati da virgola.')
+    p.add_argument(
+        '--checkpoint',
+        type=int,
+        default=5000,
+        help='Documenti tra un commit e l\'altro (0 = solo commit finale).')
+    p.add_argument(
+        '--queries',
+        type=int,
+        default=200,
+        help='Numero di query.')
+    p.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seme del corpus e delle query.')
+
+    main(p.parse_args())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark della scrittura del file filtrato di filterDump.py: scrittura in streaming (xmlWriter)
+rispetto a dicttoxml + minidom.toprettyxml() per ogni pagina.
+
+Le prime 'limit' pagine valide del dump (anche compresso) vengono lette in memoria e poi scritte
+con i due metodi, misurando solo il tempo di scrittura e il picco di memoria allocata.
+Infine i due file vengono riletti con il parser SAX per controllare che contengano le stesse pagine.
+
+Uso:  python -m benchmarks.xmlWriter --source enwiki-latest-pages-articles.xml.bz2 --limit 20000
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from indexing.xmlParsing import saxReader, xmlWriter
+
+
+def writeLegacy(path_file, pages):
+    """
+    Scrittura con dicttoxml + minidom, come faceva filterDump.py.
+
+    :param path_file: file da scrivere
+    :param pages: lista di dict (title, id, text)
+    """
+    import dicttoxml
+    from xml.dom.minidom import parseString
+
+    with open(path_file, 'wt', encoding='utf-8') as fp:
+        fp.write('<wikimedia>\n')
+        for info_page in pages:
+            xml = dicttoxml.dicttoxml(info_page, custom_root='page', attr_type=False)
+            fp.write(parseString(xml).toprettyxml().replace('<?xml version="1.0" ?>\n', ''))
+        fp.write('</wikimedia>')
+
+
+def writeStreaming(path_file, pages):
+    """
+    Scrittura con xmlWriter.PageWriter.
+
+    :param path_file: file da scrivere
+    :param pages: lista di dict (title, id, text)
+    """
+    with xmlWriter.PageWriter(path_file) as writer:
+        for info_page in pages:
+            writer.writePage(**info_page)
+
+
+def measure(write, path_file, pages):
+    """
+    Tempo e picco di memoria della scrittura.
+
+    :param write: funzione di scrittura
+    :param path_file: file da scrivere
+    :param pages: lista di dict (title, id, text)
+    return (secondi, picco di memoria in MB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    write(path_file, pages)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def readBack(path_file):
+    """
+    :param path_file: file xml scritto
+    return lista di tuple (title, id, text) delle pagine del file
+    """
+    return [(page.title, page.id, page.text) for page in saxReader.iterPages(path_file)]
+
+
+def main(args):
+    pages = [{'title': page.title, 'id': page.id, 'text': page.text}
+             for page in itertools.islice(saxReader.iterPages(args.source, valid_only=True), args.limit)]
+    print('Pagine lette : '+str(len(pages)))
+
+    writers = {'streaming': writeStreaming}
+    try:
+        import dicttoxml
+        writers['dicttoxml'] = writeLegacy
+    except ImportError:
+        print('dicttoxml non installato: scrittura originale non misurata')
+
+    dir_out = tempfile.mkdtemp(prefix='bench_writer_')
+    try:
+        print('{:<10} {:>8} {:>10} {:>10} {:>12}'.format('writer', 'sec', 'pages/s', 'out MB', 'peak MB'))
+        paths = {}
+        for name, write in writers.items():
+            paths[name] = os.path.join(dir_out, name + '.xml')
+            seconds, peak = measure(write, paths[name], pages)
+            print('{:<10} {:>8.2f} {:>10.1f} {:>10.1f} {:>12.1f}'.format(
+                  name, seconds, len(pages) / seconds, os.path.getsize(paths[name]) / 2**20, peak))
+
+        if len(paths) > 1:
+            same = readBack(paths['streaming']) == readBack(paths['dicttoxml'])
+            print('Stesse pagine nei due file : '+str(same))
+    finally:
+        shutil.rmtree(dir_out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Benchmark della scrittura del file xml filtrato.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='Dump (anche compresso) da cui leggere le pagine.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=20000,
+        help='Numero di pagine da leggere e scrivere.')
+
+    main(p.parse_args())
@@ -1,10 +1,8 @@
 from indexing.xmlParsing.saxReader import filterXML
+from indexing.xmlParsing.multistream import filterMultistream
 from indexing.searching.searcher import WikiSearcher
 from indexing import testSet
-
-import dicttoxml
-
-from xml.dom.minidom import parseString
+from indexing.xmlParsing.xmlWriter import PageWriter
 
 import json, os, re
 
@@ -13,7 +11,8 @@ import argparse
 
 class FilterDump():
 
-    def __init__(self, path_google_links, path_origin, path_end, total_docs_noise):
+    def __init__(self, path_google_links, path_origin, path_end, total_docs_noise, 
+                 path_index=None, workers=4, seed=None):
         """
         Dall'xml di partenza, crea l'xml filtrato.
 
@@ -21,11 +20,19 @@ class FilterDump():
         :parma path_end: path del file filtrato
         :param titles_to_select: iterabile contenente i titoli da selezionare
         :param total_docs_noise: numero di documenti per creare disturbo
+        :param path_index: file indice del dump multistream, se specificato vengono letti solo 
+                           gli stream che contengono le pagine da selezionare
+        :param workers: thread per la decompressione degli stream
+        :param seed: seme per la scelta casuale degli stream di rumore
         """
 
         self.path_origin = path_origin
         self.path_end = path_end
 
+        self.path_index = path_index
+        self.workers = workers
+        self.seed = seed
+
         self.total_docs_noise = total_docs_noise
         self.titles_to_select = FilterDump.getTitlesToSelect(path_google_links)
 
@@ -38,8 +45,7 @@ class FilterDump():
 
         :param self
         """
-        self.file = open(self.path_end, "wt")
-        self.file.write("<wikimedia>\n")
+        self.file = PageWriter(self.path_end)
 
 
     def __fileClose(self):
@@ -48,7 +54,6 @@ class FilterDump():
 
         :param self
         """
-        self.file.write("</wikimedia>")
         self.file.close()
 
 
@@ -71,12 +76,11 @@ class FilterDump():
     def writePage(self, **info_page):
         """
         Scrittura di una pagina letta dal dump.
+        La pagina viene scritta direttamente come stringa (vedi xmlWriter.py), senza creare il DOM.
 
         :param self
         """
-        xml = dicttoxml.dicttoxml(info_page, custom_root='page', attr_type=False)
-        dom = parseString(xml).toprettyxml().replace('<?xml version="1.0" ?>\n', "")
-        self.file.write(dom)
+        self.file.writePage(**info_page)
 
 
     def startFilter(self):
@@ -86,7 +90,11 @@ class FilterDump():
         :param self
         """
         self.__fileSetup()
-        filterXML(self.path_origin, self.total_docs_noise ,self.titles_to_select, self.writePage)
+        if self.path_index is not None:
+            filterMultistream(self.path_origin, self.path_index, self.total_docs_noise, self.titles_to_select,
+                              self.writePage, workers=self.workers, seed=self.seed)
+        else:
+            filterXML(self.path_origin, self.total_docs_noise ,self.titles_to_select, self.writePage)
         self.__fileClose()
 
 
@@ -96,7 +104,7 @@ if __name__ == '__main__':
         '--source',
         type=str,
         default=None,
-        help='File xml da filtrare')
+        help='File xml da filtrare. Può essere anche un dump compresso (.bz2, .gz, .zst).')
     p.add_argument(
         '--dest',
         type=str,
@@ -112,13 +120,30 @@ if __name__ == '__main__':
         type=int,
         default=450,
         help='Pagine di rumore.')
+    p.add_argument(
+        '--multistream_index',
+        type=str,
+        default=None,
+        help='File indice del dump multistream (anche .bz2): vengono decompressi solo gli stream '
+             'che contengono le pagine da selezionare e le pagine di rumore sono prese da stream casuali.')
+    p.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Thread per la decompressione degli stream del dump multistream.')
+    p.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='Seme per la scelta casuale degli stream di rumore.')
 
     args = p.parse_args()
 
     if args.source is None:
         print('Specificare il file xml da parsare')
     else:
-        f = FilterDump(args.google_link, args.source, args.dest, args.noise)
+        f = FilterDump(args.google_link, args.source, args.dest, args.noise,
+                       args.multistream_index, args.workers, args.seed)
         f.startFilter()
 
 
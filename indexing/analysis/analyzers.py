@@ -1,13 +1,15 @@
-from whoosh.analysis import SimpleAnalyzer, StandardAnalyzer, StemmingAnalyzer, RegexTokenizer, LowercaseFilter, StopFilter, StemFilter
+from whoosh.analysis import SimpleAnalyzer, StandardAnalyzer, RegexTokenizer, LowercaseFilter, StopFilter
 from whoosh.analysis.filters import STOP_WORDS, CharsetFilter
 from whoosh.analysis.tokenizers import default_pattern
 from whoosh.support.charset import accent_map
 
-from .filters import LemmatizerFilter
+from .filters import LemmatizerFilter, TableStemFilter, BigramFilter
+from .bulkAnalyzer import BulkStemmingAnalyzer
 
 """
 DOCS : src whoosh -> https://github.com/mchaput/whoosh/blob/main/src/whoosh/analysis/analyzers.py 
 
+Stemming e lemmatizzazione usano la tabella delle forme condivisa tra processi (vedi formTable.py).
 """   
 
 def SimpleAnalyzer_():
@@ -24,13 +26,45 @@ def StandardAnalyzer_():
     return StandardAnalyzer()  
 
 
-def StemmingAnalyzer_(stoplist=STOP_WORDS):
+def StemmingAnalyzer_(stoplist=STOP_WORDS, minsize=2, maxsize=None):
     """
     Analizzatore che effettua tokenizzazione, lowercase, rimozione stopword e stemming.
+    Equivalente a 'StemmingAnalyzer' di whoosh, con lo stemming tramite la tabella delle forme.
     
+    :param stoplist: lista di stopword. E' possibile effettuare l'unione con altre di un altra lista
+    :param minsize: Parole più piccole di questo valore vengono eliminate
+    :param maxsize: parole più grandi di questo valore vengono eliminate
+    """
+    ret = RegexTokenizer(expression=default_pattern, gaps=False)
+    chain = ret | LowercaseFilter()
+    if stoplist is not None:
+        chain = chain | StopFilter(stoplist=stoplist, minsize=minsize,
+                                   maxsize=maxsize)
+    return chain | TableStemFilter()
+
+
+def BulkStemmingAnalyzer_(stoplist=STOP_WORDS, minsize=2, maxsize=None):
+    """
+    Analizzatore con gli stessi termini di StemmingAnalyzer_, che in fase di indicizzazione 
+    elabora l'intero documento in blocco invece di far passare ogni token nella catena di filtri
+    (vedi bulkAnalyzer.py).
+
+    :param stoplist: lista di stopword. E' possibile effettuare l'unione con altre di un altra lista
+    :param minsize: Parole più piccole di questo valore vengono eliminate
+    :param maxsize: parole più grandi di questo valore vengono eliminate
+    """
+    return BulkStemmingAnalyzer(StemmingAnalyzer_(stoplist, minsize, maxsize), stoplist, minsize, maxsize)
+
+
+def BigramAnalyzer_(stoplist=STOP_WORDS):
+    """
+    Analizzatore che produce i bigrammi dei termini di StemmingAnalyzer_ (stopword escluse), per
+    ricerche simili alle frasi senza le posizioni nell'indice.
+    ES: 'the Roman Empire' -> 'roman empir'
+
     :param stoplist: lista di stopword. E' possibile effettuare l'unione con altre di un altra lista
     """
-    return StemmingAnalyzer(stoplist=stoplist, cachesize=-1)  
+    return BulkStemmingAnalyzer_(stoplist=stoplist) | BigramFilter()
 
 
 def AccentStemmingAnalyzer(stoplist=STOP_WORDS):
@@ -41,7 +75,7 @@ def AccentStemmingAnalyzer(stoplist=STOP_WORDS):
     
     :param stoplist: lista di stopword. E' possibile effettuare l'unione con altre di un altra lista
     """
-    return StemmingAnalyzer(stoplist=stoplist, cachesize=-1) \
+    return StemmingAnalyzer_(stoplist=stoplist) \
             | CharsetFilter(accent_map)  
      
 
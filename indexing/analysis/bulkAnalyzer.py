@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Analizzatore con stemming che elabora l'intero documento in blocco, con gli stessi termini di
+StemmingAnalyzer_ (vedi analyzers.py).
+
+StemmingAnalyzer_ è una catena di generatori (RegexTokenizer -> LowercaseFilter -> StopFilter ->
+TableStemFilter) attraversata da ogni token: per pagine di diversi MB il costo per token di Python
+domina 'add_document'. Qui, nel caso dell'indicizzazione (niente posizioni, caratteri o stopword
+mantenute), il documento viene:
+    1) tokenizzato con un solo 'findall' dello stesso pattern di RegexTokenizer;
+    2) portato in minuscolo con un solo 'lower' dei token uniti da '\\x00' (che non è una lettera,
+       quindi il risultato è lo stesso del minuscolo token per token, anche per il sigma finale);
+    3) filtrato con la stoplist (frozenset) e la lunghezza minima / massima di StopFilter;
+    4) ridotto con la funzione di stemming della tabella delle forme (vedi formTable.py).
+Viene prodotto un solo Token riutilizzato, come fa RegexTokenizer. In tutti gli altri casi
+(query con posizioni, highlights con i caratteri, 'removestops' False, ..) viene usata la catena
+di StemmingAnalyzer_.
+
+La verifica dei termini rispetto a StemmingAnalyzer_ è in benchmarks/bulkAnalyzer.py.
+"""
+
+import re
+
+from whoosh.analysis import Analyzer, Token
+
+from . import formTable
+
+
+# Pattern di RegexTokenizer ('default_pattern' di whoosh) con il gruppo non catturante per 'findall'
+TOKEN_PATTERN = re.compile(r"\w+(?:\.?\w+)*", re.UNICODE)
+SEPARATOR = '\x00'
+
+
+class BulkStemmingAnalyzer(Analyzer):
+    """
+    Analizzatore equivalente a StemmingAnalyzer_ con tokenizzazione, minuscolo, stopword e stemming
+    eseguiti sull'intero documento.
+    """
+
+    is_morph = True
+
+    def __init__(self, fallback, stoplist, minsize=2, maxsize=None):
+        """
+        :param self
+        :param fallback: analizzatore equivalente (StemmingAnalyzer_) usato fuori dal caso
+                         dell'indicizzazione
+        :param stoplist: lista di stopword
+        :param minsize: Parole più piccole di questo valore vengono eliminate
+        :param maxsize: parole più grandi di questo valore vengono eliminate
+        """
+        self.fallback = fallback
+        self.stoplist = frozenset(stoplist) if stoplist is not None else None
+        self.minsize = minsize
+        self.maxsize = maxsize
+
+
+    def __call__(self, value, positions=False, chars=False, keeporiginal=False, removestops=True,
+                 start_pos=0, start_char=0, tokenize=True, mode='', **kwargs):
+        """
+        Generatore dei token del documento.
+
+        :param self
+        :param value: testo del documento
+        (gli altri parametri sono quelli degli analizzatori di whoosh)
+        yield: token (sempre la stessa istanza, come RegexTokenizer)
+        """
+        if positions or chars or keeporiginal or not removestops or not tokenize:
+            for token in self.fallback(value, positions=positions, chars=chars, keeporiginal=keeporiginal,
+                                       removestops=removestops, start_pos=start_pos,
+                                       start_char=start_char, tokenize=tokenize, mode=mode, **kwargs):
+                yield token
+            return
+
+        words = TOKEN_PATTERN.findall(value)
+        if not words:
+            return
+        words = SEPARATOR.join(words).lower().split(SEPARATOR)
+
+        stem = formTable.lookupFunction('stem')
+        stoplist = self.stoplist
+        minsize, maxsize = self.minsize, self.maxsize
+
+        token = Token(positions, chars, removestops=removestops, mode=mode, **kwargs)
+        token.boost = 1.0
+        token.stopped = False
+
+        for word in words:
+            if stoplist is not None and (len(word) < minsize or
+                                         (maxsize is not None and len(word) > maxsize) or
+                                         word in stoplist):
+                continue
+            token.text = stem(word)
+            yield token
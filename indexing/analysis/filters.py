@@ -1,30 +1,82 @@
-import nltk 
-
 from whoosh.analysis import Filter
+
+from . import formTable
       
 
 class LemmatizerFilter(Filter):
     """
-    Filtro che effettua la lemmatizzazione dei token con nltk.
+    Filtro che effettua la lemmatizzazione dei token con nltk, tramite la tabella condivisa delle 
+    forme (vedi formTable.py).
     """
 
-    def __init__(self):
+    def __call__(self, tokens):
         """
-        Inizializzazione del lemmatizer.
+        Generatore di token lemmatizzati.
 
         :param self
+        :param tokens: tokens da lemmatizzare
+        yield: token lemmatizzato 
         """
-        self.lemmatizer = nltk.WordNetLemmatizer()
+        lemmatize = formTable.lemmatize
+        for token in tokens:
+            token.text = lemmatize(token.text)
+            yield token
+
+
+class TableStemFilter(Filter):
+    """
+    Filtro che effettua lo stemming (Porter) dei token tramite la tabella condivisa delle forme 
+    (vedi formTable.py), al posto della cache per istanza di 'StemFilter'.
+    Come 'StemFilter' non modifica i token marcati come stopword.
+    """
+
+    is_morph = True
 
-    
     def __call__(self, tokens):
         """
-        Generatore di token lemmatizzati.
+        Generatore di token con lo stemming.
 
         :param self
-        :param tokens: tokens da lemmatizzare
-        yield: token lemmatizzato 
+        :param tokens: tokens
+        yield: token con lo stemming
+        """
+        stem = formTable.stem
+        for token in tokens:
+            if not token.stopped:
+                token.text = stem(token.text)
+            yield token
+
+
+class BigramFilter(Filter):
+    """
+    Filtro che unisce i token adiacenti (stopword escluse) in bigrammi: 'roman', 'empir' -> 
+    'roman empir'. Un testo con meno di due token non produce bigrammi.
+    Come 'BiWordFilter' di whoosh, che però con un testo vuoto genera un errore.
+    """
+
+    def __init__(self, sep=' '):
+        """
+        :param self
+        :param sep: separatore delle due parole
         """
+        self.sep = sep
+
+
+    def __call__(self, tokens):
+        """
+        Generatore dei bigrammi.
+
+        :param self
+        :param tokens: tokens
+        yield: token con il bigramma
+        """
+        prev_text = None
         for token in tokens:
-            token.text = self.lemmatizer.lemmatize(token.text)
-            yield token
\ No newline at end of file
+            if token.stopped:
+                continue
+
+            text = token.text
+            if prev_text is not None:
+                token.text = prev_text + self.sep + text
+                yield token
+            prev_text = text
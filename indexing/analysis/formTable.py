@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabella persistente forma -> stem / lemma, condivisa dagli analizzatori (vedi analyzers.py).
+
+Lo stemming (Porter di whoosh) e la lemmatizzazione (WordNet di nltk) di una forma danno sempre lo
+stesso risultato, ma la cache di StemmingAnalyzer è per istanza e parte vuota in ogni sub-writer,
+in ogni parser e ad ogni build, mentre LemmatizerFilter non ha cache. La tabella viene creata una
+volta dal vocabolario del corpus e letta con mmap: i processi che la usano condividono le stesse
+pagine di memoria. Le forme non presenti vengono calcolate e tenute in una cache LRU limitata.
+
+Formato del file (hash table a indirizzamento aperto, crc32 della forma in utf-8):
+
+    header        MAGIC, numero di forme, numero di slot (potenza di 2)
+    slot          n_slot * 4 byte: indice della forma + 1 (0 = vuoto)
+    offset forme  (n + 1) * 4 byte
+    offset valori (n + 1) * 4 byte (valore vuoto = uguale alla forma)
+    blob          forme e valori in utf-8
+
+Uso dagli analizzatori:  formTable.stem('running') -> 'run', formTable.lemmatize('geese') -> 'goose'
+La tabella si crea con:  python -m indexing.analysis.formTable --kind stem --source files/filtered.xml
+"""
+
+import argparse
+import collections
+import functools
+import mmap
+import os
+import struct
+import zlib
+
+from whoosh.analysis.tokenizers import default_pattern
+
+
+MAGIC = b'WIKIFT01'
+HEADER = struct.Struct('<8sII')
+UINT = struct.Struct('<I')
+PAIR = struct.Struct('<II')
+
+KINDS = ('stem', 'lemma')
+DEFAULT_TABLES = {'stem': 'files/stems.table', 'lemma': 'files/lemmas.table'}
+LRU_SIZE = 100000
+
+
+class FormTable:
+    """
+    Lettura della tabella tramite mmap.
+    """
+
+    def __init__(self, path_table):
+        """
+        :param self
+        :param path_table: path del file della tabella
+        """
+        self.fp = open(path_table, 'rb')
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.n, n_slots = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('File non valido: '+path_table)
+
+        self.mask = n_slots - 1
+        self.slots_pos = HEADER.size
+        self.forms_pos = self.slots_pos + n_slots * UINT.size
+        self.values_pos = self.forms_pos + (self.n + 1) * UINT.size
+        self.blob_pos = self.values_pos + (self.n + 1) * UINT.size
+
+
+    def get(self, form):
+        """
+        :param self
+        :param form: forma (token in minuscolo)
+        return stem / lemma della forma, None se non presente
+        """
+        key = form.encode('utf-8')
+        slot = zlib.crc32(key) & self.mask
+
+        while True:
+            entry = UINT.unpack_from(self.mm, self.slots_pos + slot * UINT.size)[0]
+            if entry == 0:
+                return None
+
+            i = entry - 1
+            start, end = PAIR.unpack_from(self.mm, self.forms_pos + i * UINT.size)
+            if self.mm[self.blob_pos + start:self.blob_pos + end] == key:
+                start, end = PAIR.unpack_from(self.mm, self.values_pos + i * UINT.size)
+                if start == end:
+                    return form
+                return self.mm[self.blob_pos + start:self.blob_pos + end].decode('utf-8')
+
+            slot = (slot + 1) & self.mask
+
+
+    def __len__(self):
+        return self.n
+
+
+    def close(self):
+        """
+        :param self
+        """
+        self.mm.close()
+        self.fp.close()
+
+
+def writeTable(path_table, pairs):
+    """
+    Scrittura della tabella (file temporaneo e 'os.replace').
+
+    :param path_table: path del file
+    :param pairs: dict forma -> stem / lemma
+    return numero di forme scritte
+    """
+    forms = sorted(pairs)
+    n_slots = 8
+    while n_slots < 2 * len(forms):
+        n_slots *= 2
+
+    slots = [0] * n_slots
+    mask = n_slots - 1
+    blob = bytearray()
+    form_offsets, value_offsets = [0], []
+
+    keys = []
+    for i, form in enumerate(forms):
+        key = form.encode('utf-8')
+        keys.append(key)
+        blob += key
+        form_offsets.append(len(blob))
+
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = i + 1
+
+    value_offsets.append(len(blob))
+    for form in forms:
+        value = pairs[form]
+        if value != form:
+            blob += value.encode('utf-8')
+        value_offsets.append(len(blob))
+
+    with open(path_table + '.tmp', 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, len(forms), n_slots))
+        fp.write(struct.pack('<{}I'.format(n_slots), *slots))
+        fp.write(struct.pack('<{}I'.format(len(form_offsets)), *form_offsets))
+        fp.write(struct.pack('<{}I'.format(len(value_offsets)), *value_offsets))
+        fp.write(blob)
+    os.replace(path_table + '.tmp', path_table)
+
+    return len(forms)
+
+
+def normalizer(kind):
+    """
+    :param kind: 'stem' o 'lemma'
+    return funzione forma -> stem (Porter di whoosh) o lemma (WordNet di nltk)
+    """
+    if kind == 'stem':
+        from whoosh.lang.porter import stem
+        return stem
+    if kind == 'lemma':
+        import nltk
+        return nltk.WordNetLemmatizer().lemmatize
+    raise ValueError('Tipo di tabella non valido: '+str(kind))
+
+
+# Path delle tabelle e funzioni di lookup (aperte alla prima chiamata in ogni processo)
+_paths = dict(DEFAULT_TABLES)
+_lookups = {}
+
+
+def setTable(kind, path_table):
+    """
+    Impostazione del file della tabella usato da 'stem' o 'lemmatize' in questo processo.
+
+    :param kind: 'stem' o 'lemma'
+    :param path_table: path del file (None = solo cache LRU)
+    """
+    if kind not in KINDS:
+        raise ValueError('Tipo di tabella non valido: '+str(kind))
+
+    _paths[kind] = path_table
+    _lookups.pop(kind, None)
+
+
+def lookupFunction(kind):
+    """
+    Funzione di lookup: tabella (se il file esiste), altrimenti calcolo della forma, con cache LRU
+    di LRU_SIZE forme.
+
+    :param kind: 'stem' o 'lemma'
+    return funzione forma -> stem / lemma
+    """
+    lookup = _lookups.get(kind)
+    if lookup is not None:
+        return lookup
+
+    fn = normalizer(kind)
+    path_table = _paths.get(kind)
+    table = FormTable(path_table) if path_table and os.path.exists(path_table) else None
+
+    @functools.lru_cache(maxsize=LRU_SIZE)
+    def lookup(form):
+        value = table.get(form) if table is not None else None
+        return value if value is not None else fn(form)
+
+    lookup.table = table
+    _lookups[kind] = lookup
+    return lookup
+
+
+def stem(form):
+    """
+    :param form: forma (token in minuscolo)
+    return stem della forma
+    """
+    return lookupFunction('stem')(form)
+
+
+def lemmatize(form):
+    """
+    :param form: forma (token in minuscolo)
+    return lemma della forma
+    """
+    return lookupFunction('lemma')(form)
+
+
+def corpusForms(path_source, min_count=2, limit=None):
+    """
+    Vocabolario del corpus: token (con lo stesso pattern e minuscolo degli analizzatori) del testo
+    delle pagine valide.
+
+    :param path_source: file xml (anche dump compresso)
+    :param min_count: frequenza minima di una forma
+    :param limit: numero massimo di pagine da leggere
+    return lista di forme
+    """
+    from ..xmlParsing import saxReader
+
+    counts = collections.Counter()
+    for n, page in enumerate(saxReader.iterPages(path_source, valid_only=True)):
+        if limit is not None and n >= limit:
+            break
+        counts.update(match.group(0).lower() for match in default_pattern.finditer(page.text))
+
+    return [form for form, count in counts.items() if count >= min_count]
+
+
+def buildTable(path_table, kind, forms):
+    """
+    :param path_table: path del file
+    :param kind: 'stem' o 'lemma'
+    :param forms: forme da inserire
+    return numero di forme scritte
+    """
+    fn = normalizer(kind)
+    return writeTable(path_table, {form: fn(form) for form in forms})
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Creazione della tabella forma -> stem / lemma dal corpus.')
+    p.add_argument(
+        '--kind',
+        type=str,
+        default='stem',
+        choices=KINDS,
+        help='Tipo di tabella.')
+    p.add_argument(
+        '--source',
+        type=str,
+        default='files/filtered.xml',
+        help='File xml (anche dump compresso) da cui leggere il vocabolario.')
+    p.add_argument(
+        '--dest',
+        type=str,
+        default=None,
+        help='File della tabella (default: files/stems.table o files/lemmas.table).')
+    p.add_argument(
+        '--min_count',
+        type=int,
+        default=2,
+        help='Frequenza minima di una forma per essere inserita.')
+    p.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Numero massimo di pagine da leggere.')
+
+    args = p.parse_args()
+    dest = args.dest or DEFAULT_TABLES[args.kind]
+    forms = corpusForms(args.source, args.min_count, args.limit)
+    print('Forme scritte in '+dest+' : '+str(buildTable(dest, args.kind, forms)))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Strumentazione della creazione dell'indice.
+
+Per ogni fase della build (parsing SAX, estrazione link, pulizia testo, add_document, addPage,
+commit, calcolo archi, pagerank) viene misurato il tempo totale e il numero di chiamate.
+Ad intervalli regolari viene scritta una riga JSON con pagine/s, MB/s di input, tempi per fase,
+profondità delle code e memoria (RSS) del processo; alla fine viene scritto un riepilogo.
+
+    {"elapsed": 60.0, "pages": 12000, "pages_s": 200.0, "input_mb": 310.2, "input_mb_s": 5.2,
+     "rss_mb": 812.4, "queues": {"filter": 240},
+     "stages": {"parse": {"seconds": 11.2, "calls": 12000, "per_s": 1071.4}, ...}}
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+
+def currentRss():
+    """
+    Memoria residente del processo in MB.
+    Su Linux leggo la memoria corrente da /proc, altrove uso il picco fornito da 'resource'.
+
+    return RSS in MB, None se non disponibile
+    """
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss è in byte su macOS e in KB su Linux
+    return max_rss / 2**20 if sys.platform == 'darwin' else max_rss / 2**10
+
+
+class BuildStats:
+    """
+    Raccolta delle statistiche della build, con scrittura periodica in formato JSON lines.
+    """
+
+    def __init__(self, path_log=None, interval=10.0, start_pages=0, start_offset=0):
+        """
+        Inizializzazione.
+        Se la build riprende da un checkpoint 'pages' e 'input_mb' partono dalle pagine e dall'offset 
+        già indicizzati, mentre pagine/s e MB/s sono calcolati solo su questa esecuzione.
+
+        :param self
+        :param path_log: file dove scrivere le righe JSON, se None vengono solo raccolte
+        :param interval: secondi tra una riga e l'altra
+        :param start_pages: pagine già indicizzate (ripresa da un checkpoint)
+        :param start_offset: offset nel dump da cui riprende la lettura
+        """
+        self.path_log = path_log
+        self.interval = interval
+
+        self.start = time.monotonic()
+        self.last_emit = self.start
+
+        self.start_pages = start_pages
+        self.start_offset = start_offset
+        self.pages = start_pages
+        self.input_bytes = start_offset
+
+        self.stages = {}
+        self.sources = []
+        self.gauges = {}
+        self.info = {}
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Context manager che misura il tempo di una fase.
+
+        :param self
+        :param name: nome della fase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+
+    def add(self, name, seconds, calls=1):
+        """
+        Aggiunta del tempo speso in una fase.
+
+        :param self
+        :param name: nome della fase
+        :param seconds: secondi spesi
+        :param calls: numero di chiamate a cui si riferisce il tempo
+        """
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += calls
+
+
+    def timedIter(self, name, iterable):
+        """
+        Generatore che misura il tempo speso per ottenere ogni elemento dell'iterabile.
+        Usato per misurare il parsing SAX, che avviene dentro 'iterPages'.
+
+        :param self
+        :param name: nome della fase
+        :param iterable: iterabile da misurare
+        yield: elementi dell'iterabile
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+
+    def track(self, source):
+        """
+        Registrazione di un oggetto che misura da sè alcune fasi (es: FilterWikiText, FilterPipeline).
+        L'oggetto deve avere l'attributo 'timings': dict fase -> [secondi, chiamate] cumulativi.
+
+        :param self
+        :param source: oggetto da registrare
+        """
+        self.sources.append(source)
+
+
+    def gauge(self, name, fn):
+        """
+        Registrazione di una grandezza letta ad ogni riga (es: profondità di una coda).
+
+        :param self
+        :param name: nome della grandezza
+        :param fn: funzione senza argomenti che ritorna il valore
+        """
+        self.gauges[name] = fn
+
+
+    def page(self, offset=None):
+        """
+        Da chiamare per ogni pagina indicizzata. Se è passato l'intervallo scrive una riga.
+
+        :param self
+        :param offset: posizione della pagina nel dump, usata per i MB letti
+        """
+        self.pages += 1
+        if offset is not None:
+            self.input_bytes = offset
+
+        if time.monotonic() - self.last_emit >= self.interval:
+            self.emit()
+
+
+    def snapshot(self):
+        """
+        Stato corrente delle statistiche.
+
+        :param self
+        return dict serializzabile in JSON
+        """
+        elapsed = time.monotonic() - self.start
+
+        stages = {name: list(value) for name, value in self.stages.items()}
+        for source in self.sources:
+            for name, (seconds, calls) in source.timings.items():
+                stage = stages.setdefault(name, [0.0, 0])
+                stage[0] += seconds
+                stage[1] += calls
+
+        input_mb = self.input_bytes / 2**20
+        read_mb = (self.input_bytes - self.start_offset) / 2**20
+        read_pages = self.pages - self.start_pages
+        rss = currentRss()
+
+        return {'elapsed': round(elapsed, 3),
+                'pages': self.pages,
+                'pages_s': round(read_pages / elapsed, 2) if elapsed else 0.0,
+                'input_mb': round(input_mb, 2),
+                'input_mb_s': round(read_mb / elapsed, 3) if elapsed else 0.0,
+                'rss_mb': round(rss, 1) if rss is not None else None,
+                'queues': {name: fn() for name, fn in self.gauges.items()},
+                'stages': {name: {'seconds': round(seconds, 4),
+                                  'calls': calls,
+                                  'per_s': round(calls / seconds, 2) if seconds else None}
+                           for name, (seconds, calls) in stages.items()},
+                }
+
+
+    def emit(self):
+        """
+        Scrittura di una riga JSON con lo stato corrente.
+
+        :param self
+        """
+        self.last_emit = time.monotonic()
+        if self.path_log is None:
+            return
+
+        with open(self.path_log, 'a') as fp:
+            fp.write(json.dumps(self.snapshot()) + '\n')
+
+
+    def summary(self, path_summary):
+        """
+        Scrittura del riepilogo finale, con anche le informazioni aggiunte in 'self.info'.
+
+        :param self
+        :param path_summary: file del riepilogo
+        return dict del riepilogo
+        """
+        self.emit()
+        res = self.snapshot()
+        res.update(self.info)
+
+        with open(path_summary, 'w') as fp:
+            json.dump(res, fp, indent=2)
+        return res
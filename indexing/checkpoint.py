@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoint periodici durante la creazione dell'indice, per poter riprendere una build interrotta.
+
+Ad ogni checkpoint:
+    1) le pagine indicizzate dall'ultimo checkpoint (id, titolo, link, offset) vengono aggiunte
+       in coda al file 'checkpoint.links' nella cartella dell'indice;
+    2) i testi delle pagine vengono scritti su disco nel file del testo (vedi textStore.py), se presente;
+    3) viene eseguito il commit del writer, che crea nuovi segmenti, e viene aperto un nuovo writer;
+    4) viene scritto 'checkpoint.json' con il numero di pagine, l'ultimo id e il suo offset.
+
+Il commit di whoosh è atomico, quindi in caso di crash l'indice contiene esattamente le pagine
+dell'ultimo commit riuscito. Dato che durante la build ogni pagina corrisponde ad un documento,
+per riprendere mi basta leggere i primi 'doc_count' record del file dei link: l'offset
+dell'ultimo record è il punto del dump da cui ripartire.
+"""
+
+import json
+import os
+import pickle
+import time
+
+
+LINKS_FILE = 'checkpoint.links'
+STATE_FILE = 'checkpoint.json'
+
+
+class BuildCheckpointer:
+    """
+    Gestisce il writer dell'indice durante la build, eseguendo un checkpoint ogni
+    'every_pages' pagine oppure ogni 'every_minutes' minuti.
+    Se entrambi sono 0 i checkpoint sono disabilitati e non viene scritto niente su file.
+    """
+
+    def __init__(self, wiki_index, writer_kwargs, index_dir, every_pages=0, every_minutes=0, stats=None,
+                 text_store=None, pages=0):
+        """
+        Inizializzazione e creazione del writer.
+
+        :param self
+        :param wiki_index: indice whoosh
+        :param writer_kwargs: argomenti per la creazione del writer (limitmb, procs, ..)
+        :param index_dir: cartella dell'indice
+        :param every_pages: pagine tra un checkpoint e l'altro (0 = disabilitato)
+        :param every_minutes: minuti tra un checkpoint e l'altro (0 = disabilitato)
+        :param stats: BuildStats dove registrare il tempo dei commit
+        :param text_store: TextStoreWriter dove salvare il testo delle pagine (None = non salvato)
+        :param pages: pagine già indicizzate (record ripristinati da 'loadCheckpoint' se la build riprende)
+        """
+        self.index = wiki_index
+        self.writer_kwargs = writer_kwargs
+        self.index_dir = index_dir
+
+        self.every_pages = every_pages
+        self.every_seconds = every_minutes * 60
+        self.enabled = every_pages > 0 or every_minutes > 0
+        self.stats = stats
+        self.text_store = text_store
+
+        self.writer = self.index.writer(**self.writer_kwargs)
+
+        self.window = []
+        self.pages = pages
+        self.last_time = time.monotonic()
+
+
+    def pageAdded(self, id_page, title, links, offset):
+        """
+        Da chiamare dopo aver aggiunto una pagina al writer. Se è il momento esegue il checkpoint.
+
+        :param self
+        :param id_page: id della pagina
+        :param title: titolo della pagina
+        :param links: link interni della pagina
+        :param offset: posizione della pagina nel dump (decompresso)
+        """
+        self.pages += 1
+        if not self.enabled:
+            return
+
+        self.window.append((id_page, title, links, offset))
+
+        if (self.every_pages and len(self.window) >= self.every_pages) or \
+           (self.every_seconds and time.monotonic() - self.last_time >= self.every_seconds):
+            self.checkpoint()
+
+
+    def checkpoint(self):
+        """
+        Esecuzione del checkpoint: salvataggio dei link, commit e creazione di un nuovo writer.
+
+        :param self
+        """
+        if not self.window:
+            return
+
+        with open(os.path.join(self.index_dir, LINKS_FILE), 'ab') as fp:
+            for record in self.window:
+                pickle.dump(record, fp, pickle.HIGHEST_PROTOCOL)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        if self.text_store is not None:
+            self.text_store.flush()
+        self.__commitWriter()
+
+        last_id, last_offset = self.window[-1][0], self.window[-1][3]
+        self.window = []
+        self.last_time = time.monotonic()
+
+        path_state = os.path.join(self.index_dir, STATE_FILE)
+        with open(path_state + '.tmp', 'w') as fp:
+            json.dump({'pages': self.pages, 'last_id': last_id, 'offset': last_offset,
+                       'time': time.time()}, fp)
+        os.replace(path_state + '.tmp', path_state)
+
+        print('Checkpoint : '+str(self.pages)+' pagine, ultimo id '+str(last_id))
+
+        self.writer = self.index.writer(**self.writer_kwargs)
+
+
+    def commit(self, optimize=False):
+        """
+        Commit finale e chiusura del file del testo. I file di checkpoint non servono più e vengono 
+        eliminati.
+
+        :param self
+        :param optimize: se True tutti i segmenti dell'indice vengono uniti in uno solo
+        """
+        if self.text_store is not None:
+            self.text_store.close()
+        self.__commitWriter(optimize)
+        self.window = []
+        removeCheckpoint(self.index_dir)
+
+
+    def abort(self):
+        """
+        Chiusura dopo un errore della build: il writer viene annullato (rilasciando il lock 
+        dell'indice) e il file del testo viene scritto su disco e chiuso. I segmenti e i file dei 
+        checkpoint già eseguiti non vengono toccati, quindi la build può essere ripresa con 'resume' 
+        anche dallo stesso processo.
+
+        :param self
+        """
+        if not self.writer.is_closed:
+            self.writer.cancel()
+        if self.text_store is not None and not self.text_store.fp.closed:
+            self.text_store.close()
+        self.window = []
+
+
+    def __commitWriter(self, optimize=False):
+        """
+        Commit del writer (con merge dei segmenti se previsto), misurandone il tempo.
+
+        :param self
+        :param optimize: se True tutti i segmenti dell'indice vengono uniti in uno solo
+        """
+        start = time.perf_counter()
+        self.writer.commit(optimize=optimize)
+        if self.stats is not None:
+            self.stats.add('commit', time.perf_counter() - start)
+
+
+def canResume(index_dir):
+    """
+    Controllo se nella cartella dell'indice è presente un checkpoint da cui riprendere.
+
+    :param index_dir: cartella dell'indice
+    return True se è possibile riprendere la build
+    """
+    return os.path.exists(os.path.join(index_dir, LINKS_FILE))
+
+
+def loadCheckpoint(index_dir, doc_count):
+    """
+    Lettura dei record delle pagine già presenti nell'indice.
+    Vengono letti i primi 'doc_count' record: quelli successivi (se presenti) sono stati scritti
+    prima di un commit non riuscito e vengono eliminati dal file.
+
+    :param index_dir: cartella dell'indice
+    :param doc_count: documenti presenti nell'indice
+    return (lista di record (id, titolo, link, offset), offset dell'ultima pagina, id dell'ultima pagina)
+    """
+    path_links = os.path.join(index_dir, LINKS_FILE)
+    records = []
+
+    with open(path_links, 'r+b') as fp:
+        while len(records) < doc_count:
+            try:
+                records.append(pickle.load(fp))
+            except (EOFError, pickle.UnpicklingError):
+                break
+        fp.truncate(fp.tell())
+
+    if len(records) < doc_count:
+        raise ValueError('Checkpoint non consistente con l\'indice: '+str(len(records))+
+                         ' pagine salvate, '+str(doc_count)+' documenti nell\'indice')
+
+    if not records:
+        return records, 0, None
+    return records, records[-1][3], records[-1][0]
+
+
+def removeCheckpoint(index_dir):
+    """
+    Eliminazione dei file di checkpoint.
+
+    :param index_dir: cartella dell'indice
+    """
+    for file_name in (LINKS_FILE, STATE_FILE):
+        path_file = os.path.join(index_dir, file_name)
+        if os.path.exists(path_file):
+            os.remove(path_file)
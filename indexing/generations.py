@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generazioni dell'indice, per ricreare l'indice senza interrompere quello in uso.
+
+La cartella dell'indice ('args_paths.index_dir') contiene una sottocartella per ogni build
+('gen-1', 'gen-2', ..), con l'indice whoosh, la table del pagerank, il file dei redirect e i file 
+della build, e il file 'CURRENT' con il nome della generazione in uso:
+
+    files/indexdir/
+        CURRENT          -> 'gen-2'
+        gen-1/           generazione precedente
+        gen-2/           generazione in uso
+        gen-3/           build in corso (staging)
+
+Una build scrive sempre in una nuova generazione; solo quando è terminata e validata 'CURRENT'
+viene sostituito con 'os.replace', che è atomico: chi legge 'CURRENT' trova sempre una generazione
+completa. Se la build fallisce la generazione in uso non viene toccata.
+
+Ogni processo che ha aperto una generazione tiene un lock condiviso sul suo file 'READERS' (vedi
+'openLease'), finchè non passa a un'altra generazione: le generazioni con un lock attivo non 
+vengono eliminate da 'removeOld'. Il lock viene rilasciato dal sistema operativo anche se il 
+processo termina senza chiuderlo.
+"""
+
+import copy
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:     # Windows: i lock non sono disponibili
+    fcntl = None
+
+
+CURRENT_FILE = 'CURRENT'
+READERS_FILE = 'READERS'
+PREFIX = 'gen-'
+
+
+def listGenerations(root):
+    """
+    :param root: cartella dell'indice
+    return lista dei nomi delle generazioni, dalla più vecchia alla più recente
+    """
+    if not os.path.isdir(root):
+        return []
+
+    names = [name for name in os.listdir(root)
+             if name.startswith(PREFIX) and name[len(PREFIX):].isdigit() and
+                os.path.isdir(os.path.join(root, name))]
+    return sorted(names, key=lambda name: int(name[len(PREFIX):]))
+
+
+def currentGeneration(root):
+    """
+    :param root: cartella dell'indice
+    return path della generazione in uso, None se non esiste
+    """
+    path_current = os.path.join(root, CURRENT_FILE)
+    if not os.path.exists(path_current):
+        return None
+
+    with open(path_current, 'r') as fp:
+        gen_dir = os.path.join(root, fp.read().strip())
+    return gen_dir if os.path.isdir(gen_dir) else None
+
+
+def currentStamp(root):
+    """
+    Controllo economico (una 'stat') per sapere se 'CURRENT' è cambiato: 'publish' lo sostituisce
+    con un nuovo file, quindi cambiano inode e data di modifica.
+
+    :param root: cartella dell'indice
+    return tupla che cambia quando cambia la generazione in uso, None se 'CURRENT' non esiste
+    """
+    try:
+        stat = os.stat(os.path.join(root, CURRENT_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def lastStaging(root):
+    """
+    :param root: cartella dell'indice
+    return path della generazione più recente se è successiva a quella in uso (build non
+           terminata), None altrimenti
+    """
+    names = listGenerations(root)
+    if not names:
+        return None
+
+    gen_dir = os.path.join(root, names[-1])
+    if gen_dir == currentGeneration(root):
+        return None
+    return gen_dir
+
+
+def newGeneration(root):
+    """
+    Creazione della cartella di una nuova generazione.
+
+    :param root: cartella dell'indice
+    return path della nuova generazione
+    """
+    names = listGenerations(root)
+    number = int(names[-1][len(PREFIX):]) + 1 if names else 1
+
+    gen_dir = os.path.join(root, PREFIX + str(number))
+    os.makedirs(gen_dir)
+    return gen_dir
+
+
+def copyGeneration(src_dir, dst_dir, copy_names=()):
+    """
+    Copia dei file di una generazione in una nuova generazione (vedi WikiIndex.update).
+    I file vengono collegati con un hard link, quindi la copia non occupa spazio: vale per i file
+    che non vengono mai riscritti sul posto (segmenti e toc di whoosh, file del testo chiusi, file
+    sostituiti con 'os.replace' come la table del pagerank e i link delle pagine). I file in
+    'copy_names', modificati sul posto (es: aggiunta di righe), vengono copiati.
+    Non vengono copiati il file READERS, i lock di whoosh e le sottocartelle.
+
+    :param src_dir: path della generazione da copiare
+    :param dst_dir: path della nuova generazione (già creata)
+    :param copy_names: nomi dei file da copiare invece di collegare
+    """
+    for name in os.listdir(src_dir):
+        src = os.path.join(src_dir, name)
+        if name == READERS_FILE or name.endswith('LOCK') or not os.path.isfile(src):
+            continue
+
+        dst = os.path.join(dst_dir, name)
+        if name in copy_names:
+            shutil.copyfile(src, dst)
+            continue
+        try:
+            os.link(src, dst)
+        except OSError:     # file system senza hard link
+            shutil.copyfile(src, dst)
+
+
+def publish(root, gen_dir):
+    """
+    Sostituzione atomica della generazione in uso.
+
+    :param root: cartella dell'indice
+    :param gen_dir: path della generazione da mettere in uso
+    """
+    path_current = os.path.join(root, CURRENT_FILE)
+    with open(path_current + '.tmp', 'w') as fp:
+        fp.write(os.path.basename(gen_dir))
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(path_current + '.tmp', path_current)
+
+
+def openLease(gen_dir):
+    """
+    Lock condiviso sul file READERS della generazione, da tenere finchè il processo la usa.
+
+    :param gen_dir: path della generazione
+    return file aperto da passare a 'closeLease', None se i lock non sono disponibili
+    """
+    if fcntl is None:
+        return None
+
+    fp = open(os.path.join(gen_dir, READERS_FILE), 'a')
+    fcntl.flock(fp.fileno(), fcntl.LOCK_SH)
+    return fp
+
+
+def closeLease(lease):
+    """
+    :param lease: valore ritornato da 'openLease'
+    """
+    if lease is not None:
+        lease.close()
+
+
+def removeOld(root, keep=2):
+    """
+    Eliminazione delle generazioni precedenti a quella in uso, tranne le 'keep' più recenti
+    (compresa quella in uso) e quelle ancora aperte da un processo (lock su READERS, vedi 
+    'openLease'): vengono eliminate da una build successiva, dopo che il processo è passato alla 
+    nuova generazione (WikiIndex.refresh) o è terminato.
+    Durante l'eliminazione viene tenuto il lock esclusivo, quindi nessun processo può aprirla.
+
+    :param root: cartella dell'indice
+    :param keep: generazioni da mantenere fino a quella in uso compresa
+    """
+    current = currentGeneration(root)
+    if current is None:
+        return
+
+    names = listGenerations(root)
+    older = names[:names.index(os.path.basename(current)) + 1]
+    for name in older[:-keep] if keep > 0 else older:
+        gen_dir = os.path.join(root, name)
+        if fcntl is None:
+            shutil.rmtree(gen_dir, ignore_errors=True)
+            continue
+
+        with open(os.path.join(gen_dir, READERS_FILE), 'a') as fp:
+            try:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                print('Generazione '+name+' ancora in uso da un altro processo: non viene eliminata')
+                continue
+            shutil.rmtree(gen_dir, ignore_errors=True)
+
+
+def generationPaths(args_paths, gen_dir):
+    """
+    Copia di 'args_paths' con i path della generazione: 'index_dir' è la cartella della generazione
+    e la table del pagerank ('pagerank') e il file dei redirect ('redirects', se definito) vengono 
+    salvati al suo interno, quindi una build non tocca quelli della generazione in uso.
+
+    :param args_paths: argomenti da linea di comando
+    :param gen_dir: path della generazione
+    return argomenti con 'index_dir', 'pagerank' e 'redirects' della generazione
+    """
+    paths = copy.copy(args_paths)
+    paths.index_dir = gen_dir
+    paths.pagerank = os.path.join(gen_dir, os.path.basename(args_paths.pagerank))
+    if getattr(args_paths, 'redirects', None):
+        paths.redirects = os.path.join(gen_dir, os.path.basename(args_paths.redirects))
+    return paths
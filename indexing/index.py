@@ -13,13 +13,23 @@ from whoosh.fields import SchemaClass, TEXT, ID, STORED, KEYWORD, NUMERIC
 from whoosh.qparser import QueryParser
 
 import shutil  
+import pickle
+import contextlib
+import copy
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
-from .xmlParsing import saxReader
+from .xmlParsing import saxReader, multistream, filterText, parsedStore, redirects
 
-from .analysis.analyzers import SimpleAnalyzer_, StandardAnalyzer_, StemmingAnalyzer_, AccentStemmingAnalyzer, LemmatizingAnalyzer 
+from .analysis import formTable
+from .analysis.analyzers import SimpleAnalyzer_, StandardAnalyzer_, StemmingAnalyzer_, BulkStemmingAnalyzer_, BigramAnalyzer_, AccentStemmingAnalyzer, LemmatizingAnalyzer 
 from .searching.searcher import WikiSearcher
+from .searching.resultCache import ResultCache
 
-from .pageRank.graph import WikiGraph, WikiPageRanker 
+from .pageRank.graph import WikiGraph, StoredGraph, WikiPageRanker, LINKS_FILE
+
+from . import checkpoint, generations, writerPlan, textStore
+from .buildStats import BuildStats
 
 
 class WikiSchema(SchemaClass):
@@ -33,12 +43,86 @@ class WikiSchema(SchemaClass):
     
     TEXT -> usa il Format 'Position' se 'phrase=true' (default) --> (WORD-BASED) con anche il numero delle 
             volte in cui si ripete il token nel documento
+
+    Il testo usa BulkStemmingAnalyzer_, con gli stessi termini di StemmingAnalyzer_ ma più veloce in 
+    fase di indicizzazione (vedi bulkAnalyzer.py).
+    Il testo non è 'stored': per gli highlights viene salvato compresso nel file del testo accanto 
+    all'indice (vedi textStore.py), così i campi memorizzati contengono solo titolo e id.
     """
     id_page = ID(stored=True, unique=True)
-    text = TEXT(analyzer=StemmingAnalyzer_(), stored=True, phrase=False)     #phrase=False per ridurre index
+    text = TEXT(analyzer=BulkStemmingAnalyzer_(), stored=False, phrase=False)    #phrase=False per ridurre index
     title = TEXT(analyzer=StandardAnalyzer_(), stored=True, phrase=False)
+
+
+# Campo opzionale con i bigrammi del testo (vedi WikiIndex.getSchema)
+BIGRAM_FIELD = WikiSearcher.bigram_field
+
+
+def documentFields(schema, id_page, title, text):
+    """
+    :param schema: schema dell'indice in cui aggiungere il documento
+    :param id_page: id della pagina
+    :param title: titolo della pagina
+    :param text: testo pulito della pagina
+    return dict dei campi del documento (con i bigrammi se lo schema li prevede)
+    """
+    fields = {'text': text, 'title': title, 'id_page': id_page}
+    if BIGRAM_FIELD in schema:
+        fields[BIGRAM_FIELD] = text
+    return fields
      
 
+def setFormTables(args_paths):
+    """
+    Impostazione delle tabelle delle forme usate dagli analizzatori in questo processo 
+    (vedi formTable.py). Se un file non esiste gli stem / lemmi vengono calcolati con la sola cache LRU.
+
+    :param args_paths: argomenti (stem_table, lemma_table)
+    """
+    for kind in formTable.KINDS:
+        formTable.setTable(kind, getattr(args_paths, kind+'_table', formTable.DEFAULT_TABLES[kind]))
+
+
+def buildShard(args_paths, shard_dir, ranges, limitmb=256):
+    """
+    Creazione di un indice parziale (shard) a partire da un gruppo di stream del dump multistream.
+    Viene eseguita in un processo separato: ogni shard ha il proprio indice whoosh, il proprio file del
+    testo e la propria lista dei link, che vengono poi uniti dal processo principale.
+
+    :param args_paths: paths (corpus, interwiki_links, redirects)
+    :param shard_dir: cartella dello shard
+    :param ranges: lista di tuple (start, end) degli stream da leggere
+    :param limitmb: MB del writer dello shard (vedi writerPlan.py)
+    return shard_dir
+    """
+    os.makedirs(shard_dir)
+    setFormTables(args_paths)
+    shard_index = index.create_in(shard_dir, WikiIndex.getSchema(getattr(args_paths, 'bigrams', False)))
+    writer = shard_index.writer(limitmb=limitmb)
+    wiki_filter = filterText.FilterWikiText(args_paths.interwiki_links, **filterText.filterOptions(args_paths))
+    pages = []
+
+    with contextlib.ExitStack() as stack:
+        text_store = stack.enter_context(textStore.TextStoreWriter(os.path.join(shard_dir, textStore.STORE_FILE)))
+        redirect_fn = None
+        if getattr(args_paths, 'redirects', None):
+            redirect_fn = stack.enter_context(
+                redirects.RedirectWriter(os.path.join(shard_dir, 'redirects.tsv'))).add
+
+        for page in multistream.iterStreamPages(args_paths.corpus, ranges, redirect_fn):
+            data_parsed = wiki_filter.filterPage(page.title, page.id, page.text)
+            writer.add_document(**documentFields(writer.schema, data_parsed['id'], data_parsed['title'], 
+                                                 data_parsed['text']))
+            text_store.add(data_parsed['id'], data_parsed['text'])
+            pages.append((data_parsed['id'], data_parsed['title'], data_parsed['internal_link']))
+    writer.commit()
+
+    with open(os.path.join(shard_dir, 'links.pkl'), 'wb') as fp:
+        pickle.dump(pages, fp, pickle.HIGHEST_PROTOCOL)
+
+    return shard_dir
+
+
 class WikiIndex:
     
     def __init__(self, args_paths):
@@ -48,49 +132,113 @@ class WikiIndex:
         :param dict_paths : paths che servono all'indice
         """
         self.args_paths = args_paths
+        setFormTables(args_paths)
+        # Paths della generazione in uso (vedi generations.py), impostati all'apertura dell'indice
+        self.paths = None
+        # Lock sulla generazione aperta e stato di 'CURRENT' quando è stata aperta (vedi 'refresh')
+        self.__lease = None
+        self.__current_stamp = None
         
         self.__index = None
         self.__page_ranker = None
         self.__searcher = None
+        # Query in corso per ogni searcher e searcher sostituiti da chiudere (con il lock della loro
+        # generazione) quando terminano le loro query (vedi '__closeRetired')
+        self.__lock = threading.Lock()
+        self.__running = {}
+        self.__retired = []
+        # Cache dei risultati condivisa dai searcher: viene svuotata quando cambia la generazione 
+        # dell'indice o la table del pagerank (vedi WikiSearcher)
+        self.__cache = ResultCache(getattr(args_paths, 'cache_size', 256), getattr(args_paths, 'cache_ttl', 300))
         
     @classmethod 
-    def getSchema(cls):
+    def getSchema(cls, bigrams=False):
         """
+        Con 'bigrams' viene aggiunto il campo BIGRAM_FIELD con i bigrammi dei termini del testo 
+        (BigramAnalyzer_): le query di più parole vengono riscritte anche con i bigrammi 
+        (vedi WikiSearcher), con una precisione simile alle frasi senza salvare le posizioni.
+
         :param self
+        :param bigrams: se True lo schema contiene il campo dei bigrammi
         return dello schema dell'indice.
         """
-        return WikiSchema
+        if not bigrams:
+            return WikiSchema
+
+        schema = WikiSchema()
+        schema.add(BIGRAM_FIELD, TEXT(analyzer=BigramAnalyzer_(), stored=False, phrase=False))
+        return schema
 
 
     def openOrBuild(self):
         """
-        Apre un indice già esistente oppure se non esiste ne crea uno nuovo.
+        Apre la generazione in uso dell'indice (vedi generations.py) oppure se non esiste ne crea 
+        una nuova.
+        Se l'ultima generazione contiene un checkpoint, la sua build è stata interrotta: viene 
+        completata se è specificato 'resume', altrimenti viene aperta la generazione in uso (o 
+        creato un nuovo indice se non ce n'è una).
+        Un indice creato direttamente in 'index_dir' (senza generazioni) viene aperto così com'è.
         
         :param self
         """
-        if index.exists_in(self.args_paths.index_dir):
+        root = self.args_paths.index_dir
+        staging = generations.lastStaging(root)
+        current = generations.currentGeneration(root)
+
+        if staging is not None and checkpoint.canResume(staging) and \
+           (getattr(self.args_paths, 'resume', False) or current is None):
+            print('  Indice incompleto, creazione indice dal dump..')
+            return self.build()
+
+        if current is not None or index.exists_in(root):
             print('  Lettura indice da file..')
             try:
-                self.__index = index.open_dir(self.args_paths.index_dir)
-                self.__afterBuild()
+                if current is not None:
+                    self.__afterBuild(generations.generationPaths(self.args_paths, current))
+                else:
+                    self.__afterBuild(self.args_paths)
 
                 return True
             except Exception as e:
                 raise(e)
-                print('! Errore caricamento indice dal path: '+self.args_paths.index_dir)
+                print('! Errore caricamento indice dal path: '+root)
                 return False
         else:
             print('  Creazione indice dal dump..')
             return self.build() 
+
+
+    def refresh(self):
+        """
+        Passaggio alla generazione in uso, se è cambiata (es: creata da un altro processo).
+        Viene chiamata prima di ogni query: se 'CURRENT' non è cambiato dall'ultimo controllo
+        costa una sola 'stat' (vedi generations.currentStamp).
+        Le query in corso terminano sul vecchio searcher, le successive usano quello nuovo.
+
+        :param self
+        return True se è stata aperta una nuova generazione
+        """
+        root = self.args_paths.index_dir
+        stamp = generations.currentStamp(root)
+        if stamp is None or stamp == self.__current_stamp:
+            return False
+
+        current = generations.currentGeneration(root)
+        if current is None or (self.paths is not None and self.paths.index_dir == current):
+            self.__current_stamp = stamp
+            return False
+
+        self.__afterBuild(generations.generationPaths(self.args_paths, current))
+        self.__current_stamp = stamp
+        return True
     
 
     def build(self): 
         """
         DOCS : https://whoosh.readthedocs.io/en/latest/indexing.html
         
-        Creazione di un nuovo indice situato nella directory settata nell'__init__ della classe.
-        Se esistente, la cartella dell'indice viene eliminata per poi esssere ricreata con il 
-        nuovo indice.
+        Creazione di un nuovo indice in una nuova generazione della directory settata nell'__init__ 
+        della classe (vedi GENERAZIONI).
         Viene creato il writer, per poi leggere il file xml di wikipedia e ogni volta che una pagina è 
         letta correttamente, viene chiamata la funzione '__addWikiPage' per poi eseguire il commit
         del writer una volta che ho letto tutto il file.
@@ -105,19 +253,92 @@ class WikiIndex:
         # multisegment: se True fa in modo che ogni sub-writer crei segmenti 
                         separati senza fare il merge.
                         Vengono creati n-segmenti se sono abilitati n processori.        
+        I valori vengono scelti da writerPlan.py in base a core, memoria disponibile e dimensione del
+        corpus (o imposti con 'procs', 'limitmb', 'merge'), e il piano viene salvato nel riepilogo 
+        della build ('writer_plan').
+
+        CHECKPOINT  (vedi checkpoint.py)
+        # checkpoint_pages / checkpoint_minutes : ogni quante pagine / minuti eseguire il commit
+                    dei documenti letti fino a quel momento e salvare i link per il grafo.
+        # resume : se la cartella dell'indice contiene un checkpoint, la build riprende dall'ultima 
+                   pagina salvata invece di ricominciare da capo.
+
+        TESTO  (vedi textStore.py)
+        Il testo pulito di ogni pagina, usato per gli highlights, viene salvato compresso nel file 
+        'text.store' della generazione invece che nei campi memorizzati dell'indice.
+
+        GENERAZIONI  (vedi generations.py)
+        L'indice, la table del pagerank e i file della build vengono scritti in una nuova generazione 
+        dentro 'index_dir', mentre l'indice in uso (se presente) continua a rispondere alle query.
+        Alla fine la generazione viene validata e messa in uso in modo atomico, e il searcher passa 
+        al nuovo indice; se la build fallisce l'indice in uso non cambia.
+
+        STATISTICHE  (vedi buildStats.py)
+        Ogni 'stats_interval' secondi viene aggiunta una riga JSON a 'build_stats.jsonl' con i tempi
+        di ogni fase, e alla fine viene scritto il riepilogo 'build_summary.json', entrambi nella
+        cartella dell'indice.
+
+        PAGINE FILTRATE  (vedi parsedStore.py)
+        # parsed_store : se il file esiste le pagine vengono lette da lì, senza parsing del dump e 
+                         senza filtraggio del testo; altrimenti viene creato durante la lettura del dump.
+                         Non viene usato quando si riprende una build da un checkpoint né con 
+                         'multistream_index' (viene stampato un avviso).
+
+        BIGRAMMI
+        # bigrams : lo schema contiene anche il campo con i bigrammi del testo (vedi 'getSchema'), 
+                    usato dal searcher per le query di più parole e le frasi tra virgolette.
+
+        REDIRECT  (vedi redirects.py)
+        # redirects : file dove vengono salvate le coppie (redirect, destinazione) durante la lettura
+                      del dump; viene usato nel calcolo degli archi del grafo per risolvere i link 
+                      che puntano a un redirect. Il file è nella cartella della generazione (vedi 
+                      generations.generationPaths). Se le pagine vengono lette da 'parsed_store' viene 
+                      copiato quello della generazione in uso (o il file 'redirects' indicato, se 
+                      non ci sono generazioni).
         
         :param self
         """
-        
-        if os.path.exists(self.args_paths.index_dir):
-            shutil.rmtree(self.args_paths.index_dir)  
-        os.mkdir(self.args_paths.index_dir)
-
-        graph = WikiGraph(self.args_paths)
-        
-        self.__index = index.create_in(self.args_paths.index_dir, WikiIndex.getSchema())
-
-        writer = self.__index.writer(limitmb=2048, procs=4, multisegment=True)  
+        root = self.args_paths.index_dir
+        staging = generations.lastStaging(root)
+        resuming = getattr(self.args_paths, 'resume', False) and staging is not None and \
+                   checkpoint.canResume(staging)
+        paths = generations.generationPaths(self.args_paths, 
+                                            staging if resuming else generations.newGeneration(root))
+
+        graph = WikiGraph(paths)
+        start_offset, skip_id, resumed_pages = 0, None, 0
+        path_store = getattr(paths, 'parsed_store', None)
+
+        if resuming:
+            build_index = index.open_dir(paths.index_dir)
+            records, start_offset, skip_id = checkpoint.loadCheckpoint(paths.index_dir,
+                                                                       build_index.doc_count())
+            for id_page, title, links, _ in records:
+                graph.addPage(id_page, title, links)
+            resumed_pages = len(records)
+            print('Ripresa della build in '+paths.index_dir+' dopo '+str(len(records))+
+                  ' pagine già indicizzate')
+        else:
+            print('Creazione indice in '+paths.index_dir)
+            build_index = index.create_in(paths.index_dir, WikiIndex.getSchema(getattr(paths, 'bigrams', False)))
+
+        stats = BuildStats(os.path.join(paths.index_dir, 'build_stats.jsonl'),
+                           getattr(paths, 'stats_interval', 10), resumed_pages, start_offset)
+
+        plan = writerPlan.planFromArgs(paths)
+        stats.info['writer_plan'] = plan
+        print('Writer : '+writerPlan.describe(plan))
+
+        checkpointer = checkpoint.BuildCheckpointer(build_index, 
+                                                    writerPlan.writerKwargs(plan),
+                                                    paths.index_dir,
+                                                    getattr(paths, 'checkpoint_pages', 0),
+                                                    getattr(paths, 'checkpoint_minutes', 0),
+                                                    stats,
+                                                    textStore.TextStoreWriter(
+                                                        os.path.join(paths.index_dir, textStore.STORE_FILE),
+                                                        append=resuming),
+                                                    pages=resumed_pages)
 
         try:     
             import time
@@ -125,67 +346,413 @@ class WikiIndex:
 
             print('Lettura file xml ...')
             start = time.time()
-            saxReader.readXML(self.args_paths, self.__addWikiPage, graph, writer)
+            if getattr(paths, 'multistream_index', None):
+                if path_store:
+                    print('! parsed_store ignorato: con multistream_index le pagine vengono lette dal dump')
+                with stats.stage('shards'):
+                    self.__readSharded(paths, graph, checkpointer, plan['shard_limitmb'])
+            elif path_store and os.path.exists(path_store) and not resuming:
+                print('Lettura pagine filtrate da '+path_store+' ...')
+                self.__copyRedirects(paths)
+                parsedStore.readStore(path_store, self.__addWikiPage, graph, checkpointer, stats,
+                                      workers=max(1, getattr(paths, 'workers', 1)), stats=stats)
+            else:
+                with self.__openStore(path_store if not resuming else None) as store_writer, \
+                     self.__openRedirects(paths, resuming) as redirect_writer:
+                    add_page = self.__addWikiPage
+                    if store_writer is not None:
+                        add_page = parsedStore.teeStore(store_writer, self.__addWikiPage)
+
+                    saxReader.readXML(paths, add_page, graph, checkpointer, stats,
+                                      start_offset=start_offset, skip_id=skip_id, stats=stats,
+                                      redirect_fn=redirect_writer.add if redirect_writer is not None else None)
             end = time.time()
             print('Tempo di lettura file xml : '+str(round(end-start, 5)))
 
             print('Commit indice ...')
             start = time.time()
-            writer.commit()
+            checkpointer.commit(optimize=plan['optimize'])
             end = time.time()
             print('Tempo di commit indice : '+str(round(end-start, 5)))
 
             print('Calcolo pagerank ...')
             start = time.time()
-            graph.end()
+            with stats.stage('edges'):
+                redirect_table = graph.redirectTable()
+                if redirect_table is not None:
+                    print('Redirect risolti nel grafo : '+str(len(redirect_table)))
+                graph.computeEdges(redirect_table)
+                graph.save(os.path.join(paths.index_dir, LINKS_FILE), redirect_table)
+            with stats.stage('pagerank'):
+                WikiPageRanker.computePageRank(graph.graph, paths)
             end = time.time()
             print('Tempo calcolo pagerank : '+str(round(end-start, 5)))
 
-            self.__afterBuild()  
+            stats.summary(os.path.join(paths.index_dir, 'build_summary.json'))
+
+            self.__validate(paths)
+            generations.publish(root, paths.index_dir)
+            self.__afterBuild(paths)
+            generations.removeOld(root)
+
             end_build = time.time()
             print('Tempo totale : '+str(round(end_build-start_build, 5)))
 
-
             return True           
         except Exception as e: 
+            checkpointer.abort()
+            raise(e)
+
+
+    def __validate(self, paths):
+        """
+        Controllo della generazione creata prima di metterla in uso: l'indice deve essere leggibile
+        e non vuoto, e la table del pagerank e il file del testo devono esistere.
+        Genera ValueError se la generazione non è valida.
+
+        :param self
+        :param paths: paths della generazione (vedi generations.generationPaths)
+        """
+        if not index.exists_in(paths.index_dir):
+            raise ValueError('Indice non trovato in '+paths.index_dir)
+
+        with index.open_dir(paths.index_dir).reader() as reader:
+            if reader.doc_count() == 0:
+                raise ValueError('Indice vuoto in '+paths.index_dir)
+
+        if not os.path.exists(paths.pagerank):
+            raise ValueError('Table del pagerank non trovata: '+paths.pagerank)
+
+        if not textStore.storePaths(paths.index_dir):
+            raise ValueError('File del testo non trovato in '+paths.index_dir)
+
+
+    def update(self, path_changes, path_deleted=None):
+        """
+        DOCS : https://whoosh.readthedocs.io/en/latest/indexing.html#updating-documents
+
+        Aggiornamento dell'indice esistente, senza ricrearlo, a partire da un dump delle pagine 
+        modificate (es: i dump giornalieri 'adds-changes', anche compressi):
+            - ogni pagina valida del dump sostituisce il documento con lo stesso 'id_page' 
+              ('update_document', 'id_page' è unique nello schema) o viene aggiunta se è nuova, 
+              e sostituisce i suoi link nel grafo;
+            - le pagine del dump diventate redirect vengono eliminate ('delete_by_term') e il 
+              redirect viene aggiunto al file dei redirect;
+            - le pagine con id in 'path_deleted' vengono eliminate;
+            - una pagina che ha perso il titolo, passato a un'altra pagina del dump, viene eliminata
+              dall'indice e dal grafo (se è stata rinominata, il dump contiene anche il nuovo titolo
+              e la pagina viene aggiunta di nuovo).
+        Il testo delle pagine aggiornate viene scritto in un nuovo file del testo ('text.store.<n>', 
+        vedi textStore.py), consultato prima di quelli precedenti.
+        Il grafo viene letto dagli archi salvati alla fine della build o dell'aggiornamento precedente 
+        (LINKS_FILE nella cartella dell'indice, vedi StoredGraph) e il pagerank viene ricalcolato 
+        partendo dalla table esistente (vedi WikiPageRanker.computePageRankFrom).
+
+        GENERAZIONI  (vedi generations.py)
+        L'aggiornamento non modifica la generazione in uso: i suoi file vengono collegati in una nuova
+        generazione (generations.copyGeneration), dove vengono applicate le modifiche; la nuova 
+        generazione viene poi validata e messa in uso come alla fine di una build, quindi anche gli 
+        altri processi che usano l'indice passano all'indice aggiornato (vedi 'refresh').
+        Se l'aggiornamento fallisce la nuova generazione viene eliminata e può essere rieseguito con 
+        gli stessi file. Un indice creato direttamente in 'index_dir' (senza generazioni) viene 
+        aggiornato sul posto.
+
+        :param self
+        :param path_changes: dump xml delle pagine modificate o aggiunte
+        :param path_deleted: file di testo con gli id delle pagine eliminate, uno per riga
+        return True se l'aggiornamento è avvenuto con successo
+        """
+        root = self.args_paths.index_dir
+        current = generations.currentGeneration(root)
+        source = generations.generationPaths(self.args_paths, current) if current is not None else self.args_paths
+
+        if not index.exists_in(source.index_dir) or not os.path.exists(os.path.join(source.index_dir, LINKS_FILE)):
+            print('! Indice o link delle pagine non trovati in '+source.index_dir+
+                  ': è necessario creare l\'indice dal dump')
+            return False
+
+        import time
+        start_update = time.time()
+
+        paths = source
+        if current is not None:
+            paths = generations.generationPaths(self.args_paths, generations.newGeneration(root))
+            generations.copyGeneration(current, paths.index_dir,
+                                       [os.path.basename(source.redirects)] if getattr(source, 'redirects', None) else [])
+            print('Aggiornamento in '+paths.index_dir)
+
+        try:
+            self.__applyUpdate(paths, path_changes, path_deleted)
+            if current is not None:
+                self.__validate(paths)
+                generations.publish(root, paths.index_dir)
+        except Exception as e:
+            if current is not None:
+                shutil.rmtree(paths.index_dir, ignore_errors=True)
             raise(e)
-            print('! Errore durante la creazione indice.')
-            return False   
+
+        self.__afterBuild(paths)
+        if current is not None:
+            generations.removeOld(root)
+        print('Tempo totale : '+str(round(time.time()-start_update, 5)))
+        return True
 
 
-    def __afterBuild(self):
+    def __applyUpdate(self, paths, path_changes, path_deleted):
+        """
+        Modifiche dell'aggiornamento (vedi 'update') nella cartella 'paths.index_dir': documenti 
+        dell'indice, nuovo file del testo, redirect, archi del grafo e table del pagerank.
+
+        :param self
+        :param paths: paths della generazione da aggiornare
+        :param path_changes: dump xml delle pagine modificate o aggiunte
+        :param path_deleted: file di testo con gli id delle pagine eliminate, uno per riga
+        """
+        import time
+
+        path_links = os.path.join(paths.index_dir, LINKS_FILE)
+        graph = StoredGraph.load(paths, path_links)
+        writer = index.open_dir(paths.index_dir).writer(limitmb=256)
+        text_store = textStore.TextStoreWriter(textStore.nextStorePath(paths.index_dir))
+        counts = {'updated': 0, 'deleted': 0}
+
+        def updatePage(**data_parsed):
+            writer.update_document(**documentFields(writer.schema, data_parsed['id'], data_parsed['title'],
+                                                    data_parsed['text']))
+            text_store.add(data_parsed['id'], data_parsed['text'])
+            displaced = graph.updatePage(data_parsed['id'], data_parsed['title'], data_parsed['internal_link'])
+            counts['updated'] += 1
+            if displaced is not None:
+                # il titolo è passato a questa pagina: la pagina che lo aveva non esiste più con 
+                # quel titolo e viene eliminata anche dall'indice
+                deletePage(displaced)
+
+        def deletePage(id_page):
+            writer.delete_by_term('id_page', str(id_page))
+            graph.removePage(id_page)
+            counts['deleted'] += 1
+
+        try:
+            print('Lettura pagine modificate da '+path_changes+' ...')
+            args_changes = copy.copy(paths)
+            args_changes.corpus = path_changes
+
+            with self.__openRedirects(paths, append=True) as redirect_writer:
+                def addRedirect(title, target):
+                    if redirect_writer is not None:
+                        redirect_writer.add(title, target)
+                    id_page = graph.owner(title)
+                    if id_page is not None:
+                        deletePage(id_page)
+
+                saxReader.readXML(args_changes, updatePage, redirect_fn=addRedirect)
+
+            if path_deleted:
+                with open(path_deleted, 'r') as fp:
+                    for line in fp:
+                        if line.strip():
+                            deletePage(line.strip())
+
+            print('Commit indice ...')
+            text_store.close()
+            writer.commit()
+        except Exception as e:
+            writer.cancel()
+            text_store.abort()
+            raise(e)
+
+        print('Pagine aggiornate : '+str(counts['updated'])+', eliminate : '+str(counts['deleted']))
+
+        print('Calcolo pagerank ...')
+        start = time.time()
+        ids, src, dst = graph.save(path_links, graph.redirectTable())
+        iterations = WikiPageRanker.computePageRankFrom(ids, src, dst, paths, WikiPageRanker.readTable(paths))
+        print('Tempo calcolo pagerank : '+str(round(time.time()-start, 5))+' ('+str(iterations)+' iterazioni)')
+
+
+    def __openStore(self, path_store):
+        """
+        Apertura del file dove salvare le pagine filtrate durante la lettura del dump.
+
+        :param self
+        :param path_store: path del file, se None le pagine non vengono salvate
+        return context manager che ritorna il ParsedStoreWriter (o None)
+        """
+        if not path_store:
+            return contextlib.nullcontext()
+
+        print('Salvataggio pagine filtrate in '+path_store)
+        return parsedStore.ParsedStoreWriter(path_store)
+
+
+    def __openRedirects(self, paths, append=False):
+        """
+        Apertura del file dove salvare i redirect durante la lettura del dump.
+
+        :param self
+        :param paths: paths della generazione (vedi generations.generationPaths)
+        :param append: se True i redirect vengono aggiunti al file esistente (ripresa di una build)
+        return context manager che ritorna il RedirectWriter (o None se 'redirects' non è definito)
+        """
+        path_redirects = getattr(paths, 'redirects', None)
+        if not path_redirects:
+            return contextlib.nullcontext()
+
+        return redirects.RedirectWriter(path_redirects, append)
+
+
+    def __copyRedirects(self, paths):
+        """
+        Copia nella generazione in costruzione del file dei redirect della generazione in uso 
+        (o del file 'redirects' indicato negli argomenti), quando le pagine vengono lette da 
+        'parsed_store' e i redirect del dump non vengono riletti.
+
+        :param self
+        :param paths: paths della generazione in costruzione
+        """
+        path_redirects = getattr(paths, 'redirects', None)
+        if not path_redirects:
+            return
+
+        current = generations.currentGeneration(self.args_paths.index_dir)
+        sources = [self.args_paths.redirects]
+        if current is not None:
+            sources.insert(0, generations.generationPaths(self.args_paths, current).redirects)
+
+        for source in sources:
+            if os.path.exists(source) and os.path.abspath(source) != os.path.abspath(path_redirects):
+                shutil.copyfile(source, path_redirects)
+                return
+
+
+    def __readSharded(self, paths, graph, checkpointer, limitmb):
+        """
+        Lettura del dump multistream con più processi.
+        Gli stream elencati nel file indice vengono divisi in 'args_paths.workers' gruppi di stream
+        consecutivi; ogni processo crea il proprio shard (indice e lista dei link) con 'buildShard'.
+        Gli shard vengono poi aggiunti, nell'ordine del dump, al writer dell'indice finale, al file
+        del testo, al grafo e al file dei redirect.
+
+        :param self
+        :param paths: paths della generazione in costruzione
+        :param graph: instanza di grafo per il page rank
+        :param checkpointer: contiene il writer e il file del testo dell'indice finale
+        :param limitmb: MB del writer di ogni shard
+        """
+        workers = max(1, getattr(paths, 'workers', 1))
+        ranges = multistream.streamRanges(paths.multistream_index, paths.corpus)
+        groups = multistream.splitRanges(ranges, workers)
+
+        shards_root = os.path.join(paths.index_dir, 'shards')
+        print('Lettura di '+str(len(ranges))+' stream con '+str(len(groups))+' processi ...')
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor, \
+                 self.__openRedirects(paths) as redirect_writer:
+                futures = [executor.submit(buildShard, paths,
+                                           os.path.join(shards_root, str(n)), group, limitmb)
+                           for n, group in enumerate(groups)]
+
+                for future in futures:
+                    shard_dir = future.result()
+
+                    with index.open_dir(shard_dir).reader() as reader:
+                        checkpointer.writer.add_reader(reader)
+                    checkpointer.text_store.addFrom(os.path.join(shard_dir, textStore.STORE_FILE))
+
+                    with open(os.path.join(shard_dir, 'links.pkl'), 'rb') as fp:
+                        for id_page, title, links in pickle.load(fp):
+                            graph.addPage(id_page, title, links)
+
+                    if redirect_writer is not None:
+                        redirect_writer.addFrom(os.path.join(shard_dir, 'redirects.tsv'))
+        finally:
+            shutil.rmtree(shards_root, ignore_errors=True)
+
+
+    def __afterBuild(self, paths):
         """
         Funzione che deve essere chiamata dopo che l'indice è stato creato oppure caricato da file.
-        Configura il page_ranker e il searcher.
+        Apre l'indice e il file del testo e configura il page_ranker e il searcher. Il nuovo searcher viene preparato 
+        completamente prima di sostituire quello in uso, quindi le query non trovano mai l'indice 
+        e la table del pagerank di generazioni diverse.
+        Il searcher sostituito (reader di whoosh e file del testo) e il lock della sua generazione 
+        vengono chiusi quando terminano le query in corso su di esso (vedi '__closeRetired').
 
         :param self
+        :param paths: paths dell'indice da aprire (vedi generations.generationPaths)
         """
         print('Caricamento in memoria del file di pagerank e searcher ...')
 
-        self.__page_ranker = WikiPageRanker(self.args_paths)
-        self.__searcher = WikiSearcher(self.__index, self.__page_ranker)
+        lease = None
+        if paths.index_dir != self.args_paths.index_dir:
+            lease = generations.openLease(paths.index_dir)
+        try:
+            wiki_index = index.open_dir(paths.index_dir)
+            page_ranker = WikiPageRanker(paths)
+            searcher = WikiSearcher(wiki_index, page_ranker, textStore.TextStore.open(paths.index_dir),
+                                    self.__cache)
+        except Exception:
+            generations.closeLease(lease)
+            raise
+
+        with self.__lock:
+            if self.__searcher is not None or self.__lease is not None:
+                self.__retired.append((self.__searcher, self.__lease))
+            self.__index, self.__page_ranker, self.__searcher = wiki_index, page_ranker, searcher
+            self.paths = paths
+            self.__lease = lease
+        self.__closeRetired()
 
         print('* Creazione / caricamento indice avvenuta con successo')
 
         
-    def __addWikiPage(self, graph, writer, **data_parsed):
+    def __closeRetired(self):
+        """
+        Chiusura dei searcher sostituiti senza query in corso, e rilascio del lock della loro 
+        generazione, che da quel momento può essere eliminata (vedi generations.removeOld).
+
+        :param self
+        """
+        with self.__lock:
+            idle = [(searcher, lease) for searcher, lease in self.__retired 
+                    if searcher not in self.__running]
+            self.__retired = [(searcher, lease) for searcher, lease in self.__retired 
+                              if searcher in self.__running]
+
+        for searcher, lease in idle:
+            if searcher is not None:
+                searcher.close()
+            generations.closeLease(lease)
+
+
+    def __addWikiPage(self, graph, checkpointer, stats, **data_parsed):
         """
         Questa funzione viene chiamata quando viene letta una pagina valida dal dump xml.
         Aggiungo la pagina all'indice, e aggiungo pagina al grafo.
         
         :param self
         :param graph: instanza di grafo per il page rank
-        :param writer: writer per poter aggiungere all'index la pagina di wikipedia letta dal dump
+        :param checkpointer: contiene il writer per poter aggiungere all'index la pagina di wikipedia
+                             letta dal dump, ed esegue i checkpoint
+        :param stats: BuildStats dove registrare i tempi
         :param data_parsed: dati letti e filtrati che sono stati ritornati dopo la lettura del dump xml
         """
-        if self.__index is not None and writer is not None:
+        if checkpointer is not None:
             title = data_parsed['title']
             text = data_parsed['text']
             id_page = data_parsed['id']
             link = data_parsed['internal_link']
 
-            writer.add_document(text=text, title=title, id_page=id_page)
-            graph.addPage(id_page, title, link)
+            with stats.stage('add_document'):
+                checkpointer.writer.add_document(**documentFields(checkpointer.writer.schema, id_page, title, text))
+            if checkpointer.text_store is not None:
+                with stats.stage('text_store'):
+                    checkpointer.text_store.add(id_page, text)
+            with stats.stage('addPage'):
+                graph.addPage(id_page, title, link)
+            checkpointer.pageAdded(id_page, title, link, data_parsed['offset'])
+            stats.page(data_parsed['offset'])
         else:
             print('! Problemi durante indicizzazione pagina wikipedia')
             
@@ -210,6 +777,17 @@ class WikiIndex:
         return dict con le info
         """
         return self.__searcher.getGeneralInfo()
+
+
+    def getCacheInfo(self):
+        """
+        Ottengo dimensione e contatori (hit, miss, ..) della cache dei risultati.
+        Funzione utile in fase di debug.
+        
+        :param self:
+        return dict con le info
+        """
+        return self.__cache.info()
         
         
     def query(self, text, **settings): 
@@ -224,7 +802,23 @@ class WikiIndex:
                         e il riferimento ai documenti interi (url)
         """
         if self.__index is not None:
-            return self.__searcher.search(text, **settings)
+            try:
+                self.refresh()
+            except Exception as e:
+                print('! Errore nel passaggio alla nuova generazione dell\'indice: '+str(e))
+
+            with self.__lock:
+                searcher = self.__searcher
+                self.__running[searcher] = self.__running.get(searcher, 0) + 1
+            try:
+                return searcher.search(text, **settings)
+            finally:
+                with self.__lock:
+                    self.__running[searcher] -= 1
+                    if not self.__running[searcher]:
+                        del self.__running[searcher]
+                if self.__retired:
+                    self.__closeRetired()
         else:
             return None
 
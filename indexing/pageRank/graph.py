@@ -7,22 +7,34 @@ Created on Tue Sep 29 09:00:43 2020
 """
 
 import snap
+import numpy as np
 
 import math
+import os
 
+from ..xmlParsing.redirects import RedirectTable
+
+
+# File, nella cartella dell'indice, dove viene salvata la lista degli archi del grafo alla fine della 
+# build: serve per aggiornare il grafo e il pagerank senza rileggere tutto il dump (vedi WikiIndex.update)
+LINKS_FILE = 'graph.links'
 
 def snapSave(to_save, file_name):
     """
     Salvataggio in formato binario.
     Viene sovrascritto il contenuto del file specificato se già esistente.
     Viene creato il file se non esiste.
+    Il file viene scritto con un altro nome e poi rinominato, quindi chi lo legge durante il 
+    salvataggio trova sempre la versione precedente completa.
 
     :param to_save: oggetto da salvare
     :param file_name: nome del file dove salvare l'oggetto
     """
-    f_out = snap.TFOut(file_name)
+    f_out = snap.TFOut(file_name + '.tmp')
     to_save.Save(f_out)
     f_out.Flush()
+    del f_out
+    os.replace(file_name + '.tmp', file_name)
 
 
 def snapLoad(to_load, file_name):
@@ -36,6 +48,57 @@ def snapLoad(to_load, file_name):
     to_load.Load(f_in) 
 
 
+def loadRedirects(args_paths):
+    """
+    Caricamento della tabella dei redirect scritta durante la lettura del dump (vedi redirects.py).
+
+    :param args_paths: argomenti (redirects)
+    return RedirectTable, o None se 'args_paths.redirects' non è definito o il file non esiste
+    """
+    path_redirects = getattr(args_paths, 'redirects', None)
+    if not path_redirects or not os.path.exists(path_redirects):
+        return None
+
+    return RedirectTable.load(path_redirects)
+
+
+def saveEdges(path_links, ids, titles, src, dst):
+    """
+    Salvataggio del grafo come lista di archi tra nodi, in un file npz di numpy (senza pickle):
+        ids    : id delle pagine in ordine crescente (int64)
+        titles : titoli delle pagine nello stesso ordine, uniti da '\\n' (utf-8)
+        src    : indice del nodo di partenza di ogni arco (int32)
+        dst    : indice del nodo di arrivo di ogni arco (int32)
+    Il file viene scritto con un altro nome e poi rinominato, quindi non resta mai a metà.
+
+    :param path_links: file dove salvare il grafo
+    :param ids: array degli id delle pagine
+    :param titles: lista dei titoli, nell'ordine di 'ids'
+    :param src: array degli indici (in 'ids') dei nodi di partenza
+    :param dst: array degli indici (in 'ids') dei nodi di arrivo
+    """
+    order = np.argsort(ids, kind='stable')
+    position = np.empty(len(ids), dtype=np.int32)
+    position[order] = np.arange(len(ids), dtype=np.int32)
+    blob = '\n'.join([titles[node] for node in order.tolist()]).encode('utf-8')
+
+    with open(path_links + '.tmp', 'wb') as fp:
+        np.savez(fp, ids=ids[order], titles=np.frombuffer(blob, dtype=np.uint8),
+                 src=position[src], dst=position[dst])
+    os.replace(path_links + '.tmp', path_links)
+
+
+def loadEdges(path_links):
+    """
+    :param path_links: file scritto con 'saveEdges'
+    return (array degli id, lista dei titoli, array dei nodi di partenza, array dei nodi di arrivo)
+    """
+    with np.load(path_links, allow_pickle=False) as data:
+        ids, src, dst = data['ids'], data['src'], data['dst']
+        titles = data['titles'].tobytes().decode('utf-8').split('\n') if len(ids) else []
+    return ids, titles, src, dst
+
+
 class WikiGraph():
     """
     DOC : https://snap.stanford.edu/snappy/doc/reference/graphs.html
@@ -73,6 +136,21 @@ class WikiGraph():
         self.compact_struct = {}
 
 
+    def save(self, path_links, redirects=None):
+        """
+        Salvataggio degli archi del grafo con 'saveEdges' (id e titoli delle pagine e archi tra id, 
+        senza i link verso titoli che non esistono), letti poi da StoredGraph per gli aggiornamenti.
+
+        :param self
+        :param path_links: file dove salvare il grafo
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        return array degli archi salvati (vedi 'edgeArrays')
+        """
+        ids, src, dst = self.edgeArrays(redirects)
+        saveEdges(path_links, ids, list(self.compact_struct), src, dst)
+        return ids, src, dst
+
+
     def addPage(self, id_page, title_page, titles_page_linked=[]):
         """
         Aggiungo una pagina al grafo e aggiorno il compact_struct con la pagina 
@@ -96,16 +174,21 @@ class WikiGraph():
             self.compact_struct[title_page][1].add(linked_page)
 
 
-    def computeEdges(self):
+    def redirectTable(self):
         """
-        Per ogni pagina (page_from), ricavo il suo id (id_page_from) e il suo set di titoli 
-        corrispondenti ai link a cui punta. Per ognuno di questi titoli, guardo se è presente nel grafo 
-        (page_to not None) e in caso affermativo ricavo il suo id id_page_to, per poi creare l'edge
-        dato da (page_from, page_to).
+        :param self
+        return RedirectTable, o None se non è stata salvata (vedi 'loadRedirects')
+        """
+        return loadRedirects(self.args_paths)
 
-        In tutti gli edges (a,b) che creo, 'a' e 'b' sono entrambi presenti nel grafo.
+
+    def iterEdges(self, redirects=None):
+        """
+        Generatore degli archi del grafo (vedi 'computeEdges').
 
         :param self
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        yield: (id_page_from, id_page_to)
         """
         for page_from in self.compact_struct.values():
             id_page_from = page_from[0]
@@ -113,10 +196,48 @@ class WikiGraph():
 
             for link in links_out:
                 page_to = self.compact_struct.get(link, None)
+                if page_to is None and redirects is not None:
+                    page_to = self.compact_struct.get(redirects.resolve(link), None)
                 if page_to is not None:
-                    id_page_to = page_to[0]
+                    yield id_page_from, page_to[0]
+
 
-                    self.graph.AddEdge(id_page_from, id_page_to)
+    def edgeArrays(self, redirects=None):
+        """
+        Archi del grafo come array numpy di indici dei nodi, senza usare il grafo snap
+        (vedi WikiPageRanker.computePageRankFrom). Gli archi ripetuti (es: un link e un redirect 
+        verso la stessa pagina) vengono contati una volta sola, come in 'computeEdges'.
+
+        :param self
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        return (id delle pagine, indici dei nodi di partenza, indici dei nodi di arrivo)
+        """
+        ids = np.fromiter((page[0] for page in self.compact_struct.values()), dtype=np.int64,
+                          count=len(self.compact_struct))
+        node = {id_page: n for n, id_page in enumerate(ids.tolist())}
+
+        edges = np.fromiter((node[id_page_from] * len(ids) + node[id_page_to]
+                             for id_page_from, id_page_to in self.iterEdges(redirects)), dtype=np.int64)
+        edges = np.unique(edges)
+        return ids, (edges // len(ids)).astype(np.int32), (edges % len(ids)).astype(np.int32)
+
+
+    def computeEdges(self, redirects=None):
+        """
+        Per ogni pagina (page_from), ricavo il suo id (id_page_from) e il suo set di titoli 
+        corrispondenti ai link a cui punta. Per ognuno di questi titoli, guardo se è presente nel grafo 
+        (page_to not None) e in caso affermativo ricavo il suo id id_page_to, per poi creare l'edge
+        dato da (page_from, page_to).
+        Se il titolo non è nel grafo ma è un redirect, l'edge punta alla pagina di destinazione
+        del redirect (le catene sono già appiattite in 'redirects', quindi basta una ricerca).
+
+        In tutti gli edges (a,b) che creo, 'a' e 'b' sono entrambi presenti nel grafo.
+
+        :param self
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        """
+        for id_page_from, id_page_to in self.iterEdges(redirects):
+            self.graph.AddEdge(id_page_from, id_page_to)
 
 
     def end(self):
@@ -125,22 +246,221 @@ class WikiGraph():
         ovvero quando ho aggiunto tutte le pagine (nodi) ad esso.
 
         Qua eseguo il 'computeEdges()' che mi calcola tutti i possibili edges che 
-        compongono il grafo, per poi effettuare il pagerank.
+        compongono il grafo (risolvendo i redirect, se è stata salvata la loro tabella), per poi 
+        effettuare il pagerank.
 
         Non viene salvato il grafo ma solo il file corrispondente alla table del pagrank.
 
         :param self
         """
-        self.computeEdges()
+        self.computeEdges(self.redirectTable())
         WikiPageRanker.computePageRank(self.graph, self.args_paths)
 
 
+class StoredGraph():
+    """
+    Grafo salvato alla fine della build o di un aggiornamento (vedi 'saveEdges'), usato da 
+    WikiIndex.update per sostituire, aggiungere ed eliminare pagine senza rileggere il dump.
+
+    Gli archi delle pagine non modificate restano negli array numpy del file; solo le pagine
+    aggiornate hanno i link come titoli, che vengono risolti in 'edgeArrays'.
+    Il file contiene solo gli archi tra pagine esistenti: una pagina creata da un aggiornamento 
+    riceve gli archi delle pagine aggiornate insieme a lei, quelli delle altre pagine che la 
+    citavano già vengono ricostruiti dalla build successiva.
+    """
+
+    def __init__(self, args_paths, ids, titles, src, dst):
+        """
+        :param self
+        :param args_paths: per determinare i path
+        :param ids: array degli id delle pagine, in ordine crescente
+        :param titles: lista dei titoli, nell'ordine di 'ids'
+        :param src: array degli indici dei nodi di partenza
+        :param dst: array degli indici dei nodi di arrivo
+        """
+        self.args_paths = args_paths
+        self.ids, self.titles, self.src, self.dst = ids, titles, src, dst
+
+        self.node_by_title = {title: node for node, title in enumerate(titles)}
+        # pagine nuove: id -> nodo (gli indici seguono quelli del file)
+        self.added = {}
+        self.added_ids = []
+        # nodi eliminati e nodi aggiornati (nodo -> set dei titoli dei link)
+        self.removed = set()
+        self.changed = {}
+
+
+    @classmethod
+    def load(cls, args_paths, path_links):
+        """
+        :param cls
+        :param args_paths: per determinare i path
+        :param path_links: file salvato con 'saveEdges'
+        return StoredGraph
+        """
+        return cls(args_paths, *loadEdges(path_links))
+
+
+    def __node(self, id_page):
+        """
+        :param self
+        :param id_page: id della pagina
+        return nodo della pagina (anche eliminata), None se non esiste
+        """
+        id_page = int(id_page)
+        node = int(np.searchsorted(self.ids, id_page))
+        if node < len(self.ids) and self.ids[node] == id_page:
+            return node
+        return self.added.get(id_page)
+
+
+    def __id(self, node):
+        """
+        :param self
+        :param node: nodo
+        return id della pagina
+        """
+        return int(self.ids[node]) if node < len(self.ids) else self.added_ids[node - len(self.ids)]
+
+
+    def owner(self, title):
+        """
+        :param self
+        :param title: titolo
+        return id della pagina con questo titolo, None se non esiste
+        """
+        node = self.node_by_title.get(title)
+        return self.__id(node) if node is not None else None
+
+
+    def removePage(self, id_page):
+        """
+        Rimozione di una pagina (eliminata, diventata un redirect o il cui titolo è passato a un'altra
+        pagina), con i suoi archi e gli archi che la raggiungono.
+
+        :param self
+        :param id_page: id della pagina
+        return titolo della pagina rimossa, None se la pagina non era presente
+        """
+        node = self.__node(id_page)
+        if node is None or node in self.removed:
+            return None
+
+        title = self.titles[node]
+        if self.node_by_title.get(title) == node:
+            del self.node_by_title[title]
+        self.removed.add(node)
+        self.changed.pop(node, None)
+        return title
+
+
+    def updatePage(self, id_page, title_page, titles_page_linked=[]):
+        """
+        Aggiunta o sostituzione di una pagina, anche se ha cambiato titolo. Se il titolo apparteneva
+        a un'altra pagina, questa viene rimossa dal grafo e il suo id viene ritornato, perchè 
+        venga eliminata anche dall'indice (vedi WikiIndex.update).
+
+        :param self
+        :param id_page: id della pagina
+        :param title_page: titolo della pagina
+        :param titles_page_linked: link a cui la pagina punta
+        return id della pagina che aveva il titolo, None se non c'era
+        """
+        id_page = int(id_page)
+        node = self.__node(id_page)
+
+        displaced = None
+        owner = self.node_by_title.get(title_page)
+        if owner is not None and owner != node:
+            displaced = self.__id(owner)
+            self.removePage(displaced)
+
+        if node is None:
+            node = len(self.titles)
+            self.titles.append(title_page)
+            self.added[id_page] = node
+            self.added_ids.append(id_page)
+        else:
+            self.removed.discard(node)
+            if self.node_by_title.get(self.titles[node]) == node:
+                del self.node_by_title[self.titles[node]]
+            self.titles[node] = title_page
+
+        self.node_by_title[title_page] = node
+        self.changed[node] = set(titles_page_linked)
+        return displaced
+
+
+    def redirectTable(self):
+        """
+        :param self
+        return RedirectTable, o None se non è stata salvata (vedi 'loadRedirects')
+        """
+        return loadRedirects(self.args_paths)
+
+
+    def edgeArrays(self, redirects=None):
+        """
+        Archi del grafo aggiornato: gli archi del file senza quelli delle pagine aggiornate o verso
+        le pagine eliminate, più gli archi delle pagine aggiornate. I nodi eliminati vengono tolti.
+
+        :param self
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        return (id delle pagine, indici dei nodi di partenza, indici dei nodi di arrivo)
+        """
+        n = len(self.titles)
+        dropped = np.zeros(n, dtype=bool)
+        dropped[list(self.removed)] = True
+        rewired = dropped.copy()
+        rewired[list(self.changed)] = True
+        keep = ~rewired[self.src] & ~dropped[self.dst]
+
+        new_src, new_dst = [], []
+        for node, links in self.changed.items():
+            targets = set()
+            for link in links:
+                target = self.node_by_title.get(link)
+                if target is None and redirects is not None:
+                    target = self.node_by_title.get(redirects.resolve(link))
+                if target is not None:
+                    targets.add(target)
+            new_src.extend([node] * len(targets))
+            new_dst.extend(targets)
+
+        src = np.concatenate([self.src[keep], np.array(new_src, dtype=np.int32)])
+        dst = np.concatenate([self.dst[keep], np.array(new_dst, dtype=np.int32)])
+
+        live = ~dropped
+        position = (np.cumsum(live) - 1).astype(np.int32)
+        ids = np.concatenate([self.ids, np.array(self.added_ids, dtype=np.int64)])
+        return ids[live], position[src], position[dst]
+
+
+    def save(self, path_links, redirects=None):
+        """
+        Salvataggio del grafo aggiornato con 'saveEdges'.
+
+        :param self
+        :param path_links: file dove salvare il grafo
+        :param redirects: RedirectTable per risolvere i link ai redirect (None = nessuna risoluzione)
+        return array degli archi salvati (vedi 'edgeArrays')
+        """
+        ids, src, dst = self.edgeArrays(redirects)
+        titles = [title for node, title in enumerate(self.titles) if node not in self.removed]
+        saveEdges(path_links, ids, titles, src, dst)
+        return ids, src, dst
+
+
 class WikiPageRanker():
     """
     DOC : https://snap.stanford.edu/snappy/doc/reference/GetPageRank.html
           https://snap.stanford.edu/snappy/doc/reference/composite.html#thash
     """
 
+    params = {'C': 0.85,
+              'Eps': 1e-4,
+              'MaxIter': 100}
+
     def __init__(self, args_paths):
         """
         Caricamento da file della table (id_page, value_pagerank).
@@ -151,6 +471,8 @@ class WikiPageRanker():
         """
         self.table_rank = snap.TIntFltH()
         snapLoad(self.table_rank, args_paths.pagerank)    
+        # Versione della table (path e data di modifica), usata per invalidare la cache dei risultati
+        self.version = (args_paths.pagerank, os.path.getmtime(args_paths.pagerank))
 
 
     @classmethod
@@ -165,15 +487,80 @@ class WikiPageRanker():
         :param graph: grafo su cui calcolare il pagerank
         :parma args_paths: dove salvare la table del page rank
         """
-        params = {'C': 0.85,
-                  'Eps': 1e-4,
-                  'MaxIter': 100}
+        table_rank = snap.TIntFltH()
+        snap.GetPageRank(graph, table_rank, *cls.params.values())
+
+        snapSave(table_rank, args_paths.pagerank)
+
+
+    @classmethod
+    def readTable(cls, args_paths):
+        """
+        Lettura della table del page rank salvata, come dict.
+
+        :param cls
+        :param args_paths: path dello storage della tabella del page rank
+        return dict id pagina -> valore di pagerank (vuoto se il file non esiste)
+        """
+        if not os.path.exists(args_paths.pagerank):
+            return {}
 
         table_rank = snap.TIntFltH()
-        snap.GetPageRank(graph, table_rank, *params.values())
+        snapLoad(table_rank, args_paths.pagerank)
+        return {int(id_page): table_rank[id_page] for id_page in table_rank}
+
 
+    @classmethod
+    def computePageRankFrom(cls, ids, src, dst, args_paths, start=None):
+        """
+        Calcolo del page rank con lo stesso algoritmo di snap.GetPageRank (la massa persa dai nodi 
+        senza archi uscenti viene ridistribuita in modo uniforme), ma partendo dai valori di 'start'
+        invece che da 1/n: dopo un aggiornamento di poche pagine i valori sono già vicini a quelli
+        finali e bastano poche iterazioni.
+        I nodi non presenti in 'start' partono da 1/n, poi i valori vengono normalizzati a somma 1.
+        Ogni iterazione è eseguita da numpy sugli array degli archi (una 'bincount' pesata), senza 
+        cicli python su nodi e archi.
+
+        :param cls
+        :param ids: array degli id delle pagine (vedi WikiGraph.edgeArrays)
+        :param src: array degli indici dei nodi di partenza degli archi
+        :param dst: array degli indici dei nodi di arrivo degli archi
+        :param args_paths: dove salvare la table del page rank
+        :param start: dict id pagina -> valore di pagerank iniziale (es: 'readTable')
+        return numero di iterazioni eseguite
+        """
+        n = len(ids)
+        if n == 0:
+            return 0
+        start = start or {}
+        c, eps, max_iter = cls.params['C'], cls.params['Eps'], cls.params['MaxIter']
+
+        rank = np.fromiter((start.get(id_page, 1.0 / n) for id_page in ids.tolist()), dtype=np.float64, count=n)
+        rank /= rank.sum()
+
+        out_degree = np.bincount(src, minlength=n).astype(np.float64)
+        has_out = out_degree > 0
+        share = np.zeros(n)
+
+        iterations = 0
+        while iterations < max_iter:
+            iterations += 1
+            np.divide(rank, out_degree, out=share, where=has_out)
+            new_rank = c * np.bincount(dst, weights=share[src], minlength=n)
+            new_rank += (1.0 - new_rank.sum()) / n
+
+            diff = np.abs(new_rank - rank).sum()
+            rank = new_rank
+            if diff < eps:
+                break
+
+        table_rank = snap.TIntFltH()
+        for id_page, value in zip(ids.tolist(), rank.tolist()):
+            table_rank[id_page] = value
         snapSave(table_rank, args_paths.pagerank)
 
+        return iterations
+
 
     def prepareCalculatorRank(self, filter_ids):
         """
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache LRU con scadenza (TTL) dei risultati di WikiSearcher.search.
+
+La chiave è il testo della query normalizzato più tutti i settaggi che cambiano il risultato
+(limit, exp, page_rank, text_boost, title_boost, weighting, group, bigrams). La normalizzazione
+unisce gli spazi e porta il testo in forma Unicode NFC, ma non cambia maiuscole e minuscole:
+gli operatori del parser ('AND', 'OR', 'NOT') sono riconosciuti solo in maiuscolo.
+
+Ogni valore è associato alla versione del searcher che l'ha calcolato (generazione dell'indice e
+table del pagerank, vedi WikiSearcher): quando viene creato un searcher con una versione diversa
+(nuova generazione, aggiornamento dell'indice, refresh) la cache viene svuotata.
+"""
+
+import collections
+import threading
+import time
+import unicodedata
+
+
+SETTINGS = ('limit', 'exp', 'page_rank', 'text_boost', 'title_boost', 'weighting', 'group', 'bigrams')
+
+
+def copyResult(res):
+    """
+    Copia del dict dei risultati, per non condividere le liste e i dict dei documenti con chi
+    riceve il risultato.
+
+    :param res: dict ritornato da WikiSearcher.search
+    return copia del dict
+    """
+    copied = dict(res)
+    copied['docs'] = [dict(doc) for doc in res['docs']]
+    copied['expanded'] = list(res['expanded']) if res['expanded'] is not None else None
+    return copied
+
+
+class ResultCache:
+    """
+    Cache LRU con scadenza, con contatori di hit, miss, scadenze e invalidazioni.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        """
+        :param self
+        :param maxsize: numero massimo di risultati
+        :param ttl: secondi dopo i quali un risultato scade (0 = nessuna scadenza)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.entries = collections.OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+
+    @staticmethod
+    def key(text, **settings):
+        """
+        :param text: testo della query
+        :param settings: settaggi della ricerca (vedi SETTINGS)
+        return chiave della cache
+        """
+        normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+        return (normalized,) + tuple(settings.get(name) for name in SETTINGS)
+
+
+    def __checkVersion(self, version):
+        """
+        Svuota la cache se la versione è cambiata.
+
+        :param self
+        :param version: versione del searcher
+        """
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+
+    def get(self, key, version):
+        """
+        :param self
+        :param key: chiave (vedi 'key')
+        :param version: versione del searcher
+        return copia del risultato, None se non presente o scaduto
+        """
+        with self.lock:
+            self.__checkVersion(version)
+
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            created, res = entry
+            if self.ttl and time.monotonic() - created > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copyResult(res)
+
+
+    def put(self, key, res, version):
+        """
+        :param self
+        :param key: chiave (vedi 'key')
+        :param res: dict dei risultati
+        :param version: versione del searcher che ha calcolato il risultato (la stessa di 'get')
+        """
+        if self.maxsize <= 0:
+            return
+
+        with self.lock:
+            # Risultato di un searcher sostituito mentre la query era in corso
+            if version != self.version:
+                return
+
+            self.entries[key] = (time.monotonic(), copyResult(res))
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+    def clear(self):
+        """
+        :param self
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+    def info(self):
+        """
+        :param self
+        return dict con dimensione e contatori della cache
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {'size': len(self.entries),
+                    'maxsize': self.maxsize,
+                    'ttl': self.ttl,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'expired': self.expired,
+                    'invalidations': self.invalidations,
+                    'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                    }
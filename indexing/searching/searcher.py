@@ -8,9 +8,14 @@ Created on Thu Sep 24 15:54:36 2020
 
 from whoosh.qparser import MultifieldParser
 from whoosh.searching import Searcher as WhooshSearcher
+from whoosh.query import Term, And, Or, AndMaybe
 from whoosh import scoring, qparser
 
+import re
+import time
+
 from .queryExpansion import Expander
+from .resultCache import ResultCache
 
 
 class WikiSearcher:
@@ -25,8 +30,12 @@ class WikiSearcher:
             }
 
     base_url = 'https://en.wikipedia.org/wiki/'
+
+    # Campo dei bigrammi del testo, se presente nello schema (vedi WikiIndex.getSchema)
+    bigram_field = 'text_bigrams'
+    phrase = re.compile(r'"([^"]*)"')
     
-    def __init__(self, index, page_ranker):
+    def __init__(self, index, page_ranker, text_store=None, cache=None):
         """
         Creazione del QueryParser relativo al testo della query.
         Aggiungo il plugin 'MultifieldPlugin' al 'QueryParser' perchè mi permette poi nella funzione di 
@@ -43,10 +52,27 @@ class WikiSearcher:
         - GROUP default concatena i token con 'AND'. Specificando 'OrGroup' concatena con OR.
                 Utilizzando il FACTORY, do un punteggio maggiore ai documenti in cui un certo termine
                 ha una frequenza più alta. Senza FACTORY non ho questo effetto.     
+
+        - TEXT STORE il testo per gli highlights viene letto dal file del testo (vedi textStore.py) 
+                     solo per i risultati ritornati. Se è None (indice creato con il testo 'stored')
+                     viene usato il campo memorizzato.
+
+        - CACHE dei risultati (vedi resultCache.py), condivisa tra i searcher delle diverse generazioni.
+                La versione del searcher (cartella dell'indice, generazione del reader aperto qui,
+                table del pagerank con la data di modifica) è calcolata qui: il searcher legge sempre
+                lo stesso reader (anche quando cambia il weighting), quindi i risultati cambiano solo
+                con un nuovo searcher, che svuota la cache.
         """
         self.index = index
 
         self.page_ranker = page_ranker
+        self.text_store = text_store
+
+        self.reader = index.reader()
+
+        self.cache = cache
+        self.version = (getattr(index.storage, 'folder', None), self.reader.generation(),
+                        getattr(page_ranker, 'version', None))
 
         self.expand = Expander(disambiguate_fn='noun_sense')
 
@@ -55,18 +81,22 @@ class WikiSearcher:
         self.parser.add_plugin(self.multifield_plugin)
 
         self.weighting = 'BM25F'
-        self.searcher = WhooshSearcher(reader=self.index.reader(), weighting=WikiSearcher.weighting[self.weighting])
+        self.searcher = WhooshSearcher(reader=self.reader, weighting=WikiSearcher.weighting[self.weighting])
         
     
     def search(self, text, limit=10, exp=True, page_rank=True, text_boost=1.0, title_boost=1.0,
-                weighting='BM25F', group='AND'):
+                weighting='BM25F', group='AND', bigrams=True):
         """
         Funzione che esegue la ricerca con i parametri passati in input.
         Se il pagerank è specificato, lo score finale del documento viene calcolato sia in funzione
         dello score fornito dalla ricerca che al valore di pagerank.
 
+        Se la cache contiene il risultato della stessa query (testo normalizzato e settaggi), viene 
+        ritornato quello, con 'cached' True e 'time_second' il tempo della lettura dalla cache.
         Per prima cosa avviene la fase di settaggio del parser e del weighting con i valori passati in 
         input.
+        Se l'indice contiene il campo dei bigrammi, la query viene riscritta anche con i bigrammi
+        (vedi '__bigramQuery').
         Dopo di chè avviene il query expansion.
         Poi, avviene il parsing del testo, che viene passato al searcher che ottiene 
         i documenti rilevanti.
@@ -80,18 +110,36 @@ class WikiSearcher:
         :param title_boost: boosting del campo titolo
         :param weighting: metodo di weighting
         :param group: come vengono concatenati i token della query
+        :param bigrams: boolean se usare i bigrammi (quando l'indice li contiene)
 
         return dict con i risultati.
         """
+        key = None
+        if self.cache is not None:
+            start = time.perf_counter()
+            key = ResultCache.key(text, limit=limit, exp=exp, page_rank=page_rank, text_boost=text_boost,
+                                  title_boost=title_boost, weighting=weighting, group=group, bigrams=bigrams)
+            res = self.cache.get(key, self.version)
+            if res is not None:
+                res['time_second'] = time.perf_counter() - start
+                res['cached'] = True
+                return res
+
         self.multifield_plugin.boosts = {'text': text_boost, 'title': title_boost}
         self.parser.group = WikiSearcher.group.get(group, 'AND')
 
+        bigram_query = None
+        if bigrams and WikiSearcher.bigram_field in self.index.schema:
+            text, bigram_query = self.__bigramQuery(text)
+
         text, list_token_expanded = self.expand(text) if exp else (text, None)
         query = self.parser.parse(text)
+        if bigram_query is not None:
+            query = bigram_query(query)
         
         if weighting != self.weighting:
             print('Imposto il searcher con il weighting : '+weighting+' Può impiegare tempo ...')
-            self.searcher = WhooshSearcher(reader=self.index.reader(), 
+            self.searcher = WhooshSearcher(reader=self.reader, closereader=False,
                                            weighting=WikiSearcher.weighting.get(weighting, 'BM25F'))
             self.weighting = weighting
             print('Weighting impostato correttamente')
@@ -111,15 +159,83 @@ class WikiSearcher:
 
         res['docs'] = [{'link': WikiSearcher.base_url+result['title'].replace(" ", "_"),
                         'title': result['title'], 
-                        'highlight': result.highlights("text", top=2),
+                        'highlight': self.__highlight(result),
                         'final_score': final_score_fn(result),
                         'score': result.score,
                         'page_rank': values_page_rank.get(result['id_page'], -1)
                         } for result in results]
+        res['cached'] = False
+
+        if key is not None:
+            self.cache.put(key, res, self.version)
 
         return res
 
 
+    def __bigrams(self, text):
+        """
+        :param self
+        :param text: testo
+        return lista di Term con i bigrammi del testo (stessa analisi del campo dei bigrammi)
+        """
+        field = self.index.schema[WikiSearcher.bigram_field]
+        words = []
+        for word in field.process_text(text, mode='query'):
+            if word not in words:
+                words.append(word)
+        return [Term(WikiSearcher.bigram_field, word) for word in words]
+
+
+    def __bigramQuery(self, text):
+        """
+        Riscrittura della query con i bigrammi, al posto delle frasi (il campo 'text' non ha le 
+        posizioni):
+            - ogni frase tra virgolette ('"roman empire"') diventa obbligatoria: il documento deve 
+              contenere tutti i suoi bigrammi, oppure tutte le sue parole nel titolo;
+            - una query di più parole senza virgolette viene eseguita normalmente, e i documenti che 
+              contengono i suoi bigrammi ottengono uno score maggiore.
+        Le parole delle frasi rimangono nel testo della query (senza virgolette), quindi lo score
+        è calcolato anche sui campi 'text' e 'title'.
+
+        :param self
+        :param text: testo della query
+        return (testo senza virgolette, funzione query -> query con i bigrammi, oppure None se la 
+               query non ha bigrammi)
+        """
+        phrases = WikiSearcher.phrase.findall(text)
+        plain = WikiSearcher.phrase.sub(lambda match: ' '+match.group(1)+' ', text)
+
+        required = []
+        for phrase in phrases:
+            bigrams = self.__bigrams(phrase)
+            if bigrams:
+                title_terms = [Term('title', word) 
+                               for word in self.index.schema['title'].process_text(phrase, mode='query')]
+                required.append(Or([And(bigrams), And(title_terms)]) if title_terms else And(bigrams))
+        if required:
+            return plain, lambda query: And([query] + required)
+
+        bigrams = self.__bigrams(plain)
+        if bigrams:
+            return plain, lambda query: AndMaybe(query, Or(bigrams))
+        return plain, None
+
+
+    def __highlight(self, result):
+        """
+        Highlights del testo del risultato. Il testo viene letto dal file del testo, altrimenti
+        (indice creato con il testo 'stored') whoosh usa il campo memorizzato.
+
+        :param self
+        :param result: risultato (Hit) della query
+        return stringa con i frammenti del testo
+        """
+        text = self.text_store.get(result['id_page']) if self.text_store is not None else None
+        if text is None:
+            return result.highlights("text", top=2)
+        return result.highlights("text", text=text, top=2)
+
+
     def __combinedScore(self, page_rank, results):
         """
         Ritorna il riferimento alla funzione usata per il calcolo dello score finale combinato con 
@@ -161,4 +277,26 @@ class WikiSearcher:
         :param self:
         return dict con le info
         """
-        return {'doc_count': self.searcher.doc_count()}
\ No newline at end of file
+        return {'doc_count': self.searcher.doc_count()}
+
+
+    def close(self):
+        """
+        Chiusura del reader dell'indice e del file del testo (vedi WikiIndex.__closeRetired).
+
+        :param self
+        """
+        self.reader.close()
+        if self.text_store is not None:
+            self.text_store.close()
+
+
+    def getCacheInfo(self):
+        """
+        Ottengo dimensione e contatori (hit, miss, ..) della cache dei risultati.
+        Funzione utile in fase di debug.
+
+        :param self:
+        return dict con le info, None se la cache non è usata
+        """
+        return self.cache.info() if self.cache is not None else None
\ No newline at end of file
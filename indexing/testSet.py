@@ -2,8 +2,7 @@
 from googlesearch import search 
 
 # .
-from .xmlParsing import interwikiLink
-from .xmlParsing.saxReader import NS_NOT_VALID
+from .xmlParsing.prefixes import PrefixClassifier
 from .searching.searcher import WikiSearcher
 
 import os, json, re, time
@@ -29,11 +28,12 @@ def getRelevantPerQuery(google_links, n_relevant):
 def prepareValidatorLink(interwiki_file_path):
     """
     Ritorna la funzione di validazione del link.
-    In questa closure definisco 'interwiki' che calcolo una sola volta (perchè è il caricamento
+    In questa closure definisco 'prefixes' che calcolo una sola volta (perchè è il caricamento
     in memoria di file e non voglio farlo per ogni link da analizzare).
 
+    :param interwiki_file_path: snapshot json dei prefissi (vedi prefixes.py)
     """
-    interwiki = interwikiLink.getPrefixSet(interwiki_file_path)
+    prefixes = PrefixClassifier.load(interwiki_file_path)
 
     def validatorLink(link, already_saved_links):
         """
@@ -51,22 +51,13 @@ def prepareValidatorLink(interwiki_file_path):
         if not link.startswith(WikiSearcher.base_url):
             return False 
 
-        # Condizione necessaria perchè negli interwiki link non è presente 'Wikitionary'
-        if 'Wiktionary:' in link:
-            return False
-
+        # 'Wiktionary' non è presente negli interwiki link dell'API ma è nello snapshot dei prefissi
         link_no_site_name = link[len(WikiSearcher.base_url):]
-        pref = re.search(r'^:?[^:]+?:', link_no_site_name)
-
-        if pref is not None:
-            pref = re.sub(r':', '', pref[0])
-            ns_not_valid = set(NS_NOT_VALID.values())
-
-            if pref in interwiki:
-                return False
+        start = 1 if link_no_site_name.startswith(':') else 0
+        end = link_no_site_name.find(':', start)
 
-            if pref in ns_not_valid:
-                return False
+        if end > start:
+            return prefixes.isValid(link_no_site_name[start:end])
             
         return True
 
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Archivio compresso del testo pulito delle pagine, nella cartella dell'indice, usato solo per gli
+highlights dei risultati mostrati.
+
+Il campo 'text' dello schema non è più 'stored': salvare il testo tra i campi memorizzati di whoosh
+raddoppia la dimensione dell'indice, e ogni accesso ad un risultato ('result["title"]') deserializza
+anche il testo. Il testo viene invece letto da qui, tramite mmap, solo per i risultati da mostrare.
+
+Le chiavi sono gli 'id_page' (numerici) e non i docnum di whoosh, che cambiano con il merge dei
+segmenti e con gli aggiornamenti (vedi WikiIndex.update).
+
+Formato del file:
+
+    MAGIC
+    chunk_0 ... chunk_n      ogni chunk = lunghezze (2 * 4 byte little endian) + marshal(lista di id)
+                             + zlib(marshal(lista di testi))
+    footer                   numero di chunk, numero di id (2 * 8 byte little endian)
+                             tabella dei chunk: (posizione, lunghezza) per ogni chunk (8 + 4 byte)
+                             tabella degli id: (id, chunk) ordinata per id (8 + 4 byte)
+    posizione footer (8 byte little endian) + MAGIC
+
+Le tabelle del footer hanno righe a lunghezza fissa e vengono lette sul mmap (ricerca binaria per
+gli id), senza caricarle in memoria: aprire un file con milioni di pagine costa solo l'mmap.
+
+Gli id di ogni chunk sono scritti non compressi, quindi un file senza footer (build interrotta)
+può essere ricostruito leggendo solo gli id (vedi TextStoreWriter con 'append').
+Un aggiornamento dell'indice scrive un nuovo file ('text.store.1', 'text.store.2', ..): i testi
+vengono cercati dal file più recente.
+"""
+
+import bisect
+import collections
+import marshal
+import mmap
+import os
+import struct
+import zlib
+
+
+MAGIC = b'WIKITS02'
+STORE_FILE = 'text.store'
+CHUNK_HEADER = struct.Struct('<II')
+FOOTER_HEADER = struct.Struct('<QQ')
+ENTRY = struct.Struct('<QI')
+FOOTER_POS = struct.Struct('<Q')
+
+
+def storePaths(index_dir):
+    """
+    :param index_dir: cartella dell'indice
+    return path dei file del testo, dal più recente al più vecchio
+    """
+    if not os.path.isdir(index_dir):
+        return []
+
+    numbered = []
+    for name in os.listdir(index_dir):
+        if name == STORE_FILE:
+            numbered.append((0, name))
+        elif name.startswith(STORE_FILE + '.') and name[len(STORE_FILE) + 1:].isdigit():
+            numbered.append((int(name[len(STORE_FILE) + 1:]), name))
+
+    return [os.path.join(index_dir, name) for _, name in sorted(numbered, reverse=True)]
+
+
+def nextStorePath(index_dir):
+    """
+    :param index_dir: cartella dell'indice
+    return path del prossimo file del testo (per un aggiornamento)
+    """
+    paths = storePaths(index_dir)
+    if not paths:
+        return os.path.join(index_dir, STORE_FILE)
+
+    last = os.path.basename(paths[0])
+    number = int(last[len(STORE_FILE) + 1:]) + 1 if last != STORE_FILE else 1
+    return os.path.join(index_dir, STORE_FILE + '.' + str(number))
+
+
+def readFooter(fp, size):
+    """
+    :param fp: file binario
+    :param size: dimensione del file
+    return posizione del footer, None se il file non è stato chiuso
+    """
+    tail = FOOTER_POS.size + len(MAGIC)
+    if size < len(MAGIC) + tail:
+        return None
+
+    fp.seek(size - tail)
+    data = fp.read(tail)
+    if data[FOOTER_POS.size:] != MAGIC:
+        return None
+    return FOOTER_POS.unpack(data[:FOOTER_POS.size])[0]
+
+
+class TextStoreWriter:
+    """
+    Scrittura del file del testo.
+    """
+
+    def __init__(self, path_store, append=False, chunk_docs=16, level=6):
+        """
+        Apertura del file. Con 'append' un file esistente viene continuato: se è completo viene
+        rimosso il footer, altrimenti vengono recuperati i chunk completi e scartato il resto.
+
+        :param self
+        :param path_store: path del file
+        :param append: se True continua il file esistente (ripresa di una build)
+        :param chunk_docs: testi per chunk (chunk piccoli = meno testo da decomprimere per un highlight)
+        :param level: livello di compressione zlib
+        """
+        self.path_store = path_store
+        self.chunk_docs = chunk_docs
+        self.level = level
+
+        self.chunk = []
+        self.chunks = []
+        self.ids = {}
+
+        if append and os.path.exists(path_store):
+            self.fp = open(path_store, 'r+b')
+            self.__recover()
+        else:
+            self.fp = open(path_store, 'wb')
+            self.fp.write(MAGIC)
+
+
+    def __recover(self):
+        """
+        Lettura di chunk e id dal file esistente e posizionamento alla fine dell'ultimo chunk completo.
+
+        :param self
+        """
+        size = os.path.getsize(self.path_store)
+        footer_pos = readFooter(self.fp, size)
+
+        if footer_pos is not None:
+            self.fp.seek(footer_pos)
+            n_chunks, n_ids = FOOTER_HEADER.unpack(self.fp.read(FOOTER_HEADER.size))
+            data = self.fp.read((n_chunks + n_ids) * ENTRY.size)
+            entries = [ENTRY.unpack_from(data, i * ENTRY.size) for i in range(n_chunks + n_ids)]
+            self.chunks = entries[:n_chunks]
+            self.ids = dict(entries[n_chunks:])
+            end = footer_pos
+        else:
+            end = len(MAGIC)
+            while end + CHUNK_HEADER.size <= size:
+                self.fp.seek(end)
+                ids_len, data_len = CHUNK_HEADER.unpack(self.fp.read(CHUNK_HEADER.size))
+                chunk_len = CHUNK_HEADER.size + ids_len + data_len
+                if end + chunk_len > size:
+                    break
+                try:
+                    ids = marshal.loads(self.fp.read(ids_len))
+                except (EOFError, ValueError, TypeError):
+                    break
+
+                for id_page in ids:
+                    self.ids[int(id_page)] = len(self.chunks)
+                self.chunks.append((end, chunk_len))
+                end += chunk_len
+
+        self.fp.seek(end)
+        self.fp.truncate(end)
+
+
+    def add(self, id_page, text):
+        """
+        :param self
+        :param id_page: id (numerico) della pagina
+        :param text: testo pulito della pagina
+        """
+        self.chunk.append((id_page, text))
+        if len(self.chunk) >= self.chunk_docs:
+            self.__flushChunk()
+
+
+    def addFrom(self, path_store):
+        """
+        Aggiunta di tutti i testi di un altro file (es: quello di uno shard).
+
+        :param self
+        :param path_store: path del file da copiare
+        """
+        with TextStoreReader(path_store) as reader:
+            for id_page, text in reader.iterItems():
+                self.add(id_page, text)
+
+
+    def __flushChunk(self):
+        """
+        Scrittura del chunk corrente.
+
+        :param self
+        """
+        if not self.chunk:
+            return
+
+        ids = marshal.dumps([id_page for id_page, _ in self.chunk])
+        data = zlib.compress(marshal.dumps([text for _, text in self.chunk]), self.level)
+
+        pos = self.fp.tell()
+        self.fp.write(CHUNK_HEADER.pack(len(ids), len(data)))
+        self.fp.write(ids)
+        self.fp.write(data)
+
+        for id_page, _ in self.chunk:
+            self.ids[int(id_page)] = len(self.chunks)
+        self.chunks.append((pos, CHUNK_HEADER.size + len(ids) + len(data)))
+        self.chunk = []
+
+
+    def flush(self):
+        """
+        Scrittura su disco dei testi aggiunti (da chiamare ad ogni checkpoint della build).
+
+        :param self
+        """
+        self.__flushChunk()
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+
+    def close(self):
+        """
+        Scrittura dell'ultimo chunk e del footer.
+
+        :param self
+        """
+        self.__flushChunk()
+
+        footer_pos = self.fp.tell()
+        self.fp.write(FOOTER_HEADER.pack(len(self.chunks), len(self.ids)))
+        self.fp.write(b''.join(ENTRY.pack(pos, length) for pos, length in self.chunks))
+        self.fp.write(b''.join(ENTRY.pack(id_page, n) for id_page, n in sorted(self.ids.items())))
+        self.fp.write(FOOTER_POS.pack(footer_pos))
+        self.fp.write(MAGIC)
+        self.fp.close()
+
+
+    def abort(self):
+        """
+        Chiusura ed eliminazione del file.
+
+        :param self
+        """
+        self.fp.close()
+        os.remove(self.path_store)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class SortedIds:
+    """
+    Colonna degli id della tabella degli id del footer, letta sul mmap: è una sequenza, quindi
+    può essere usata con 'bisect'.
+    """
+
+    def __init__(self, mm, pos, n):
+        """
+        :param self
+        :param mm: mmap del file
+        :param pos: posizione della tabella degli id
+        :param n: numero di id
+        """
+        self.mm = mm
+        self.pos = pos
+        self.n = n
+
+
+    def __getitem__(self, i):
+        return ENTRY.unpack_from(self.mm, self.pos + i * ENTRY.size)[0]
+
+
+    def __len__(self):
+        return self.n
+
+
+class TextStoreReader:
+    """
+    Lettura di un file del testo tramite mmap, con una piccola cache dei chunk decompressi.
+    """
+
+    def __init__(self, path_store, cache_chunks=32):
+        """
+        :param self
+        :param path_store: path del file (chiuso con TextStoreWriter.close)
+        :param cache_chunks: chunk decompressi da tenere in memoria
+        """
+        self.fp = open(path_store, 'rb')
+        size = os.path.getsize(path_store)
+
+        footer_pos = readFooter(self.fp, size)
+        if footer_pos is None:
+            self.fp.close()
+            raise ValueError('File del testo incompleto: '+path_store)
+
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.n_chunks, n_ids = FOOTER_HEADER.unpack_from(self.mm, footer_pos)
+        self.chunks_pos = footer_pos + FOOTER_HEADER.size
+        self.ids = SortedIds(self.mm, self.chunks_pos + self.n_chunks * ENTRY.size, n_ids)
+
+        self.cache = collections.OrderedDict()
+        self.cache_chunks = cache_chunks
+
+
+    def readChunk(self, n):
+        """
+        :param self
+        :param n: numero del chunk
+        return (lista di id, lista di testi) del chunk
+        """
+        texts = self.cache.get(n)
+        if texts is not None:
+            self.cache.move_to_end(n)
+            return texts
+
+        pos, _ = ENTRY.unpack_from(self.mm, self.chunks_pos + n * ENTRY.size)
+        ids_len, data_len = CHUNK_HEADER.unpack_from(self.mm, pos)
+        start = pos + CHUNK_HEADER.size
+        ids = marshal.loads(self.mm[start:start + ids_len])
+        texts = marshal.loads(zlib.decompress(self.mm[start + ids_len:start + ids_len + data_len]))
+
+        self.cache[n] = (ids, texts)
+        if len(self.cache) > self.cache_chunks:
+            self.cache.popitem(last=False)
+        return ids, texts
+
+
+    def chunkOf(self, id_page):
+        """
+        :param self
+        :param id_page: id della pagina
+        return numero del chunk con l'ultima versione della pagina, None se non presente
+        """
+        key = int(id_page)
+        i = bisect.bisect_left(self.ids, key)
+        if i == len(self.ids) or self.ids[i] != key:
+            return None
+        return ENTRY.unpack_from(self.mm, self.ids.pos + i * ENTRY.size)[1]
+
+
+    def get(self, id_page):
+        """
+        :param self
+        :param id_page: id della pagina (stringa o intero)
+        return testo della pagina, None se non presente
+        """
+        n = self.chunkOf(id_page)
+        if n is None:
+            return None
+
+        key = int(id_page)
+        ids, texts = self.readChunk(n)
+        # Con pagine ripetute (build ripresa) vale l'ultima occorrenza nel chunk
+        for i in range(len(ids) - 1, -1, -1):
+            if int(ids[i]) == key:
+                return texts[i]
+        return None
+
+
+    def iterItems(self):
+        """
+        Generatore dei testi nell'ordine in cui sono stati scritti (l'ultima versione di ogni id).
+
+        :param self
+        yield: (id, testo)
+        """
+        for n in range(self.n_chunks):
+            ids, texts = self.readChunk(n)
+            for id_page, text in zip(ids, texts):
+                if self.chunkOf(id_page) == n:
+                    yield id_page, text
+
+
+    def close(self):
+        """
+        :param self
+        """
+        self.cache.clear()
+        self.mm.close()
+        self.fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TextStore:
+    """
+    Testi della cartella dell'indice: i file vengono consultati dal più recente.
+    """
+
+    def __init__(self, paths_store):
+        """
+        :param self
+        :param paths_store: path dei file, dal più recente al più vecchio
+        """
+        self.readers = [TextStoreReader(path_store) for path_store in paths_store]
+
+
+    @classmethod
+    def open(cls, index_dir):
+        """
+        :param cls
+        :param index_dir: cartella dell'indice
+        return TextStore, None se la cartella non contiene file del testo (indice con testo 'stored')
+        """
+        paths_store = storePaths(index_dir)
+        return cls(paths_store) if paths_store else None
+
+
+    def get(self, id_page):
+        """
+        :param self
+        :param id_page: id della pagina
+        return testo della pagina, None se non presente
+        """
+        for reader in self.readers:
+            text = reader.get(id_page)
+            if text is not None:
+                return text
+        return None
+
+
+    def close(self):
+        """
+        :param self
+        """
+        for reader in self.readers:
+            reader.close()
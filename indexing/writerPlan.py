@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scelta dei parametri del writer whoosh in base alle risorse della macchina e alla dimensione del corpus.
+
+DOCS : https://whoosh.readthedocs.io/en/latest/batch.html
+
+    procs        : processi del writer; ogni sub-writer usa 'limitmb' MB, quindi la memoria usata è
+                   circa procs * limitmb. I core usati dai processi del filtraggio ('workers') non
+                   vengono assegnati al writer. Con un corpus piccolo un solo processo è più veloce.
+    limitmb      : metà della memoria disponibile divisa tra i processi, tra MIN_LIMITMB e MAX_LIMITMB.
+    multisegment : con più processi ogni sub-writer crea un proprio segmento, senza il merge
+                   (eseguito da un solo processo) ad ogni commit.
+    optimize     : merge di tutti i segmenti nel commit finale; le query su un solo segmento sono più
+                   veloci, ma il merge ha un costo proporzionale all'indice, quindi viene fatto solo se
+                   la dimensione del corpus è nota e non supera MERGE_LIMIT_MB (con un corpus piccolo
+                   basta il merge normale di whoosh ad ogni commit).
+
+Ogni valore può essere imposto da linea di comando ('--procs', '--limitmb', '--merge').
+"""
+
+import os
+
+
+MEMORY_FRACTION = 0.5
+DEFAULT_MEMORY_MB = 1024    # memoria ipotizzata se non è possibile leggerla
+MIN_LIMITMB = 64
+MAX_LIMITMB = 2048
+MAX_PROCS = 8
+SMALL_CORPUS_MB = 256       # sotto questa dimensione (testo xml) un solo processo
+MERGE_LIMIT_MB = 4096       # sopra questa dimensione niente merge finale
+
+# Rapporto stimato tra dimensione del dump decompresso e compresso
+COMPRESSION_RATIO = {'.bz2': 5.0, '.gz': 4.0, '.zst': 5.0}
+
+# Strategie di segmenti/merge: (multisegment, optimize)
+STRATEGIES = {'merge': (False, False),
+              'multisegment': (True, False),
+              'optimize': (True, True),
+              }
+
+
+def cpuCount():
+    """
+    return numero di core utilizzabili dal processo
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def availableMemory():
+    """
+    Memoria disponibile in MB.
+    Su Linux leggo 'MemAvailable' da /proc/meminfo, altrove uso le pagine fisiche libere.
+
+    return memoria in MB, None se non disponibile
+    """
+    try:
+        with open('/proc/meminfo') as fp:
+            for line in fp:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 2**10
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def corpusSize(path_corpus):
+    """
+    Dimensione stimata del testo xml del corpus.
+
+    :param path_corpus: path del dump (anche compresso)
+    return MB del dump decompresso, None se il file non esiste
+    """
+    if not path_corpus or not os.path.exists(path_corpus):
+        return None
+
+    ratio = COMPRESSION_RATIO.get(os.path.splitext(path_corpus)[1], 1.0)
+    return os.path.getsize(path_corpus) * ratio / 2**20
+
+
+def planWriter(cores, memory_mb, corpus_mb, filter_workers=1, shards=0,
+               procs=0, limitmb=0, merge='auto'):
+    """
+    Scelta dei parametri del writer.
+
+    :param cores: core disponibili
+    :param memory_mb: memoria disponibile in MB (None = DEFAULT_MEMORY_MB)
+    :param corpus_mb: dimensione del testo xml del corpus in MB (None = sconosciuta)
+    :param filter_workers: processi usati per il filtraggio del testo
+    :param shards: processi che creano gli shard (build multistream, 0 = nessuno): il writer finale
+                   unisce solo gli shard e usa un solo processo, la memoria viene divisa tra gli shard
+    :param procs: processi del writer imposti (0 = automatico)
+    :param limitmb: MB per processo imposti (0 = automatico)
+    :param merge: strategia imposta ('merge', 'multisegment', 'optimize') o 'auto'
+    return dict con il piano: procs, limitmb, multisegment, optimize, shard_limitmb e le risorse usate
+    """
+    memory = memory_mb if memory_mb else DEFAULT_MEMORY_MB
+    budget = memory * MEMORY_FRACTION
+    small = corpus_mb is not None and corpus_mb <= SMALL_CORPUS_MB
+
+    if not procs:
+        if shards or small:
+            procs = 1
+        else:
+            procs = max(1, min(MAX_PROCS, cores - max(filter_workers, 1) + 1))
+            procs = max(1, min(procs, int(budget // MIN_LIMITMB)))
+
+    if not limitmb:
+        limitmb = int(max(MIN_LIMITMB, min(MAX_LIMITMB, budget / (procs + shards))))
+
+    if merge == 'auto':
+        if corpus_mb is None or corpus_mb > MERGE_LIMIT_MB:
+            merge = 'multisegment' if procs > 1 else 'merge'
+        else:
+            merge = 'merge' if small else 'optimize'
+    multisegment, optimize = STRATEGIES[merge]
+
+    return {'procs': procs,
+            'limitmb': limitmb,
+            'multisegment': multisegment and procs > 1,
+            'optimize': optimize,
+            'merge': merge,
+            'shard_limitmb': limitmb if shards else None,
+            'cores': cores,
+            'memory_mb': round(memory_mb, 1) if memory_mb else None,
+            'corpus_mb': round(corpus_mb, 1) if corpus_mb is not None else None,
+            }
+
+
+def planFromArgs(args_paths):
+    """
+    Piano del writer per la build descritta dagli argomenti da linea di comando.
+
+    :param args_paths: argomenti (corpus, workers, multistream_index, procs, limitmb, merge)
+    return dict del piano (vedi 'planWriter')
+    """
+    workers = max(1, getattr(args_paths, 'workers', 1))
+    shards = workers if getattr(args_paths, 'multistream_index', None) else 0
+
+    return planWriter(cpuCount(), availableMemory(), corpusSize(getattr(args_paths, 'corpus', None)),
+                      filter_workers=workers if not shards else 1, shards=shards,
+                      procs=getattr(args_paths, 'procs', 0) or 0,
+                      limitmb=getattr(args_paths, 'limitmb', 0) or 0,
+                      merge=getattr(args_paths, 'merge', 'auto') or 'auto')
+
+
+def writerKwargs(plan):
+    """
+    :param plan: dict del piano
+    return argomenti per 'index.writer'
+    """
+    kwargs = {'limitmb': plan['limitmb'], 'procs': plan['procs']}
+    if plan['procs'] > 1:
+        kwargs['multisegment'] = plan['multisegment']
+    return kwargs
+
+
+def describe(plan):
+    """
+    :param plan: dict del piano
+    return descrizione del piano su una riga
+    """
+    return 'procs={procs} limitmb={limitmb} merge={merge} (core {cores}, memoria {memory_mb} MB, ' \
+           'corpus {corpus_mb} MB)'.format(**plan)
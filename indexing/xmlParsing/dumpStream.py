@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lettura del dump di Wikipedia, anche in formato compresso (.bz2, .gz, .zst).
+
+Il dump completo compresso in bz2 occupa circa 20 GB mentre decompresso supera i 90 GB, quindi
+invece di decomprimerlo su disco prima di ogni build lo leggiamo direttamente in streaming.
+La decompressione avviene in un thread separato che riempie una coda limitata di blocchi già
+decompressi: bz2, zlib e zstandard rilasciano il GIL durante la decompressione, quindi questa
+lavora realmente in parallelo al parsing SAX.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import queue
+import threading
+
+
+def openZstd(path_file):
+    """
+    Apertura in lettura di un file compresso con zstandard.
+    Il pacchetto 'zstandard' non è una dipendenza obbligatoria, quindi viene importato solo
+    se serve.
+
+    :param path_file: path del file .zst
+    return file-like binario decompresso
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Per leggere dump .zst è necessario installare il pacchetto zstandard')
+
+    fp = open(path_file, 'rb')
+    return zstandard.ZstdDecompressor().stream_reader(fp, read_across_frames=True, closefd=True)
+
+
+# Estensione del file --> funzione che apre il file decomprimendolo in streaming
+OPENERS = {'.bz2': lambda path_file: bz2.open(path_file, 'rb'),
+           '.gz': lambda path_file: gzip.open(path_file, 'rb'),
+           '.zst': openZstd,
+           }
+
+
+def isCompressed(path_file):
+    """
+    Controllo se il file è in uno dei formati compressi supportati.
+
+    :param path_file: path del file
+    return True se il file è compresso, False altrimenti
+    """
+    return os.path.splitext(path_file)[1].lower() in OPENERS
+
+
+def openRaw(path_file):
+    """
+    Apertura del file in lettura binaria, decomprimendolo se necessario.
+    La decompressione avviene nel thread chiamante.
+
+    :param path_file: path del file
+    return file-like binario
+    """
+    opener = OPENERS.get(os.path.splitext(path_file)[1].lower(), None)
+    if opener is None:
+        return open(path_file, 'rb')
+    return opener(path_file)
+
+
+class DumpStream(io.RawIOBase):
+    """
+    File-like binario in sola lettura che decomprime il dump in un thread separato.
+
+    Il thread di decompressione legge blocchi di 'chunk_size' byte e li inserisce in una coda
+    di al più 'prefetch' elementi: se il parser è più lento della decompressione il thread si
+    blocca, in modo da limitare la memoria usata.
+    """
+
+    def __init__(self, path_file, chunk_size=1 << 20, prefetch=16):
+        """
+        Inizializzazione e avvio del thread di decompressione.
+
+        :param self
+        :param path_file: path del dump
+        :param chunk_size: dimensione dei blocchi decompressi
+        :param prefetch: numero massimo di blocchi in coda
+        """
+        super().__init__()
+
+        self.name = path_file
+        self.chunk_size = chunk_size
+
+        self.raw = openRaw(path_file)
+        self.queue = queue.Queue(maxsize=prefetch)
+
+        self.buffer = memoryview(b'')
+        self.eof = False
+        self.stopped = threading.Event()
+
+        # Byte decompressi consegnati al parser
+        self.bytes_read = 0
+
+        self.thread = threading.Thread(target=self.__fill, daemon=True)
+        self.thread.start()
+
+
+    def __fill(self):
+        """
+        Corpo del thread di decompressione.
+        Un blocco vuoto indica la fine del file, un'eccezione viene passata al lettore.
+
+        :param self
+        """
+        try:
+            while not self.stopped.is_set():
+                chunk = self.raw.read(self.chunk_size)
+                self.queue.put(chunk)
+                if not chunk:
+                    break
+        except Exception as e:
+            self.queue.put(e)
+
+
+    def readable(self):
+        return True
+
+
+    def read(self, size=-1):
+        """
+        Lettura di al più 'size' byte decompressi.
+
+        :param self
+        :param size: byte da leggere, se negativo legge tutto il file
+        return bytes letti, b'' a fine file
+        """
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+
+        if size == 0 or (self.eof and not self.buffer):
+            return b''
+
+        if not self.buffer:
+            chunk = self.queue.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                self.eof = True
+                return b''
+            self.buffer = memoryview(chunk)
+
+        res = self.buffer[:size].tobytes()
+        self.buffer = self.buffer[size:]
+        self.bytes_read += len(res)
+        return res
+
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+    def close(self):
+        """
+        Arresto del thread di decompressione e chiusura del file.
+        Svuoto la coda in modo che il thread, se bloccato sulla 'put', possa terminare.
+
+        :param self
+        """
+        if not self.closed:
+            self.stopped.set()
+            while self.thread.is_alive():
+                try:
+                    self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.raw.close()
+        super().close()
+
+
+def openCorpus(path_file, threaded=True):
+    """
+    Apertura del corpus da parsare.
+    Se il file è compresso viene ritornato un DumpStream che lo decomprime in parallelo
+    al parsing, altrimenti il file viene letto direttamente.
+
+    :param path_file: path del dump (.xml, .bz2, .gz o .zst)
+    :param threaded: se False la decompressione avviene nel thread del parser
+    return file-like binario
+    """
+    if threaded and isCompressed(path_file):
+        return DumpStream(path_file)
+    return openRaw(path_file)
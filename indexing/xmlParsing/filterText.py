@@ -1,18 +1,136 @@
 
 import re
-from . import interwikiLink, saxReader
+import time
+from .prefixes import PrefixClassifier, ARTICLE, CATEGORY
+
+
+# Link '[[..]]' e pattern usati per risolverli in 'resolveLink'
+LINK_PATTERN = re.compile(r'\[\[([^\]]+?)\]\]')
+LINK_SECTION = re.compile(r'#.*')
+LINK_TRAILING_SLASH = re.compile(r'/\s*?$')
+LINK_LAST_SUBPAGE = re.compile(r'/[^/]+?$')
+LINK_TWO_CHARS = re.compile(r'..')
+
+# Pattern di 'getCleaned' precompilati, nello stesso ordine di 'getCleanedLegacy'.
+# Per ogni pattern sono indicate le stringhe che devono essere presenti nel testo perchè il pattern 
+# possa avere un match: se ne manca una la sostituzione viene saltata.
+CLEAN_TEMPLATES = [
+    (re.compile(r'{{[^}{]*?url=.*?}}', re.DOTALL), ('{{', 'url=')),
+    (re.compile(r'{{[^}{]*?lang.*?}}', re.DOTALL), ('{{', 'lang')),
+    (re.compile(r'{{[^}{]*?reflist.*?}}', re.DOTALL), ('{{', 'reflist')),
+    (re.compile(r'{{[^}{]*?commons.*?}}', re.DOTALL), ('{{', 'commons')),
+    (re.compile(r'{{[^}{]*?coord.*?}}', re.DOTALL), ('{{', 'coord')),
+    (re.compile(r'\[http.+?\]', re.DOTALL), ('[http',)),
+    (re.compile(r'\shttp.+?\s', re.DOTALL), ('http',)),
+]
+CLEAN_DOMAINS = ('.com', '.org', '.it', '.en')
+SPACE = re.compile(r'\s')
+CLEAN_BLOCKS = [
+    (re.compile(r'<gallery.*?</gallery>', re.DOTALL), ('<gallery',)),
+    (re.compile(r'\[\[File:.*?\]\]', re.DOTALL), ('[[File:',)),
+    (re.compile(r'\[\[Media:.*?\]\]', re.DOTALL), ('[[Media:',)),
+    (re.compile(r'<[^<]*?>', re.DOTALL), ('<', '>')),
+]
+# Caratteri singoli rimossi o sostituiti con spazio. Uso 'str.replace' invece di 'str.translate': 
+# con testo non ASCII translate usa la versione lenta ed è circa 10 volte più lento delle 9 replace.
+CLEAN_CHARS = [('[', ''), (']', ''), ('{', ''), ('}', ''), ('/', ''), ('*', ''),
+               (':', ' '), ('|', ' '), ('=', ' ')]
+
+# Scanner di 'stripMarkup': token di apertura/chiusura delle strutture da rimuovere.
+# '[^<>]*' si ferma al primo '<', quindi ogni carattere viene esaminato al più una volta.
+# Come le regex di 'getCleanedLegacy' i pattern distinguono maiuscole e minuscole ('{{Lang|..}}',
+# '{{Coord|..}}', 'URL=', '[[file:..]]' non vengono rimossi).
+SCAN_TOKENS = re.compile(r'\{\{|\}\}|\[\[|\]\]|\[http'
+                         r'|<(ref|gallery)(?=[\s/>])[^<>]*>|</(ref|gallery)\s*>')
+# Template rimossi: quelli che contengono una di queste stringhe prima della prima parentesi graffa
+# successiva all'apertura (come nei pattern '{{[^}{]*?url=.*?}}'), vedi 'templateHead'.
+SCAN_TEMPLATE_HEAD = ('url=', 'lang', 'reflist', 'commons', 'coord')
+# Link rimossi interamente (con l'eventuale didascalia e i link che contiene)
+SCAN_LINK_PREFIXES = ('File:', 'Media:')
+SCAN_CLOSERS = {'}}': '{{', ']]': '[[', '|}': '{|'}
+# Ogni quanti token controllare il tempo a disposizione
+SCAN_CHECK_EVERY = 256
+# Token delle tabelle '{| .. |}' (solo a inizio riga, '|}}' è la chiusura di un template), gruppo 3
+SCAN_TOKENS_TABLES = re.compile(SCAN_TOKENS.pattern + r'|^[ \t]*(\{\||\|\}(?!\}))', re.MULTILINE)
+
+# Riduzione del contenuto (vedi 'stripOptions'): tipi di parti ripetitive rimosse interamente 
+# dallo scanner e, per i template, pattern del nome del template
+STRIP_KINDS = ('infobox', 'navbox', 'table', 'citation')
+STRIP_TEMPLATES = {'infobox': r'infobox',
+                   'navbox': r'(?:[^|{}]*?(?:navbox|sidebar|navigation)|authority control)',
+                   'citation': r'(?:cite|citation|sfn|harv)',
+                   }
+CLEAN_HTTP = re.compile(r'\shttp.+?\s', re.DOTALL)
+CLEAN_TAGS = re.compile(r'<[^<]*?>', re.DOTALL)
+
+
+def filterOptions(args_paths):
+    """
+    Opzioni di FilterWikiText lette dagli argomenti da linea di comando.
+
+    :param args_paths: argomenti (cleaner, clean_budget)
+    return dict di argomenti per FilterWikiText
+    """
+    return {'cleaner': getattr(args_paths, 'cleaner', 'scanner'),
+            'clean_budget': getattr(args_paths, 'clean_budget', 0.5),
+            'strip': [kind for kind in getattr(args_paths, 'strip', '').split(',') if kind],
+            }
+
+
+def stripOptions(kinds):
+    """
+    Opzioni della riduzione del contenuto per 'stripMarkup'.
+        - infobox  : template '{{Infobox ..}}'
+        - navbox   : template di navigazione ('{{Navbox ..}}', '{{.. sidebar}}', '{{.. navigation}}',
+                     '{{Authority control}}')
+        - table    : tabelle '{| .. |}'
+        - citation : template delle citazioni ('{{cite ..}}', '{{citation}}', '{{sfn}}', '{{harv..}}');
+                     i blocchi '<ref>..</ref>' sono già rimossi dallo scanner
+    Di questi elementi non resta niente nel testo (a differenza degli altri template, di cui
+    restano i parametri come parole).
+
+    :param kinds: iterabile di tipi in STRIP_KINDS
+    return (pattern del nome dei template da rimuovere o None, True se rimuovere le tabelle), 
+           None se 'kinds' è vuoto
+    """
+    kinds = set(kinds)
+    if not kinds:
+        return None
+
+    unknown = kinds.difference(STRIP_KINDS)
+    if unknown:
+        raise ValueError('Tipi di contenuto da rimuovere non validi: '+', '.join(sorted(unknown)))
+
+    names = [STRIP_TEMPLATES[kind] for kind in STRIP_KINDS if kind in kinds and kind in STRIP_TEMPLATES]
+    templates = re.compile(r'\s*(?:' + '|'.join(names) + r')', re.IGNORECASE) if names else None
+    return templates, 'table' in kinds
+
 
 class FilterWikiText():
 
-    def __init__(self, path_interwiki_links):
+    def __init__(self, path_interwiki_links, cleaner='scanner', clean_budget=0.5, strip=()):
         """
-        Inizializzazione interwiki_prefix_set che corrisponde ad un set contenente tutti i prefix 
-        degli interwiki link.
+        Inizializzazione del classificatore dei prefissi dei link (interwiki, namespace non validi, 
+        categorie), vedi prefixes.py.
         
         :param self
-        :param dir_storage: directory dove salvare i prefix degli interwiki link
+        :param path_interwiki_links: snapshot json dei prefissi (o vecchio file pickle degli interwiki)
+        :param cleaner: 'scanner' per 'getCleanedScanner', 'regex' per 'getCleaned'
+        :param clean_budget: secondi a disposizione per lo scanner di ogni pagina (0 = senza limite)
+        :param strip: tipi di contenuto da rimuovere interamente (vedi 'stripOptions'), solo con lo scanner
+                      (ValueError con 'regex', che non li rimuove)
         """
-        self.interwiki_prefix_set = interwikiLink.getPrefixSet(path_interwiki_links)
+        self.cleaner = cleaner
+        self.clean_budget = clean_budget
+        self.strip = stripOptions(strip)
+        if self.strip is not None and cleaner != 'scanner':
+            raise ValueError('La rimozione dei contenuti (' + ', '.join(sorted(set(strip))) + ') '
+                             'è disponibile solo con il cleaner \'scanner\', non con \'' + cleaner + '\'')
+
+        self.prefixes = PrefixClassifier.load(path_interwiki_links)
+
+        # Tempi cumulativi delle fasi del filtraggio: fase -> [secondi, chiamate]
+        self.timings = {}
 
 
     def getLinkAndCategory(self, text, title):
@@ -46,81 +164,384 @@ class FilterWikiText():
         res_dict ={'links': [], 'categories': []}
         
         # reg exp per determinare i link da text wiki '[[link]]'
-        pattern = re.compile(r'\[\[([^\]]+?)\]\]') 
+        for match in LINK_PATTERN.finditer(text):
+            resolved = self.resolveLink(match.group(1), title)
+            if resolved is not None:
+                res_dict[resolved[0]].append(resolved[1])
+        return res_dict 
+
+
+    def resolveLink(self, link, title):
+        """
+        Risoluzione e filtraggio del contenuto di un link (vedi 'getLinkAndCategory').
+        I pattern sono precompilati e il prefisso viene classificato con una sola ricerca in
+        'self.prefixes' (vedi prefixes.py).
+
+        :param self
+        :param link: contenuto del link, tra '[[' e ']]'
+        :param title: il titolo della pagina che contiene il link
+
+        return ('links', link) o ('categories', categoria), None se il link non è considerato
+        """
+        # [[Link name| display name]]   -->  res = 'Link name'   -> non considero il display name perchè non fa parte del link
+        res = link.split("|")[0].strip() 
+        
+        # link a una sezione nella stessa pagina non lo considero (startswith('#'))
+        # se il link è uguale a titolo delle pagina, allora NON è un link ma viene solo messo in grassetto il testo in fase di visualizzazione
+        if res.startswith('#') or res == title:
+            return None
+
+        # Da fare sempre se link valido                  
+        if '#' in res:
+            res = LINK_SECTION.sub('', res)          # elimina da '#' fino alla fine SE '#' PRESENTE
+        if '/' in res:
+            res = LINK_TRAILING_SLASH.sub('', res)   # elimina ultimo '/' nell'url SE PRESENTE 
         
-        for match in re.finditer(pattern, text):
-            # [[Link name| display name]]   -->  res = 'Link name'   -> non considero il display name perchè non fa parte del link
-            res = match.group(1).split("|")[0].strip() 
+        # link alla sotto-pagina e quindi devo aggiungere come prefisso il titolo della 
+        # pagina corrente                                     
+        if res.startswith('/'):
+            res = title+res
             
-            # link a una sezione nella stessa pagina non lo considero (startswith('#'))
-            # se il link è uguale a titolo delle pagina, allora NON è un link ma viene solo messo in grassetto il testo in fase di visualizzazione
-            if not res.startswith('#') and res!=title :
-                is_category = False                  
-                                  
-                # Da fare sempre se link valido                  
-                res = re.sub(r'#.*', '', res)        # elimina da '#' fino alla fine SE '#' PRESENTE
-                res = re.sub(r'/\s*?$', '', res)     # elimina ultimo '/' nell'url SE PRESENTE 
-                
-                # link alla sotto-pagina e quindi devo aggiungere come prefisso il titolo della 
-                # pagina corrente                                     
-                if res.startswith('/'):
-                    res = title+res
-                    
-                # Data la pag 'p/test1' --> 'test1 è sotto-pagina di 'p'. 
-                # Nella pag 'p/test1' ho un link che inizia con '../test2', questo significa che 
-                # il link risultante deve essere 'p/test2'
-                elif res.startswith('../'):
-                    father_page = re.sub(r'/[^/]+?$', '', title)    # da 'p/test1' a 'p/' oopure da 'p/test1/test2' a       'p/test1
-                    res = father_page + re.sub(r'..', '', res)      # Se link è '../test3' tolgo solo '..' così diventa --> 'p/test1/test3
-                    
-                # Se definito, indica una delle categorie di cui fa parte la pagina corrente, quindi
-                # la aggiungo alla lista delle categorie
-                elif res.startswith('Category'):
-                    is_category = True
-
-                # NON risolviamo link che contengono variabili {{''}} dato che 
-                # servono principalmente per riferirsi a Talk pages oppure risolvere link di
-                # help pages per ricondursi a link di base
-                elif res.startswith('{{'):
-                    res = None
-
-                # Prefissi che non sono NAMESPACE non li considero
-                elif res.startswith('Image:') or res.startswith('Manual:') or res.startswith('Extension:'):
-                    res = None
-
-                # match_ è NOT NONE se il link ha queste forme :   ':x:y'  o  'x:y'  o  ':x:y:z'  o  'x:y:z'  ...
-                # ovvero se è un candidato INTERWIKI LINK o LINK a pagine in cui è specificato il NAMESAPCE.
-                # Se è NOT NONE allora ricavo il prefix :   ':x:y:z' --> 'x'  o  'x:y' --> 'x'    (toglie ':')
-                  # Una volta ricavata la 'x' (prefix), controllo se 
-                    #  1) è un INTERWIKI LINK  --> res = None
-                    #  2) è link a pagina che ha NAMESPACE non valido  -->  res = None
-                    #  Se non soddisfa 1) e 2) allora significa che è un link che ha ':' nel titolo ma non corrisponde a interwiki o namespace non validi --> link valido
-                # Se invece match_ è NONE, significa che il link non è INTERWIKILINK e non fa parte di NAMESPACE non validi --> link PROBABILMENTE valido
-                else:
-                    match_ = re.search(r'^:?[^:]+?:', res)
-                    if match_ is not None:
-                        pref = re.sub(r':', '', match_[0]) 
-                        if pref in self.interwiki_prefix_set:
-                            res = None
-                        else:
-                            for ns_not_valid in saxReader.NS_NOT_VALID.values():  
-                                if pref == ns_not_valid.replace("_", " "):
-                                    res = None
-                    
-                # Se res == None --> tipo di link non considerato e non faccio niente
-                # Se non è una categoria, è possibile che un titolo inizi con ':', ma il titolo effettivo è senza ':', quindi li tolgo.
-                # es :   [[:Article]] è equivalente con [[Article]], ma mi salvo solo 'Article'
-                if res is not None:
-                    if is_category:
-                        res_dict['categories'].append(res)
-                    else:
-                        res = re.sub(r':', '', res)  
-                        res_dict['links'].append(res)
-        return res_dict 
+        # Data la pag 'p/test1' --> 'test1 è sotto-pagina di 'p'. 
+        # Nella pag 'p/test1' ho un link che inizia con '../test2', questo significa che 
+        # il link risultante deve essere 'p/test2'
+        elif res.startswith('../'):
+            father_page = LINK_LAST_SUBPAGE.sub('', title)      # da 'p/test1' a 'p/' oopure da 'p/test1/test2' a       'p/test1
+            res = father_page + LINK_TWO_CHARS.sub('', res)     # Se link è '../test3' tolgo solo '..' così diventa --> 'p/test1/test3
+            
+        # NON risolviamo link che contengono variabili {{''}} dato che 
+        # servono principalmente per riferirsi a Talk pages oppure risolvere link di
+        # help pages per ricondursi a link di base
+        elif res.startswith('{{'):
+            return None
+
+        # Se il link ha queste forme :   ':x:y'  o  'x:y'  o  ':x:y:z'  o  'x:y:z'  ...
+        # è un candidato INTERWIKI LINK o LINK a pagine in cui è specificato il NAMESAPCE, e il prefix è 'x'.
+        #   - 'Category:x' indica una delle categorie di cui fa parte la pagina corrente, quindi la 
+        #     aggiungo alla lista delle categorie (':Category:x' invece è un link alla pagina della 
+        #     categoria, quindi a un namespace non valido);
+        #   - se 'x' è un INTERWIKI LINK o un NAMESPACE non valido il link non è valido;
+        #   - altrimenti è un link che ha ':' nel titolo.
+        # (equivalente di re.search(r'^:?[^:]+?:', res))
+        else:
+            start = 1 if res.startswith(':') else 0
+            end = res.find(':', start)
+            if end > start:
+                kind = self.prefixes.classify(res[start:end])
+                if kind == CATEGORY and start == 0:
+                    return ('categories', res)
+                if kind != ARTICLE:
+                    return None
+            
+        # Se non è una categoria, è possibile che un titolo inizi con ':', ma il titolo effettivo è senza ':', quindi li tolgo.
+        # es :   [[:Article]] è equivalente con [[Article]], ma mi salvo solo 'Article'
+        return ('links', res.replace(':', ''))
+
+
+    def lexPage(self, text, title):
+        """
+        Estrazione di link e categorie e pulizia del testo con un'unica scansione del testo
+        (vedi 'stripMarkup'): stesso risultato di 'getLinkAndCategory' per link e categorie e di
+        'getCleanedScanner' per il testo.
+
+        :param self
+        :param text: testo della pagina
+        :param title: titolo della pagina
+
+        return (dict con link, categorie e testo pulito, True se è stato superato il tempo a disposizione)
+        """
+        res_dict = {'links': [], 'categories': []}
+
+        def addLink(link):
+            resolved = self.resolveLink(link, title)
+            if resolved is not None:
+                res_dict[resolved[0]].append(resolved[1])
+
+        res_dict['text'], exceeded = FilterWikiText.getCleanedScanner(text, self.clean_budget, addLink, self.strip)
+        return res_dict, exceeded
 
 
     @classmethod
     def getCleaned(cls, text):
+        """
+        Pulizia del testo con lo stesso risultato di 'getCleanedLegacy', ma più veloce:
+            - i pattern sono precompilati e vengono saltati se nel testo manca una stringa necessaria
+              per il match (es: 'url=' per '{{..url=..}}');
+            - le parole che terminano con '.com', '.org', '.it', '.en' vengono trovate cercando il 
+              suffisso con 'str.find' invece di provare il pattern su ogni parola del testo;
+            - i 9 caratteri singoli vengono rimossi con 'str.replace' invece che con una regex.
+        I pattern non sono uniti in un'unica alternativa perchè ogni sostituzione lavora sul risultato
+        della precedente: con template annidati o parole adiacenti (es: '{{lang {{x url=a}} b}}') 
+        un unico passaggio darebbe un risultato diverso.
+
+        :param cls
+        :param text: testo da pulire
+
+        return testo pulito
+        """
+        res = text
+        for pattern, required in CLEAN_TEMPLATES:
+            if all(literal in res for literal in required):
+                res = pattern.sub('', res)
+
+        for suffix in CLEAN_DOMAINS:
+            if suffix in res:
+                res = cls.removeDomainWords(res, suffix)
+
+        for pattern, required in CLEAN_BLOCKS:
+            if all(literal in res for literal in required):
+                res = pattern.sub('', res)
+
+        for char, new in CLEAN_CHARS:
+            res = res.replace(char, new)
+        return res
+
+
+    @classmethod
+    def removeDomainWords(cls, text, suffix):
+        """
+        Equivalente di re.sub(r'\s[^\s]+' + re.escape(suffix) + r'\s?', '', text): rimuove ogni parola
+        preceduta da uno spazio che contiene il suffisso dopo il primo carattere, fino all'ultima 
+        occorrenza del suffisso nella parola, più lo spazio successivo se presente.
+        Vengono esaminate solo le occorrenze del suffisso invece di ogni parola del testo.
+
+        :param cls
+        :param text: testo da pulire
+        :param suffix: suffisso da cercare (senza spazi)
+
+        return testo pulito
+        """
+        parts = []
+        copied = 0          # fine dell'ultimo match: la regex continua la ricerca da qui
+        start = end = 0     # parola [start, end) dell'ultima occorrenza esaminata
+        found = text.find(suffix)
+
+        while found != -1:
+            if found >= end:
+                start = end = found
+                while start > 0 and not text[start - 1].isspace():
+                    start -= 1
+                space = SPACE.search(text, end)
+                end = space.start() if space else len(text)
+
+            # serve uno spazio prima della parola (non già rimosso) e almeno un carattere prima del suffisso
+            if start - 1 >= copied and start < found:
+                match_end = text.rfind(suffix, start + 1, end) + len(suffix)
+                if match_end < len(text) and text[match_end].isspace():
+                    match_end += 1
+
+                parts.append(text[copied:start - 1])
+                copied = match_end
+                found = text.find(suffix, match_end)
+            else:
+                found = text.find(suffix, found + 1)
+
+        if not parts:
+            return text
+        parts.append(text[copied:])
+        return ''.join(parts)
+
+
+    @classmethod
+    def stripMarkup(cls, text, deadline=None, link_fn=None, strip=None):
+        """
+        Rimozione delle strutture annidate con un'unica scansione lineare del testo:
+            - template '{{..}}' che contengono una delle stringhe di SCAN_TEMPLATE_HEAD prima della prima
+              parentesi graffa, compresi i template che contengono;
+            - blocchi '<ref>..</ref>', '<ref ../>' e '<gallery>..</gallery>' (il contenuto viene ignorato);
+            - link '[[File:..]]' e '[[Media:..]]', compresi i link della didascalia;
+            - link esterni '[http..]'.
+        Le parentesi vengono accoppiate con uno stack: una chiusura senza apertura viene ignorata, 
+        un'apertura senza chiusura non viene rimossa (come con le regex). 
+        A differenza delle regex non ci sono backtracking: il tempo è lineare anche con parentesi 
+        non bilanciate o migliaia di template.
+
+        Con 'strip' (vedi 'stripOptions') vengono rimossi anche i template con il nome indicato 
+        (infobox, navbox, citazioni) e le tabelle '{| .. |}', compreso tutto quello che contengono.
+
+        Nella stessa scansione, se 'link_fn' è specificata, viene chiamata con il contenuto di ogni
+        link '[[..]]' trovato da LINK_PATTERN in 'getLinkAndCategory' (stessi link, nello stesso
+        ordine), anche se si trova in una parte di testo rimossa. Se viene superato il tempo a
+        disposizione, la scansione continua solo per i link.
+
+        :param cls
+        :param text: testo da pulire
+        :param deadline: istante (time.perf_counter) oltre il quale interrompere la rimozione
+        :param link_fn: funzione chiamata con il contenuto di ogni link
+        :param strip: opzioni di 'stripOptions' (None = nessuna riduzione del contenuto)
+
+        return testo senza le strutture rimosse, None se è stato superato il tempo a disposizione
+        """
+        strip_templates, strip_tables = strip if strip is not None else (None, False)
+        tokens = SCAN_TOKENS_TABLES if strip_tables else SCAN_TOKENS
+
+        removed = []            # intervalli [start, end) da rimuovere, ordinati e disgiunti
+        stack = []              # strutture aperte: (tipo, start)
+        open_count = {'{{': 0, '[[': 0, '{|': 0}
+        block = None            # tag (ref, gallery) del blocco aperto, di cui ignoro il contenuto
+        skip_until = 0          # fine dell'ultimo link esterno rimosso
+        no_bracket = False      # non ci sono più ']' nel testo
+        exceeded = False
+        link_end = 0            # fine dell'ultimo link trovato (i link non si sovrappongono)
+        next_close = -1         # prima ']' dopo l'ultimo link cercato
+
+        def remove(start, end):
+            while removed and removed[-1][0] >= start:
+                removed.pop()
+            removed.append((start, end))
+
+        n = 0
+        for match in tokens.finditer(text):
+            if deadline is not None:
+                if n % SCAN_CHECK_EVERY == 0 and not exceeded and time.perf_counter() > deadline:
+                    if link_fn is None:
+                        return None
+                    exceeded = True
+                n += 1
+
+            token = match.group()
+            if strip_tables and match.lastindex == 3:
+                token = match.group(3)
+            pos = match.start()
+
+            if token == '[[':
+                # equivalente di LINK_PATTERN: il contenuto va fino alla prima ']', che deve essere ']]'.
+                # La posizione della prima ']' viene riusata finchè i link successivi iniziano prima.
+                if link_fn is not None and pos >= link_end and not text.startswith(']', pos + 2):
+                    if next_close < pos + 3:
+                        next_close = text.find(']', pos + 3)
+                        if next_close == -1:
+                            next_close = len(text)
+                    if text.startswith(']]', next_close):
+                        link_fn(text[pos + 2:next_close])
+                        link_end = next_close + 2
+
+                if not exceeded and pos >= skip_until and block is None:
+                    stack.append((token, pos))
+                    open_count[token] += 1
+                continue
+
+            if exceeded or pos < skip_until:
+                continue
+
+            if block is not None:
+                if match.group(2) is not None and match.group(2) == block[0]:
+                    remove(block[1], match.end())
+                    block = None
+                continue
+
+            kind = SCAN_CLOSERS.get(token)
+            if kind is not None:
+                if not open_count[kind]:
+                    continue
+                # le strutture aperte dopo quella che sto chiudendo non sono state chiuse: le scarto
+                while stack[-1][0] != kind:
+                    open_count[stack.pop()[0]] -= 1
+                kind, start = stack.pop()
+                open_count[kind] -= 1
+
+                if kind == '{{':
+                    if cls.templateHead(text, start + 2, pos):
+                        remove(start, match.end())
+                    elif strip_templates is not None and strip_templates.match(text, start + 2, pos):
+                        remove(start, match.end())
+                elif kind == '{|' or text.startswith(SCAN_LINK_PREFIXES, start + 2):
+                    remove(start, match.end())
+
+            elif token == '{{' or token == '{|':
+                stack.append((token, pos))
+                open_count[token] += 1
+
+            elif token == '[http':
+                end = -1 if no_bracket else text.find(']', pos + 6)
+                if end == -1:
+                    no_bracket = True
+                else:
+                    remove(pos, end + 1)
+                    skip_until = end + 1
+
+            elif match.group(1) is not None:
+                if token.endswith('/>'):
+                    remove(pos, match.end())
+                else:
+                    block = (match.group(1), pos)
+
+        if exceeded:
+            return None
+        if not removed:
+            return text
+
+        parts = []
+        copied = 0
+        for start, end in removed:
+            parts.append(text[copied:start])
+            copied = end
+        parts.append(text[copied:])
+        return ''.join(parts)
+
+
+    @classmethod
+    def templateHead(cls, text, start, end):
+        """
+        Equivalente di re.compile(r'(url=|lang|reflist|commons|coord)|[{}]').search(text, start, end) con
+        il gruppo 1 trovato: una delle stringhe di SCAN_TEMPLATE_HEAD prima della prima parentesi graffa.
+        Con 'str.find' invece della regex, che prova le 5 alternative su ogni carattere.
+
+        :param cls
+        :param text: testo della pagina
+        :param start: inizio del contenuto del template (dopo '{{')
+        :param end: fine del contenuto del template (prima di '}}')
+
+        return True se il template va rimosso
+        """
+        for brace in '{}':
+            found = text.find(brace, start, end)
+            if found != -1:
+                end = found
+        for head in SCAN_TEMPLATE_HEAD:
+            if text.find(head, start, end) != -1:
+                return True
+        return False
+
+
+    @classmethod
+    def getCleanedScanner(cls, text, budget=None, link_fn=None, strip=None):
+        """
+        Pulizia del testo con 'stripMarkup' al posto delle regex dei template, dei blocchi e dei 
+        link a file, seguita dalle stesse sostituzioni lineari di 'getCleaned'.
+        Se la scansione supera 'budget' secondi, la pagina viene pulita solo dai tag html e dai
+        caratteri speciali (pulizia più grossolana ma in tempo sicuramente lineare).
+
+        :param cls
+        :param text: testo da pulire
+        :param budget: secondi a disposizione per la scansione (None o 0 = senza limite)
+        :param link_fn: funzione chiamata con il contenuto di ogni link (vedi 'stripMarkup')
+        :param strip: opzioni della riduzione del contenuto (vedi 'stripOptions')
+
+        return (testo pulito, True se è stato superato il tempo a disposizione)
+        """
+        deadline = time.perf_counter() + budget if budget else None
+        res = cls.stripMarkup(text, deadline, link_fn, strip)
+        exceeded = res is None
+
+        if exceeded:
+            res = text
+        else:
+            if 'http' in res:
+                res = CLEAN_HTTP.sub('', res)
+            for suffix in CLEAN_DOMAINS:
+                if suffix in res:
+                    res = cls.removeDomainWords(res, suffix)
+
+        if '<' in res:
+            res = CLEAN_TAGS.sub('', res)
+        for char, new in CLEAN_CHARS:
+            res = res.replace(char, new)
+        return res, exceeded
+
+
+    @classmethod
+    def getCleanedLegacy(cls, text):
         """
         # DOCS   https://www.mediawiki.org/wiki/Help:Magic_words
         
@@ -187,10 +608,59 @@ class FilterWikiText():
         :param text: testo della pagina
         :parma title: titolo della pagina
         """
+        start = time.perf_counter()
+        if self.cleaner != 'regex':
+            res, exceeded = self.lexPage(text, title)
+            self.addTiming('lexPage', time.perf_counter() - start)
+            if exceeded:
+                self.addTiming('clean_budget_exceeded', 0.0)
+            return res
+
         res = self.getLinkAndCategory(text, title)
+        middle = time.perf_counter()
         res['text'] = FilterWikiText.getCleaned(text)
+        end = time.perf_counter()
+
+        self.addTiming('getLinkAndCategory', middle - start)
+        self.addTiming('getCleaned', end - middle)
         return res
 
+
+    def addTiming(self, name, seconds):
+        """
+        Aggiornamento del tempo cumulativo di una fase.
+
+        :param self
+        :param name: nome della fase
+        :param seconds: secondi spesi
+        """
+        timing = self.timings.setdefault(name, [0.0, 0])
+        timing[0] += seconds
+        timing[1] += 1
+
+
+    def filterPage(self, title, id_page, text, offset=None):
+        """
+        Filtraggio di una pagina letta dal dump e preparazione del dict da passare alla 
+        funzione che la indicizza.
+
+        :param self
+        :param title: titolo della pagina
+        :param id_page: id della pagina
+        :param text: testo della pagina
+        :param offset: posizione della pagina nel dump
+        return dict con titolo, id, testo pulito, link interni, categorie e posizione nel dump
+        """
+        filtered = self.startFilter(text, title)
+
+        return {'title': title,
+                'id': id_page.strip(),
+                'text': filtered['text'],
+                'internal_link': filtered['links'],
+                'categories': filtered['categories'],
+                'offset': offset,
+                }
+
                     
                     
                     
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DOCS : https://meta.wikimedia.org/wiki/Data_dumps/Dump_format#Multistream_dumps
+
+Accesso ai dump 'pages-articles-multistream.xml.bz2'.
+Il dump è formato da tanti stream bz2 indipendenti, ognuno con al più 100 pagine, e viene
+pubblicato insieme ad un file indice le cui righe hanno la forma:
+
+    offset:id_pagina:titolo
+
+dove 'offset' è la posizione in byte (nel file compresso) dello stream che contiene la pagina.
+Il primo stream (header con il 'siteinfo') non compare nell'indice, l'ultimo stream contiene solo
+la chiusura del tag radice.
+Ogni stream può quindi essere decompresso e parsato in modo indipendente dagli altri.
+"""
+
+import bz2
+import collections
+import io
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from . import saxReader
+
+
+def openIndex(path_index):
+    """
+    Apertura del file indice, che può essere compresso in bz2 (come viene pubblicato)
+    oppure già decompresso.
+
+    :param path_index: path del file indice
+    return file-like testuale
+    """
+    if path_index.endswith('.bz2'):
+        return bz2.open(path_index, 'rt', encoding='utf-8')
+    return open(path_index, 'r', encoding='utf-8')
+
+
+def readIndex(path_index):
+    """
+    Generatore delle righe del file indice.
+    Il titolo può contenere ':' quindi divido solo sui primi 2.
+
+    :param path_index: path del file indice
+    yield: tupla (offset, id_pagina, titolo)
+    """
+    with openIndex(path_index) as fp:
+        for line in fp:
+            line = line.rstrip('\n')
+            if line:
+                offset, id_page, title = line.split(':', 2)
+                yield int(offset), id_page, title
+
+
+def streamRanges(path_index, path_dump):
+    """
+    Intervalli di byte [start, end) di tutti gli stream che contengono pagine.
+    L'ultimo stream termina alla fine del file.
+
+    :param path_index: path del file indice
+    :param path_dump: path del dump multistream
+    return lista ordinata di tuple (start, end)
+    """
+    offsets = sorted(set(offset for offset, _, _ in readIndex(path_index)))
+    ends = offsets[1:] + [os.path.getsize(path_dump)]
+
+    return list(zip(offsets, ends))
+
+
+def splitRanges(ranges, n):
+    """
+    Divisione degli stream in n gruppi di stream consecutivi, con circa lo stesso numero
+    di byte compressi per gruppo.
+
+    :param ranges: lista ordinata di tuple (start, end)
+    :param n: numero di gruppi
+    return lista di al più n liste di tuple (start, end)
+    """
+    if not ranges:
+        return []
+
+    total = ranges[-1][1] - ranges[0][0]
+    per_group = total / max(1, n)
+
+    groups = [[]]
+    for start, end in ranges:
+        if groups[-1] and (start - ranges[0][0]) >= per_group * len(groups) and len(groups) < n:
+            groups.append([])
+        groups[-1].append((start, end))
+    return groups
+
+
+def readStream(fp, start, end):
+    """
+    Lettura e decompressione dei byte [start, end) del dump.
+    Il risultato viene racchiuso in un tag radice in modo che sia un xml valido: se presente,
+    la chiusura del tag radice originale (ultimo stream) viene tolta.
+
+    :param fp: file del dump aperto in lettura binaria
+    :param start: offset iniziale
+    :param end: offset finale (escluso)
+    return bytes xml delle pagine contenute negli stream
+    """
+    fp.seek(start)
+    data = bz2.decompress(fp.read(end - start))
+    data = data.replace(b'</mediawiki>', b'')
+
+    return b'<mediawiki>' + data + b'</mediawiki>'
+
+
+def iterStreamPages(path_dump, ranges, redirect_fn=None):
+    """
+    Generatore delle pagine contenute negli stream indicati.
+
+    :param path_dump: path del dump multistream
+    :param ranges: lista di tuple (start, end)
+    :param redirect_fn: funzione (titolo, destinazione) chiamata per ogni redirect (vedi redirects.py)
+    yield: WikiPage valida
+    """
+    with open(path_dump, 'rb') as fp:
+        for start, end in ranges:
+            yield from saxReader.iterPages(io.BytesIO(readStream(fp, start, end)), valid_only=True,
+                                           redirect_fn=redirect_fn)
+
+
+def locateTitles(path_index, path_dump, titles):
+    """
+    Ricerca nel file indice degli stream che contengono i titoli indicati.
+
+    :param path_index: path del file indice
+    :param path_dump: path del dump multistream
+    :param titles: set di titoli da cercare
+    return (lista ordinata di tutti gli stream (start, end), 
+            lista ordinata degli stream (start, end) che contengono almeno un titolo)
+    """
+    offsets = set()
+    selected = set()
+    for offset, _, title in readIndex(path_index):
+        offsets.add(offset)
+        if title in titles:
+            selected.add(offset)
+
+    offsets = sorted(offsets)
+    ranges = list(zip(offsets, offsets[1:] + [os.path.getsize(path_dump)]))
+
+    return ranges, [r for r in ranges if r[0] in selected]
+
+
+def decompressRange(path_dump, start, end):
+    """
+    Decompressione di uno stream, eseguita da un thread (bz2 rilascia il GIL durante la
+    decompressione). Ogni chiamata apre il proprio file per poter leggere in parallelo.
+
+    :param path_dump: path del dump multistream
+    :param start: offset iniziale
+    :param end: offset finale (escluso)
+    return bytes xml delle pagine dello stream
+    """
+    with open(path_dump, 'rb') as fp:
+        return readStream(fp, start, end)
+
+
+def iterRangesPages(path_dump, ranges, workers=4):
+    """
+    Generatore delle pagine degli stream indicati, decompressi in parallelo da 'workers' thread.
+    Gli stream vengono consegnati nell'ordine di 'ranges', con al più 2*workers stream
+    decompressi in anticipo: 'ranges' può quindi essere anche un generatore lungo.
+
+    :param path_dump: path del dump multistream
+    :param ranges: iterabile di tuple (start, end)
+    :param workers: numero di thread
+    yield: WikiPage valida
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = collections.deque()
+        try:
+            for start, end in ranges:
+                if len(pending) >= 2 * max(1, workers):
+                    data = pending.popleft().result()
+                    yield from saxReader.iterPages(io.BytesIO(data), valid_only=True)
+                pending.append(executor.submit(decompressRange, path_dump, start, end))
+
+            while pending:
+                data = pending.popleft().result()
+                yield from saxReader.iterPages(io.BytesIO(data), valid_only=True)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def filterMultistream(path_dump, path_index, total_docs_noise, titles_to_select, fn, *args_fn,
+                      workers=4, seed=None, **kwargs_fn):
+    """
+    Come 'saxReader.filterXML', ma senza leggere il dump dall'inizio: i titoli da selezionare
+    vengono cercati nel file indice e vengono decompressi solo gli stream che li contengono.
+    Le pagine di rumore vengono prese da stream scelti a caso tra i rimanenti.
+
+    :param path_dump: path del dump multistream
+    :param path_index: path del file indice
+    :param total_docs_noise: num totale di doc di rumore
+    :param titles_to_select: set di titoli da selezionare
+    :param fn: la funzione da eseguire per ogni pagina selezionata
+    :param args_fn: argomenti da passare alla funzione
+    :param workers: numero di thread per la decompressione
+    :param seed: seme per la scelta casuale degli stream di rumore
+    :param kwargs_fn: argomenti da passare alla funzione
+    """
+    selector = saxReader.PageSelector(total_docs_noise, titles_to_select)
+    ranges, selected = locateTitles(path_index, path_dump, titles_to_select)
+    print('Titoli trovati in '+str(len(selected))+' stream su '+str(len(ranges)))
+
+    for page in iterRangesPages(path_dump, selected, workers):
+        if page.title in titles_to_select:
+            fn(*args_fn, **kwargs_fn, **selector.checkAndSelect(page))
+
+    selected = set(selected)
+    noise_ranges = [r for r in ranges if r not in selected]
+    random.Random(seed).shuffle(noise_ranges)
+
+    # I titoli non presenti nell'indice non verranno mai selezionati, quindi mi fermo
+    # quando ho tutte le pagine di rumore
+    pages = iterRangesPages(path_dump, noise_ranges, workers)
+    for page in pages:
+        if selector.curr_docs_noise >= selector.total_docs_noise:
+            break
+        if page.title not in titles_to_select:
+            fn(*args_fn, **kwargs_fn, **selector.checkAndSelect(page))
+    pages.close()
+
+    missing = len(titles_to_select) - selector.curr_selected
+    if missing:
+        print('! '+str(missing)+' titoli non trovati nel dump')
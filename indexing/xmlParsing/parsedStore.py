@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File intermedio con le pagine già filtrate ('parsed pages store').
+
+Quando cambiamo un analyzer dello schema o i boost non serve rifare il parsing del dump e il
+filtraggio del testo: le pagine filtrate (id, titolo, testo pulito, link interni, categorie)
+vengono salvate una volta in questo file e le build successive lo leggono direttamente.
+
+Formato del file:
+
+    MAGIC
+    chunk_0 ... chunk_n      ogni chunk = zlib(marshal(lista di record)), record = tupla
+                             (id, titolo, testo, link, categorie, offset)
+    footer                   marshal(lista di (posizione, lunghezza, numero pagine) dei chunk)
+    posizione footer (8 byte little endian) + MAGIC
+
+I chunk sono scritti uno dopo l'altro, quindi la lettura è sequenziale; ogni chunk può essere
+decompresso in modo indipendente, in parallelo da più thread (zlib rilascia il GIL).
+"""
+
+import collections
+import marshal
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAGIC = b'WIKIPP01'
+FIELDS = ('id', 'title', 'text', 'internal_link', 'categories', 'offset')
+
+
+class ParsedStoreWriter:
+    """
+    Scrittura del file delle pagine filtrate.
+    Il file viene scritto con estensione '.tmp' e rinominato solo alla chiusura senza errori,
+    in modo che un file incompleto non venga mai usato da una build.
+    """
+
+    def __init__(self, path_store, chunk_pages=512, level=6):
+        """
+        Inizializzazione e apertura del file.
+
+        :param self
+        :param path_store: path del file
+        :param chunk_pages: pagine per chunk
+        :param level: livello di compressione zlib
+        """
+        self.path_store = path_store
+        self.chunk_pages = chunk_pages
+        self.level = level
+
+        self.fp = open(path_store + '.tmp', 'wb')
+        self.fp.write(MAGIC)
+
+        self.chunk = []
+        self.chunks = []
+
+
+    def add(self, **data_parsed):
+        """
+        Aggiunta di una pagina filtrata (il dict ritornato da FilterWikiText.filterPage).
+
+        :param self
+        :param data_parsed: dati della pagina
+        """
+        self.chunk.append(tuple(data_parsed.get(field) for field in FIELDS))
+        if len(self.chunk) >= self.chunk_pages:
+            self.__flushChunk()
+
+
+    def __flushChunk(self):
+        """
+        Scrittura del chunk corrente.
+
+        :param self
+        """
+        if not self.chunk:
+            return
+
+        data = zlib.compress(marshal.dumps(self.chunk), self.level)
+        self.chunks.append((self.fp.tell(), len(data), len(self.chunk)))
+        self.fp.write(data)
+        self.chunk = []
+
+
+    def close(self):
+        """
+        Scrittura dell'ultimo chunk e del footer, e rinomina del file.
+
+        :param self
+        """
+        self.__flushChunk()
+
+        footer_pos = self.fp.tell()
+        self.fp.write(marshal.dumps(self.chunks))
+        self.fp.write(struct.pack('<Q', footer_pos))
+        self.fp.write(MAGIC)
+        self.fp.close()
+
+        os.replace(self.path_store + '.tmp', self.path_store)
+
+
+    def abort(self):
+        """
+        Chiusura ed eliminazione del file incompleto.
+
+        :param self
+        """
+        self.fp.close()
+        os.remove(self.path_store + '.tmp')
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class ParsedStoreReader:
+    """
+    Lettura del file delle pagine filtrate tramite mmap.
+    """
+
+    def __init__(self, path_store):
+        """
+        Apertura del file e lettura del footer.
+
+        :param self
+        :param path_store: path del file
+        """
+        self.fp = open(path_store, 'rb')
+        self.map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+        end = len(self.map) - len(MAGIC)
+        if self.map[:len(MAGIC)] != MAGIC or self.map[end:] != MAGIC:
+            raise ValueError('File delle pagine filtrate non valido: '+path_store)
+
+        footer_pos = struct.unpack('<Q', self.map[end - 8:end])[0]
+        self.chunks = marshal.loads(self.map[footer_pos:end - 8])
+
+
+    def __len__(self):
+        """
+        :param self
+        return numero di pagine nel file
+        """
+        return sum(n_pages for _, _, n_pages in self.chunks)
+
+
+    def readChunk(self, n):
+        """
+        Lettura e decompressione di un chunk.
+
+        :param self
+        :param n: indice del chunk
+        return lista di record
+        """
+        pos, length, _ = self.chunks[n]
+        return marshal.loads(zlib.decompress(self.map[pos:pos + length]))
+
+
+    def iterRecords(self, workers=1):
+        """
+        Generatore dei record di tutte le pagine, nell'ordine in cui sono state scritte.
+        Con più thread, al più 2*workers chunk vengono decompressi in anticipo.
+
+        :param self
+        :param workers: thread usati per la decompressione
+        yield: record (id, titolo, testo, link, categorie, offset)
+        """
+        if workers <= 1:
+            for n in range(len(self.chunks)):
+                yield from self.readChunk(n)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            for n in range(len(self.chunks)):
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(self.readChunk, n))
+            while pending:
+                yield from pending.popleft().result()
+
+
+    def close(self):
+        self.map.close()
+        self.fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def readStore(path_store, fn, *args_fn, workers=1, stats=None, **kwargs_fn):
+    """
+    Lettura delle pagine filtrate dal file, chiamando la funzione per ogni pagina con gli stessi
+    argomenti passati da 'saxReader.readXML'.
+
+    :param path_store: path del file
+    :param fn: la funzione da eseguire per ogni pagina
+    :param args_fn: argomenti da passare alla funzione
+    :param workers: thread usati per la decompressione
+    :param stats: BuildStats dove registrare il tempo di lettura (fase 'store')
+    :param kwargs_fn: argomenti da passare alla funzione
+    """
+    with ParsedStoreReader(path_store) as reader:
+        records = reader.iterRecords(workers)
+        if stats is not None:
+            records = stats.timedIter('store', records)
+
+        for record in records:
+            fn(*args_fn, **kwargs_fn, **dict(zip(FIELDS, record)))
+
+
+def teeStore(store_writer, fn):
+    """
+    Ritorna una funzione che salva la pagina nel file e poi chiama 'fn'.
+
+    :param store_writer: ParsedStoreWriter
+    :param fn: funzione da chiamare per ogni pagina
+    return funzione con la stessa firma di 'fn'
+    """
+    def storeAndCall(*args_fn, **data_parsed):
+        store_writer.add(**data_parsed)
+        fn(*args_fn, **data_parsed)
+
+    return storeAndCall
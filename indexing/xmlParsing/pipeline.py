@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline parallela per il filtraggio delle pagine lette dal dump.
+
+Il parsing SAX avviene nel processo principale, il filtraggio del testo (FilterWikiText.startFilter)
+viene eseguito da un pool di processi e i risultati vengono consegnati, nello stesso ordine di
+lettura, alla funzione che li usa (scrittura nell'indice e nel grafo).
+
+    SAX --> [pagine in attesa (max queue_depth)] --> pool di processi --> fn (in ordine)
+
+Le pagine vengono inviate ai processi a blocchi di 'batch_size' per ridurre il costo di
+comunicazione tra processi. Quando le pagine in attesa raggiungono 'queue_depth', il parser si
+ferma finché il blocco più vecchio non è stato filtrato e consegnato: in questo modo la memoria
+usata resta limitata anche se la scrittura dell'indice è più lenta della lettura.
+"""
+
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+from . import filterText
+
+
+# Istanza di FilterWikiText del processo worker, creata una sola volta per processo
+worker_filter = None
+
+
+def initWorker(path_interwiki_links, filter_kwargs):
+    """
+    Inizializzazione di un processo worker.
+
+    :param path_interwiki_links: path del file dei prefissi interwiki
+    :param filter_kwargs: argomenti per FilterWikiText (cleaner, clean_budget)
+    """
+    global worker_filter
+    worker_filter = filterText.FilterWikiText(path_interwiki_links, **filter_kwargs)
+
+
+def filterBatch(batch):
+    """
+    Filtraggio di un blocco di pagine nel processo worker.
+
+    :param batch: lista di tuple (title, id_page, text, offset)
+    return (lista di dict, uno per pagina, nello stesso ordine del blocco; 
+            tempi delle fasi di filtraggio del blocco)
+    """
+    res = [worker_filter.filterPage(*page) for page in batch]
+
+    timings, worker_filter.timings = worker_filter.timings, {}
+    return res, timings
+
+
+class FilterPipeline:
+    """
+    Pool di processi che filtra le pagine e consegna i risultati in ordine.
+    Va usata come context manager in modo che alla fine del parsing vengano consegnate
+    anche le ultime pagine in attesa.
+    """
+
+    def __init__(self, path_interwiki_links, workers, queue_depth, fn, *args_fn, batch_size=16, 
+                 filter_kwargs=None, **kwargs_fn):
+        """
+        Inizializzazione della pipeline.
+
+        :param self
+        :param path_interwiki_links: path del file dei prefissi interwiki
+        :param workers: numero di processi che eseguono il filtraggio
+        :param queue_depth: numero massimo di pagine lette ma non ancora consegnate
+        :param fn: la funzione da eseguire per ogni pagina filtrata
+        :param args_fn: argomenti da passare alla funzione
+        :param batch_size: numero di pagine inviate insieme ad un processo
+        :param filter_kwargs: argomenti per FilterWikiText (cleaner, clean_budget)
+        :param kwargs_fn: argomenti da passare alla funzione
+        """
+        self.fn = fn
+        self.args_fn = args_fn
+        self.kwargs_fn = kwargs_fn
+
+        self.batch_size = max(1, min(batch_size, queue_depth))
+        self.max_pending = max(1, queue_depth // self.batch_size)
+
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            initializer=initWorker,
+                                            initargs=(path_interwiki_links, filter_kwargs or {}))
+        self.batch = []
+        self.pending = collections.deque()
+
+        # Tempi cumulativi delle fasi di filtraggio eseguite dai worker: fase -> [secondi, chiamate]
+        self.timings = {}
+
+
+    def submit(self, title, id_page, text, offset=None):
+        """
+        Aggiunta di una pagina da filtrare.
+        Blocca il chiamante se ci sono già troppe pagine in attesa (backpressure).
+
+        :param self
+        :param title: titolo della pagina
+        :param id_page: id della pagina
+        :param text: testo non filtrato della pagina
+        :param offset: posizione della pagina nel dump
+        """
+        self.batch.append((title, id_page, text, offset))
+        if len(self.batch) >= self.batch_size:
+            self.__flushBatch()
+
+
+    def queueDepth(self):
+        """
+        :param self
+        return numero di pagine lette ma non ancora consegnate
+        """
+        return len(self.pending) * self.batch_size + len(self.batch)
+
+
+    def __flushBatch(self):
+        """
+        Invio del blocco corrente al pool, dopo aver consegnato il blocco più vecchio se la coda
+        è piena.
+
+        :param self
+        """
+        while len(self.pending) >= self.max_pending:
+            self.__emitOldest()
+
+        self.pending.append(self.executor.submit(filterBatch, self.batch))
+        self.batch = []
+
+
+    def __emitOldest(self):
+        """
+        Attesa del blocco più vecchio e consegna delle sue pagine alla funzione.
+
+        :param self
+        """
+        results, timings = self.pending.popleft().result()
+
+        for name, (seconds, calls) in timings.items():
+            timing = self.timings.setdefault(name, [0.0, 0])
+            timing[0] += seconds
+            timing[1] += calls
+
+        for res in results:
+            self.fn(*self.args_fn, **self.kwargs_fn, **res)
+
+
+    def close(self):
+        """
+        Consegna di tutte le pagine rimaste e chiusura del pool.
+
+        :param self
+        """
+        if self.batch:
+            self.__flushBatch()
+        while self.pending:
+            self.__emitOldest()
+        self.executor.shutdown()
+
+
+    def cancel(self):
+        """
+        Annullamento delle pagine in attesa e chiusura del pool, usato in caso di errore.
+
+        :param self
+        """
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.batch = []
+        self.executor.shutdown()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.cancel()
+        return False
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classificazione dei prefissi dei link ('en:', 'User talk:', 'Category:', ..) con un'unica ricerca
+in un dict.
+
+I prefissi vengono letti da uno snapshot json versionato, distribuito con il progetto
+(files/prefixes.json), in modo che la build non abbia bisogno della rete:
+
+    {"version": 1,
+     "generated": "2020-10-27",
+     "interwiki": ["aa", "ab", ...],                 # prefissi interwiki (API siteinfo/interwikimap)
+     "namespaces": ["Media", "Special", "Talk", ...], # namespace non validi (NS_NOT_VALID) e alias
+     "category": ["Category"]}                       # namespace delle categorie
+
+Lo snapshot si rigenera con:  python -m indexing.xmlParsing.prefixes --interwiki files/interwiki.prefix
+"""
+
+import argparse
+import datetime
+import json
+import re
+
+
+SNAPSHOT_VERSION = 1
+
+INTERWIKI = 'interwiki'
+NAMESPACE = 'namespace'
+CATEGORY = 'category'
+ARTICLE = 'article'
+
+# Prefissi non validi che non sono né namespace né interwiki del file dell'API:
+# 'Image' è il vecchio nome del namespace File, 'Manual' e 'Extension' sono namespace di mediawiki.org
+# e 'Wiktionary' manca nella lista degli interwiki.
+EXTRA_NAMESPACES = ['Image', 'Manual', 'Extension']
+EXTRA_INTERWIKI = ['wiktionary']
+
+SPACES = re.compile(r'[\s_]+')
+
+
+def normalize(prefix):
+    """
+    Normalizzazione del prefisso: namespace e interwiki non distinguono maiuscole e minuscole, e
+    '_' equivale a uno spazio ('User_talk' == 'user talk').
+
+    :param prefix: prefisso (senza ':')
+    return prefisso normalizzato
+    """
+    return SPACES.sub(' ', prefix).strip().lower()
+
+
+class PrefixClassifier:
+    """
+    Classificazione di un prefisso in INTERWIKI, NAMESPACE (non valido), CATEGORY o ARTICLE
+    (prefisso non riconosciuto, quindi ':' fa parte del titolo).
+    """
+
+    def __init__(self, interwiki, namespaces, category):
+        """
+        Creazione della tabella prefisso normalizzato -> tipo.
+        A parità di prefisso la categoria ha precedenza sul namespace, e il namespace sull'interwiki.
+
+        :param self
+        :param interwiki: iterabile di prefissi interwiki
+        :param namespaces: iterabile di namespace non validi
+        :param category: iterabile di namespace delle categorie
+        """
+        self.table = {}
+        for kind, prefixes in ((INTERWIKI, interwiki), (NAMESPACE, namespaces), (CATEGORY, category)):
+            for prefix in prefixes:
+                self.table[normalize(prefix)] = kind
+
+
+    @classmethod
+    def load(cls, path_prefixes):
+        """
+        Caricamento dei prefissi.
+        Se il file è uno snapshot json viene letto direttamente, altrimenti viene considerato il
+        vecchio file pickle degli interwiki (vedi interwikiLink.getPrefixSet) e i namespace vengono
+        presi da NS_NOT_VALID.
+
+        :param path_prefixes: path dello snapshot json (o del file pickle)
+        return PrefixClassifier
+        """
+        if not path_prefixes.endswith('.json'):
+            # import qui: saxReader importa filterText, che importa questo modulo, e interwikiLink
+            # richiede 'requests', che non serve per leggere lo snapshot json
+            from . import interwikiLink, saxReader
+            return cls(list(interwikiLink.getPrefixSet(path_prefixes)) + EXTRA_INTERWIKI,
+                       list(saxReader.NS_NOT_VALID.values()) + EXTRA_NAMESPACES,
+                       [saxReader.NS_NOT_VALID['14']])
+
+        with open(path_prefixes, 'r', encoding='utf-8') as fp:
+            snapshot = json.load(fp)
+
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Versione dello snapshot dei prefissi non supportata: '+str(snapshot.get('version')))
+
+        return cls(snapshot['interwiki'], snapshot['namespaces'], snapshot['category'])
+
+
+    def classify(self, prefix):
+        """
+        :param self
+        :param prefix: prefisso del link (senza ':')
+        return INTERWIKI, NAMESPACE, CATEGORY o ARTICLE
+        """
+        kind = self.table.get(prefix)
+        if kind is None:
+            kind = self.table.get(normalize(prefix), ARTICLE)
+        return kind
+
+
+    def isValid(self, prefix):
+        """
+        :param self
+        :param prefix: prefisso del link (senza ':')
+        return True se il link con questo prefisso è un articolo
+        """
+        return self.classify(prefix) == ARTICLE
+
+
+def writeSnapshot(path_snapshot, path_interwiki_links):
+    """
+    Creazione dello snapshot json a partire dal file pickle degli interwiki (che viene scaricato
+    dall'API di mediawiki se non esiste) e da NS_NOT_VALID.
+
+    :param path_snapshot: path dello snapshot da scrivere
+    :param path_interwiki_links: path del file pickle degli interwiki
+    """
+    from . import interwikiLink, saxReader
+    snapshot = {'version': SNAPSHOT_VERSION,
+                'generated': datetime.date.today().isoformat(),
+                'interwiki': sorted(set(interwikiLink.getPrefixSet(path_interwiki_links)) | set(EXTRA_INTERWIKI)),
+                'namespaces': list(saxReader.NS_NOT_VALID.values()) + EXTRA_NAMESPACES,
+                'category': [saxReader.NS_NOT_VALID['14']],
+                }
+
+    with open(path_snapshot, 'w', encoding='utf-8') as fp:
+        json.dump(snapshot, fp, indent=1)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Creazione dello snapshot dei prefissi dei link.')
+    p.add_argument(
+        '--interwiki',
+        type=str,
+        default='files/interwiki.prefix',
+        help='File pickle degli interwiki (se non esiste viene scaricato).')
+    p.add_argument(
+        '--dest',
+        type=str,
+        default='files/prefixes.json',
+        help='Snapshot json da scrivere.')
+
+    args = p.parse_args()
+    writeSnapshot(args.dest, args.interwiki)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabella dei redirect: titolo della pagina di redirect -> titolo della pagina di destinazione.
+
+Le pagine '#REDIRECT' vengono scartate durante il parsing (vedi saxReader.BaseContentHandler), ma
+prima di scartarle la coppia (sorgente, destinazione) viene scritta su file, così i link che puntano
+al titolo di un redirect possono diventare archi del grafo (vedi WikiGraph.computeEdges) senza
+una seconda lettura del dump.
+
+Il file è di testo, una coppia per riga separata da tab (i titoli non possono contenere tab
+o a capo):
+
+    Sorgente\tDestinazione\n
+
+Al caricamento le catene di redirect (A -> B -> C) vengono appiattite (A -> C) e i cicli scartati,
+quindi ogni risoluzione è una sola ricerca in un dict.
+"""
+
+import os
+
+
+# Numero massimo di redirect consecutivi seguiti durante l'appiattimento
+MAX_HOPS = 8
+
+
+class RedirectWriter:
+    """
+    Scrittura in streaming delle coppie (sorgente, destinazione) dei redirect.
+    """
+
+    def __init__(self, path_redirects, append=False):
+        """
+        :param self
+        :param path_redirects: path del file dei redirect
+        :param append: se True le coppie vengono aggiunte al file esistente (ripresa di una build)
+        """
+        self.path = path_redirects
+        self.count = 0
+
+        # Se l'ultima riga di una build interrotta è incompleta, la nuova riga non deve unirsi a lei
+        partial = append and os.path.exists(path_redirects) and not self.__endsWithNewline(path_redirects)
+
+        self.__fp = open(path_redirects, 'a' if append else 'w', encoding='utf-8', newline='\n')
+        if partial:
+            self.__fp.write('\n')
+
+
+    @staticmethod
+    def __endsWithNewline(path_redirects):
+        """
+        :param path_redirects: path del file dei redirect
+        return True se il file è vuoto o termina con un a capo
+        """
+        with open(path_redirects, 'rb') as fp:
+            fp.seek(0, os.SEEK_END)
+            if fp.tell() == 0:
+                return True
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) == b'\n'
+
+
+    def add(self, source, target):
+        """
+        :param self
+        :param source: titolo della pagina di redirect
+        :param target: titolo della pagina di destinazione
+        """
+        self.__fp.write(source + '\t' + target + '\n')
+        self.count += 1
+
+
+    def addFrom(self, path_redirects):
+        """
+        Aggiunta di tutte le coppie di un altro file dei redirect (es: quello di uno shard).
+
+        :param self
+        :param path_redirects: path del file da copiare
+        """
+        for source, target in iterRedirects(path_redirects):
+            self.add(source, target)
+
+
+    def close(self):
+        """
+        :param self
+        """
+        self.__fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iterRedirects(path_redirects):
+    """
+    Generatore delle coppie del file dei redirect.
+    Le righe malformate (es: ultima riga di una build interrotta) vengono saltate.
+
+    :param path_redirects: path del file dei redirect
+    yield: (sorgente, destinazione)
+    """
+    with open(path_redirects, 'r', encoding='utf-8', newline='\n') as fp:
+        for line in fp:
+            source, sep, target = line.rstrip('\n').partition('\t')
+            if sep and source and target:
+                yield source, target
+
+
+class RedirectTable:
+    """
+    Risoluzione dei titoli attraverso i redirect, con le catene già appiattite.
+    """
+
+    def __init__(self, pairs=()):
+        """
+        :param self
+        :param pairs: iterabile di (sorgente, destinazione)
+        """
+        self.table = dict(pairs)
+        self.flatten()
+
+
+    @classmethod
+    def load(cls, path_redirects):
+        """
+        :param path_redirects: path del file dei redirect
+        return RedirectTable
+        """
+        return cls(iterRedirects(path_redirects))
+
+
+    def flatten(self):
+        """
+        Ogni sorgente viene associata alla destinazione finale della sua catena di redirect.
+        Le catene più lunghe di MAX_HOPS e i cicli (A -> B -> A) vengono scartati, come fa
+        MediaWiki che non segue i redirect doppi.
+
+        :param self
+        """
+        table = self.table
+        flat = {}
+        for source, target in table.items():
+            hops = 0
+            while target in table and hops < MAX_HOPS and target != source:
+                if target in flat:
+                    target = flat[target]
+                    break
+                target = table[target]
+                hops += 1
+
+            if target not in table:
+                flat[source] = target
+
+        self.table = flat
+
+
+    def resolve(self, title):
+        """
+        :param self
+        :param title: titolo (anche di una pagina normale)
+        return titolo della pagina di destinazione, o 'title' se non è un redirect
+        """
+        return self.table.get(title, title)
+
+
+    def __len__(self):
+        return len(self.table)
@@ -5,17 +5,12 @@ Created on Sun Sep 13 14:13:56 2020
 
 @author: gabrielesavoia
 """
+import re
 import xml
 from xml.sax import ContentHandler
-from xml.sax.xmlreader import Locator
 
-from xml.sax.expatreader import ExpatParser
-
-from . import filterText
-
-import sys
-
-import os
+from . import filterText, pipeline
+from .dumpStream import openCorpus
 
 # https://en.wikipedia.org/wiki/Wikipedia:Namespace
 
@@ -55,117 +50,233 @@ NS_NOT_VALID = {'-2': 'Media',
                 }
 
 
+class WikiPage:
+    """
+    Pagina letta dal dump.
+    Uso '__slots__' per non allocare un dict per ogni pagina.
+    """
+    __slots__ = ('id', 'ns', 'title', 'text', 'redirect', 'offset')
+
+    def __init__(self, id_page, ns, title, text, redirect, offset=None):
+        """
+        :param self
+        :param id_page: id della pagina
+        :param ns: namespace della pagina
+        :param title: titolo della pagina
+        :param text: testo (non filtrato) della pagina
+        :param redirect: True se la pagina è un redirect
+        :param offset: posizione in byte dell'inizio della pagina nel dump decompresso
+        """
+        self.id = id_page
+        self.ns = ns
+        self.title = title
+        self.text = text
+        self.redirect = redirect
+        self.offset = offset
+
+
+    def isValid(self):
+        """
+        Controlla che la pagina sia da considerare.
+        Non è valida se il namespace ha uno dei valori in NS_NOT_VALID oppure se è un redirect.
+
+        :param self
+        return True se la pagina è valida, False altrimenti
+        """
+        return self.ns not in NS_NOT_VALID and not self.redirect
+
+
 class BaseContentHandler(ContentHandler):
     """
-    Sottoclasse di xml.sax.ContentHandler
+    Sottoclasse di xml.sax.ContentHandler.
+
+    Raccoglie le pagine lette in 'self.pages' come istanze di WikiPage.
+    Il contenuto degli elementi viene accumulato in liste di blocchi, che vengono unite una 
+    sola volta alla chiusura della pagina: concatenare le stringhe ad ogni chiamata di 
+    'characters' ha costo quadratico sulle pagine lunghe.
+
+    Se 'valid_only' è True, la pagina viene scartata non appena si sa che non è valida 
+    (namespace in NS_NOT_VALID, testo che inizia con '#REDIRECT', titolo rifiutato da 
+    'title_filter'): da quel momento fino alla pagina successiva il contenuto non viene 
+    più accumulato. Più di metà di un dump reale è composto da pagine di questo tipo.
+
+    Se è definita 'redirect_fn', prima di scartare un redirect viene chiamata con il titolo della 
+    pagina e quello della destinazione (vedi redirects.py). La destinazione è l'attributo 'title' 
+    dell'elemento <redirect/> del dump, oppure, se manca, il primo link del testo.
     """
+
+    fields = ('title', 'ns', 'id', 'text')
+
+    redirect_prefix = '#REDIRECT'
+    redirect_link = re.compile(r'\[\[([^\]|#]+)')
     
-    def __init__(self, fn, *args_fn, **kwargs_fn):
+    def __init__(self, valid_only=False, title_filter=None, redirect_fn=None):
         """
         Inizializzazione variabili di instanza.
+
+        :param self
+        :param valid_only: se True scarta le pagine non valide durante il parsing
+        :param title_filter: funzione che dato il titolo ritorna False se la pagina è da scartare
+        :param redirect_fn: funzione (titolo, destinazione) chiamata per ogni redirect scartato 
+                            (solo se 'valid_only' è True)
         """
-        self.fn = fn
-        self.args_fn = args_fn
-        self.kwargs_fn = kwargs_fn
-        
-        self.current_tag = ''
         self.block_tag = 'page'
-        
-        self.title = ''
-        self.id_page = ''
-        self.text = ''
-        
-        self.valid_block = True
-        self.valid_id_page = True
+        self.pages = []
+
+        self.valid_only = valid_only
+        self.title_filter = title_filter
+        self.redirect_fn = redirect_fn
+
+        # Funzione che ritorna la posizione corrente nel file, impostata da 'iterPages'
+        self.position = None
+        self.offset = None
+
+        self.reset()
                             
 
     def startElement(self, tag, attributes):
         """
         Ogni volta che inizia un ELEMENTO (<TAG>) viene chiamata questa funzione.
+        Se l'elemento è uno di quelli che mi interessano, il suo contenuto verrà accumulato
+        nella lista corrispondente.
+        L'id della pagina è solo quello che precede la sezione 'revision', gli altri id si 
+        riferiscono alla revisione e al contributore.
         
         :param self
         :param tag: ovvero il nome dell'elemento es: ' <movie> </movie> ' -> tag è 'movie'
         :attributes: ovvero gli attributi riferiti ad un certo elemento.
                         E' un DICT in cui ci si accede passando il nome degli attributi.
         """
-        self.current_tag = tag
+        if tag == self.block_tag and self.position is not None:
+            self.offset = self.position()
 
-        if self.current_tag == 'revision':
-            self.valid_id_page = False
+        if self.rejected:
+            return
+
+        if tag == 'redirect':
+            self.redirect_target = attributes.get('title')
+
+        elif tag == 'revision':
+            self.in_revision = True
+
+        elif tag in self.chunks and not (tag == 'id' and self.in_revision):
+            self.buffer = self.chunks[tag]
         
        
     def characters(self, content):
         """
         Ogni volta che il contenuto di un ELEMENTO viene letto (<TAG> Nome film </TAG>) 
-        questa funzione viene chiamata.
-        In questo caso 'content' = 'Nome Film'.
-        Il content si riferisce al tag corrispondente a 'self.currentTag', ovvero
-        l'ULTIMO TAG aperto e non ancora chiuso.
+        questa funzione viene chiamata, anche più volte per lo stesso elemento.
         
-        : param self
+        :param self
         :param content: contenuto di un elemento.
         """ 
-        if self.valid_block:
-            
-            if self.current_tag == 'title':
-                self.title += content.strip()
-
-            elif self.current_tag == 'ns':
-                self.valid_block = self.__validNs(content)
-
-            elif self.current_tag == 'id':
-                if self.__validId():
-                    self.id_page += content
-                
-            elif self.current_tag == 'text':
-                self.valid_block = self.__validText(content)
-                if self.valid_block:
-                    self.text += content 
-
-                
-    def __validNs(self, ns):
+        if self.buffer is not None:
+            self.buffer.append(content)
+
+            if self.check_redirect and self.buffer is self.chunks['text']:
+                self.__checkRedirect(False)
+
+
+    def __checkRedirect(self, end_text):
         """
-        Controlla che il namespace sia valido.
-        Non è valido se ha uno dei valori qua scritti.
-        
+        Controllo se il testo inizia con '#REDIRECT', appena ho letto abbastanza caratteri
+        (o il testo è terminato).
+
         :param self
-        :param ns: numero del namespace        
+        :param end_text: True se l'elemento 'text' è terminato
         """
-        if ns in NS_NOT_VALID.keys():
-            return False
-        return True
-
-
-    def __validId(self):
+        start = ''.join(self.chunks['text'])
+        if len(start) >= len(self.redirect_prefix) or end_text:
+            self.check_redirect = False
+            if start.startswith(self.redirect_prefix):
+                if self.redirect_fn is None:
+                    self.reject()
+                elif self.redirect_target is not None:
+                    self.__emitRedirect()
+                else:
+                    # Destinazione da leggere dal testo: continuo ad accumularlo fino alla fine
+                    self.redirect_pending = True
+
+
+    def __emitRedirect(self):
         """
-        Controllo che l'id non si riferisca alla sezione di revision ma sia l'id della pagina.
+        Chiamata di 'redirect_fn' con titolo e destinazione del redirect corrente, che poi viene scartato.
 
-        :param self:
+        :param self
         """
-        return self.valid_id_page              
-                
-                
-    def __validText(self, text):
+        target = self.redirect_target
+        if target is None:
+            match = self.redirect_link.search(''.join(self.chunks['text']))
+            if match is not None:
+                target = match.group(1).replace('_', ' ').strip()
+                target = target[:1].upper() + target[1:]
+
+        if target:
+            self.redirect_fn(''.join(self.chunks['title']).strip(), target)
+        self.reject()
+
+
+    def reject(self):
         """
-        Controlla che il testo sia valido.
-        Non è valido se contiene un redirect
-        
+        Scarto della pagina corrente: libero quanto accumulato e non accumulo più niente fino
+        alla pagina successiva.
+
         :param self
-        :param text: testo da controllare
-        """        
-        if text.startswith('#REDIRECT'):
-            return False
-        return True                     
+        """
+        self.rejected = True
+        self.buffer = None
+        self.chunks = {field: [] for field in self.fields}
 
 
     def endElement(self, tag):
         """
-        Da implementare per ogni instanza.
+        Ogni volta che termina un ELEMENTO (</TAG>) viene chiamata questa funzione.
+        Alla chiusura della pagina creo la WikiPage.
         
         :param self
         :param tag : ovvero il nome dell'elemento es: ' <movie> </movie> ' -> tag è 'movie'
         """
-        raise NotImplementedError
+        self.buffer = None
+
+        if tag == self.block_tag:
+            if not self.rejected:
+                self.pages.append(self.makePage())
+            self.reset()
+
+        elif self.valid_only and not self.rejected:
+            if tag == 'ns':
+                if ''.join(self.chunks['ns']).strip() in NS_NOT_VALID:
+                    self.reject()
+
+            elif tag == 'title':
+                if self.title_filter is not None and \
+                   not self.title_filter(''.join(self.chunks['title']).strip()):
+                    self.reject()
+
+            elif tag == 'text':
+                if self.check_redirect:
+                    self.__checkRedirect(True)
+                if self.redirect_pending:
+                    self.__emitRedirect()
+
+
+    def makePage(self):
+        """
+        Creazione della WikiPage a partire dai blocchi letti.
+
+        :param self
+        return WikiPage
+        """
+        text = ''.join(self.chunks['text'])
+
+        return WikiPage(''.join(self.chunks['id']).strip(),
+                        ''.join(self.chunks['ns']).strip(),
+                        ''.join(self.chunks['title']).strip(),
+                        text,
+                        text.startswith('#REDIRECT'),
+                        self.offset)
+
 
     def reset(self):
         """
@@ -173,32 +284,111 @@ class BaseContentHandler(ContentHandler):
 
         :param self
         """
-        self.title = ''
-        self.id_page = ''
-        self.text = ''
+        self.chunks = {field: [] for field in self.fields}
+        self.buffer = None
+        self.in_revision = False
 
-        self.valid_block = True
-        self.valid_id_page = True
+        self.rejected = False
+        self.check_redirect = self.valid_only
+        self.redirect_target = None
+        self.redirect_pending = False
 
 
-class EndFilterDumpException(Exception):
+def skipTo(stream, offset, head=b''):
     """
-    Eccezione creata per terminare la lettura del xml usando il 'FilterDumpHandler'.
+    Avanzamento del file fino alla posizione 'offset'.
+    Se il file non permette la 'seek' (es: dump decompresso da un thread) i byte vengono letti
+    e scartati, senza essere parsati.
+
+    :param stream: file-like binario
+    :param offset: posizione da raggiungere
+    :param head: byte già letti dall'inizio del file
     """
-    pass
+    if stream.seekable():
+        stream.seek(offset)
+        return
+
+    offset -= len(head)
+    while offset > 0:
+        block = stream.read(min(offset, 1 << 20))
+        if not block:
+            break
+        offset -= len(block)
 
 
-class FilterDumpHandler(BaseContentHandler):
+def rootTag(head):
     """
-    Sottoclasse di xml.sax.ContentHandler
+    Nome del tag radice del documento xml.
+
+    :param head: primi byte del file
+    return nome del tag radice (bytes)
+    """
+    match = re.search(rb'<([^?!\s/>]+)', head)
+    if match is None:
+        raise ValueError('Tag radice non trovato all\'inizio del file')
+    return match.group(1)
+
+
+def iterPages(source, valid_only=False, title_filter=None, bufsize=1 << 16, start_offset=0, redirect_fn=None):
+    """
+    Generatore delle pagine del dump.
+    Il parser SAX viene alimentato a blocchi ('feed'), e dopo ogni blocco vengono restituite 
+    le pagine completate. A differenza dei ContentHandler, il chiamante può quindi comporre 
+    più fasi in streaming (filtraggio, campionamento, divisione..) con semplici cicli, e 
+    fermare la lettura in qualsiasi momento.
+
+    :param source: path del file xml (anche compresso .bz2, .gz, .zst) oppure file-like binario
+    :param valid_only: se True le pagine non valide vengono scartate già durante il parsing
+    :param title_filter: funzione che dato il titolo ritorna False se la pagina è da scartare
+    :param bufsize: byte letti per ogni blocco
+    :param start_offset: se > 0, la lettura parte da questa posizione, che deve essere l'inizio 
+                         di una pagina (WikiPage.offset)
+    :param redirect_fn: funzione (titolo, destinazione) chiamata per ogni redirect scartato (vedi 
+                        BaseContentHandler)
+    yield: WikiPage, anche quelle non valide (vedi WikiPage.isValid) se 'valid_only' è False
+    """
+    if isinstance(source, str):
+        with openCorpus(source) as stream:
+            yield from iterPages(stream, valid_only, title_filter, bufsize, start_offset, redirect_fn)
+        return
+
+    handler = BaseContentHandler(valid_only, title_filter, redirect_fn)
+
+    parser = xml.sax.make_parser() 
+    parser.setFeature(xml.sax.handler.feature_namespaces, 0) 
+    parser.setContentHandler(handler) 
+
+    base = 0
+    if start_offset > 0:
+        # Riparto da metà file: riapro il tag radice del dump, tenendone conto nelle posizioni
+        head = source.read(min(start_offset, bufsize))
+        root = b'<' + rootTag(head) + b'>'
+        skipTo(source, start_offset, head)
+        parser.feed(root)
+        base = start_offset - len(root)
+
+    handler.position = lambda: base + parser._parser.CurrentByteIndex
+
+    for block in iter(lambda: source.read(bufsize), b''):
+        parser.feed(block)
+        if handler.pages:
+            pages, handler.pages = handler.pages, []
+            yield from pages
+    parser.close()
+
+    yield from handler.pages
+
+
+class PageSelector:
+    """
+    Selezione delle pagine per creare il file xml filtrato: vengono selezionate le pagine
+    con titolo in 'titles_to_select' più 'total_docs_noise' pagine di rumore.
     """
     
-    def __init__(self, total_docs_noise, titles_to_select, fn, *args_fn, **kwargs_fn):
+    def __init__(self, total_docs_noise, titles_to_select):
         """
         Inizializzazione variabili di instanza.
         """
-        super().__init__(fn, *args_fn, **kwargs_fn)
-
         self.total_docs_noise = total_docs_noise
         self.curr_docs_noise = 0
 
@@ -206,20 +396,34 @@ class FilterDumpHandler(BaseContentHandler):
         self.curr_selected = 0
 
 
-    def checkAndSelect(self):
+    def isSelectable(self, title):
+        """
+        Controllo, a partire dal solo titolo, se la pagina può ancora essere selezionata.
+        Viene usato durante il parsing per scartare subito le pagine che sicuramente non
+        verranno selezionate.
+
+        :param self
+        :param title: titolo della pagina
+        return True se la pagina può essere selezionata, False altrimenti
+        """
+        return title in self.titles_to_select or self.curr_docs_noise < self.total_docs_noise
+
+
+    def checkAndSelect(self, page):
         """
         Controllo se la pagina è selezionabile e in caso affermativo la seleziono, se no 
         ritorno False
 
         :param self
+        :param page: WikiPage valida
         return dict con i valori della pagina se è selezionabile, False atrimenti
         """
-        res = {'title': self.title,
-               'id': self.id_page,
-               'text': self.text,
+        res = {'title': page.title,
+               'id': page.id,
+               'text': page.text,
               }
 
-        if self.title in self.titles_to_select:
+        if page.title in self.titles_to_select:
             self.curr_selected += 1
             return res
 
@@ -240,104 +444,75 @@ class FilterDumpHandler(BaseContentHandler):
         """
         return (self.curr_selected == len(self.titles_to_select)) and \
                (self.curr_docs_noise == self.total_docs_noise)
-                
-
-    def endElement(self, tag):
-        """
-        Ogni volta che termina un ELEMENTO (</TAG>) viene chiamata questa funzione.
-        Aggiungo un documento all'indice nel caso in cui il tag chiuso sia una
-        pagina, ovvero ho letto tutte le informazioni di una pagina e le voglio
-        indicizzare.
-        In questo caso svolgo anche il filtraggio del testo dell'xml ricavando gli elementi che 
-        mi servono.
-        
-        :param self
-        :param tag : ovvero il nome dell'elemento es: ' <movie> </movie> ' -> tag è 'movie'
-        """
-        if tag == self.block_tag: 
-            if self.valid_block:
-                res = self.checkAndSelect()
-
-                if res:
-                    self.fn(*self.args_fn, **self.kwargs_fn, **res)
-
-            if self.noMoreSelectable():
-                raise EndFilterDumpException
-
-            self.reset()  
-
-
-class WikiDumpHandler(BaseContentHandler):
-    """
-    Sottoclasse di xml.sax.ContentHandler
-    """
-    
-    def __init__(self, path_interwiki_links, fn, *args_fn, **kwargs_fn):
-        """
-        Inizializzazione variabili di instanza.
-        """
-        super().__init__(fn, *args_fn, **kwargs_fn)
-
-        self.filter = filterText.FilterWikiText(path_interwiki_links)
-
-
-    def endElement(self, tag):
-        """
-        Ogni volta che termina un ELEMENTO (</TAG>) viene chiamata questa funzione.
-        Aggiungo un documento all'indice nel caso in cui il tag chiuso sia una
-        pagina, ovvero ho letto tutte le informazioni di una pagina e le voglio
-        indicizzare.
-        In questo caso svolgo anche il filtraggio del testo dell'xml ricavando gli elementi che 
-        mi servono.
-        
-        :param self
-        :param tag : ovvero il nome dell'elemento es: ' <movie> </movie> ' -> tag è 'movie'
-        """
-        if tag == self.block_tag: 
-            if self.valid_block:
-
-                filtered = self.filter.startFilter(self.text, self.title)
-        
-                res ={'title': self.title,
-                      'id': self.id_page.strip(),
-                      'text': filtered['text'],
-                      'internal_link': filtered['links'],
-                      }
-
-                # Usa il risultato
-                self.fn(*self.args_fn, **self.kwargs_fn, **res)
-
-            self.reset() 
-
-
-def startParse(path_file, handler):  
-    parser = xml.sax.make_parser() 
-    parser.setFeature(xml.sax.handler.feature_namespaces, 0) 
-
-    parser.setContentHandler(handler) 
-    parser.parse(path_file)        
         
             
-def readXML(args_paths, fn, *args_fn, **kwargs_fn):
+def readXML(args_paths, fn, *args_fn, start_offset=0, skip_id=None, stats=None, redirect_fn=None, **kwargs_fn):
     """
-    Definisco il parser, instanzio il mio ContentHandler e poi eseguo il vero e proprio parsing.
+    Lettura delle pagine valide del dump, filtraggio del loro testo e chiamata della funzione
+    per ogni pagina filtrata.
     
-    :param path_file: il path relativo per il file xml.
+    :param args_paths: paths, 'args_paths.corpus' è il file xml (anche compresso .bz2, .gz, .zst)
     :param fn: la funzione da eseguire quando il parser ha riconosciuto 
                 una certo blocco che mi interessa
     :param args_fn: argomenti da passare alla funzione
+    :param start_offset: posizione del dump da cui iniziare la lettura (ripresa di una build)
+    :param skip_id: se la prima pagina letta ha questo id viene saltata (già indicizzata)
+    :param stats: BuildStats dove registrare i tempi di parsing e filtraggio
+    :param redirect_fn: funzione (titolo, destinazione) chiamata per ogni redirect (vedi redirects.py)
     :param kwargs_fn: argomenti da passare alla funzione
+
+    Se 'args_paths.workers' è maggiore di 1, il filtraggio del testo viene eseguito in parallelo
+    da una FilterPipeline con al più 'args_paths.queue_depth' pagine in attesa; le pagine
+    vengono comunque passate a 'fn' nell'ordine in cui sono lette.
     """
-    handler = WikiDumpHandler(args_paths.interwiki_links, fn, *args_fn, **kwargs_fn)
+    workers = getattr(args_paths, 'workers', 1)
+    pages = iterPages(args_paths.corpus, valid_only=True, start_offset=start_offset, redirect_fn=redirect_fn)
+    if skip_id is not None:
+        pages = skipFirst(pages, skip_id)
+    if stats is not None:
+        pages = stats.timedIter('parse', pages)
+
+    if workers > 1:
+        queue_depth = getattr(args_paths, 'queue_depth', 256)
+        with pipeline.FilterPipeline(args_paths.interwiki_links, workers, queue_depth,
+                                     fn, *args_fn, filter_kwargs=filterText.filterOptions(args_paths),
+                                     **kwargs_fn) as pipe:
+            if stats is not None:
+                stats.track(pipe)
+                stats.gauge('filter', pipe.queueDepth)
+            for page in pages:
+                pipe.submit(page.title, page.id, page.text, page.offset)
+    else:
+        wiki_filter = filterText.FilterWikiText(args_paths.interwiki_links, **filterText.filterOptions(args_paths))
+        if stats is not None:
+            stats.track(wiki_filter)
+
+        for page in pages:
+            fn(*args_fn, **kwargs_fn, **wiki_filter.filterPage(page.title, page.id, page.text, page.offset))
+
+
+def skipFirst(pages, id_page):
+    """
+    Generatore che salta la prima pagina se ha l'id indicato.
 
-    startParse(args_paths.corpus, handler)
+    :param pages: iterabile di WikiPage
+    :param id_page: id della pagina da saltare
+    yield: WikiPage
+    """
+    pages = iter(pages)
+    for page in pages:
+        if page.id != id_page:
+            yield page
+        break
+    yield from pages
 
 
 def filterXML(path_file, total_docs_noise, titles_to_select, fn, *args_fn, **kwargs_fn):
     """
-    Definisco il parser, instanzio il mio ContentHandler e poi eseguo il vero e proprio parsing.
+    Lettura del dump fino a quando non ho selezionato tutte le pagine richieste, chiamando la 
+    funzione per ogni pagina selezionata.
     
-    :param path_file: il path relativo per il file xml
+    :param path_file: il path relativo per il file xml (anche compresso .bz2, .gz, .zst)
     :param total_docs_noise: num totale di doc di rumore
     :param titles_to_select: iterabile di titoli da filtrare
     :param fn: la funzione da eseguire quando il parser ha riconosciuto 
@@ -345,10 +520,13 @@ def filterXML(path_file, total_docs_noise, titles_to_select, fn, *args_fn, **kwa
     :param args_fn: argomenti da passare alla funzione
     :param kwargs_fn: argomenti da passare alla funzione
     """
-    handler = FilterDumpHandler(total_docs_noise, titles_to_select,
-                                fn, *args_fn, **kwargs_fn)
+    selector = PageSelector(total_docs_noise, titles_to_select)
+
+    for page in iterPages(path_file, valid_only=True, title_filter=selector.isSelectable):
+        res = selector.checkAndSelect(page)
+
+        if res:
+            fn(*args_fn, **kwargs_fn, **res)
 
-    try:    
-        startParse(path_file, handler)
-    except EndFilterDumpException:
-        pass
+        if selector.noMoreSelectable():
+            break
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scrittura in streaming di un file xml di pagine, con la stessa struttura prodotta in precedenza
+da dicttoxml + minidom.toprettyxml():
+
+    <wikimedia>
+    <page>
+    	<title>...</title>
+    	<id>...</id>
+    	<text>...</text>
+    </page>
+    </wikimedia>
+
+Ogni pagina viene formattata direttamente come stringa (con l'escape dei caratteri speciali),
+senza costruire il DOM, e il file viene scritto con un buffer grande.
+"""
+
+from xml.sax.saxutils import escape
+
+
+# Stesso escape di minidom per il contenuto testuale
+ENTITIES = {'"': '&quot;'}
+
+
+def formatField(tag, value):
+    """
+    Formattazione di un campo della pagina.
+
+    :param tag: nome del tag
+    :param value: valore del campo
+    return stringa xml del campo
+    """
+    value = '' if value is None else str(value)
+    if not value:
+        return '\t<' + tag + '/>\n'
+    return '\t<' + tag + '>' + escape(value, ENTITIES) + '</' + tag + '>\n'
+
+
+def formatPage(**info_page):
+    """
+    Formattazione di una pagina, con i campi nell'ordine in cui sono passati.
+
+    :param info_page: campi della pagina (title, id, text)
+    return stringa xml della pagina
+    """
+    return '<page>\n' + ''.join(formatField(tag, value) for tag, value in info_page.items()) + '</page>\n'
+
+
+class PageWriter:
+    """
+    Scrittura di un file xml di pagine. Va usato come context manager.
+    """
+
+    def __init__(self, path_file, root='wikimedia', buffer_size=1 << 20):
+        """
+        Apertura del file e scrittura del tag radice.
+
+        :param self
+        :param path_file: path del file da scrivere
+        :param root: tag radice
+        :param buffer_size: dimensione del buffer di scrittura
+        """
+        self.root = root
+        self.file = open(path_file, 'wt', encoding='utf-8', buffering=buffer_size)
+        self.file.write('<' + root + '>\n')
+
+
+    def writePage(self, **info_page):
+        """
+        Scrittura di una pagina.
+
+        :param self
+        :param info_page: campi della pagina (title, id, text)
+        """
+        self.file.write(formatPage(**info_page))
+
+
+    def close(self):
+        """
+        Chiusura del tag radice e del file.
+
+        :param self
+        """
+        self.file.write('</' + self.root + '>')
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bigrammi del testo: BigramFilter / BigramAnalyzer_ (indexing/analysis) e riscrittura delle query
+di WikiSearcher con il campo dei bigrammi (frasi tra virgolette obbligatorie, query di più parole
+con score maggiore, nessuna riscrittura per una sola parola o senza il campo nello schema).
+
+Uso:  python -m unittest tests.test_bigrams
+"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from whoosh import index
+from whoosh.fields import Schema, ID, TEXT
+from whoosh.query import And, AndMaybe
+
+from indexing.analysis.analyzers import BigramAnalyzer_, BulkStemmingAnalyzer_, StandardAnalyzer_, StemmingAnalyzer_
+from indexing.analysis.filters import BigramFilter
+from indexing.searching import searcher
+from indexing.searching.searcher import WikiSearcher
+
+
+def texts(analyzer, text, **kwargs):
+    return [token.text for token in analyzer(text, **kwargs)]
+
+
+def pairs(text):
+    """
+    return bigrammi attesi: coppie di termini adiacenti di StemmingAnalyzer_ (stopword escluse)
+    """
+    words = texts(StemmingAnalyzer_(), text)
+    return [first+' '+second for first, second in zip(words, words[1:])]
+
+
+class BigramFilterTest(unittest.TestCase):
+
+    def test_bigrams(self):
+        for text in ['the Roman Empire', 'running dogs ran home', 'The Roman Empire and the Roman Republic']:
+            with self.subTest(text=text):
+                self.assertEqual(texts(BigramAnalyzer_(), text), pairs(text))
+                self.assertEqual(texts(BigramAnalyzer_(), text, mode='query'), pairs(text))
+
+    def test_stemmed(self):
+        self.assertEqual(texts(BigramAnalyzer_(), 'Roman Empires'), texts(BigramAnalyzer_(), 'roman empire'))
+
+    def test_stopwords(self):
+        # la stopword non interrompe la coppia: 'capital of italy' -> 'capit itali'
+        self.assertEqual(texts(BigramAnalyzer_(), 'capital of Italy'), pairs('capital Italy'))
+        # con le stopword non rimosse dall'analizzatore vengono saltate dal filtro
+        unremoved = BigramFilter()(StemmingAnalyzer_()('capital of Italy', removestops=False))
+        self.assertEqual([token.text for token in unremoved], pairs('capital Italy'))
+        # senza stoplist la stopword fa parte dei bigrammi
+        self.assertEqual(len(texts(BigramAnalyzer_(stoplist=None), 'capital of Italy')), 2)
+
+    def test_short_text(self):
+        for text in ['', '   ', 'Empire', 'the Empire', 'of the']:
+            with self.subTest(text=text):
+                self.assertEqual(texts(BigramAnalyzer_(), text), [])
+
+    def test_separator(self):
+        self.assertEqual(texts(StemmingAnalyzer_() | BigramFilter(sep='_'), 'roman empire'),
+                         [pairs('roman empire')[0].replace(' ', '_')])
+
+
+class BigramQueryTest(unittest.TestCase):
+
+    DOCS = [('1', 'Roman Empire', 'the empire of rome ruled many provinces'),
+            ('2', 'Holy Empire', 'an empire that claimed to be roman and holy'),
+            ('3', 'History of Rome', 'the roman empire followed the roman republic'),
+            ]
+    SETTINGS = {'exp': False, 'page_rank': False}
+
+    def setUp(self):
+        patcher = mock.patch.object(searcher, 'Expander')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dirs = []
+
+    def tearDown(self):
+        for path_dir in self.dirs:
+            shutil.rmtree(path_dir)
+
+    def open(self, bigrams=True):
+        fields = {'id_page': ID(stored=True, unique=True),
+                  'title': TEXT(analyzer=StandardAnalyzer_(), stored=True),
+                  'text': TEXT(analyzer=BulkStemmingAnalyzer_(), stored=True, phrase=False)}
+        if bigrams:
+            fields[WikiSearcher.bigram_field] = TEXT(analyzer=BigramAnalyzer_(), phrase=False)
+
+        path_dir = tempfile.mkdtemp()
+        self.dirs.append(path_dir)
+        ix = index.create_in(path_dir, Schema(**fields))
+        writer = ix.writer()
+        for id_page, title, text in self.DOCS:
+            document = {'id_page': id_page, 'title': title, 'text': text}
+            if bigrams:
+                document[WikiSearcher.bigram_field] = text
+            writer.add_document(**document)
+        writer.commit()
+        return WikiSearcher(ix, None)
+
+    def search(self, wiki_searcher, text, **settings):
+        """
+        return (id dei risultati, query eseguita dal searcher di whoosh)
+        """
+        with mock.patch.object(wiki_searcher.searcher, 'search', wraps=wiki_searcher.searcher.search) as search:
+            res = wiki_searcher.search(text, **dict(self.SETTINGS, **settings))
+        id_by_title = {title: id_page for id_page, title, _ in self.DOCS}
+        return [id_by_title[doc['title']] for doc in res['docs']], search.call_args[0][0]
+
+    def bigramTerms(self, query):
+        return {term for term in query.iter_all_terms() if term[0] == WikiSearcher.bigram_field}
+
+    def test_quoted_requires_bigrams(self):
+        ids, query = self.search(self.open(), '"roman empire"')
+        self.assertIsInstance(query, And)
+        self.assertEqual(self.bigramTerms(query), {(WikiSearcher.bigram_field, pairs('roman empire')[0])})
+        # il testo contiene il bigramma (3) oppure il titolo tutte le parole (1); non il 2
+        self.assertEqual(sorted(ids), ['1', '3'])
+
+    def test_unquoted_boosts_bigrams(self):
+        ids, query = self.search(self.open(), 'roman empire', group='OR')
+        self.assertIsInstance(query, AndMaybe)
+        self.assertEqual(self.bigramTerms(query), {(WikiSearcher.bigram_field, pairs('roman empire')[0])})
+        self.assertEqual(sorted(ids), ['1', '2', '3'])
+        self.assertEqual(ids[0], '3')
+
+    def test_disabled(self):
+        _, query = self.search(self.open(), 'roman empire', bigrams=False)
+        self.assertEqual(self.bigramTerms(query), set())
+
+    def test_single_word(self):
+        for text in ['empire', '"empire"', 'the empire']:
+            with self.subTest(text=text):
+                ids, query = self.search(self.open(), text)
+                self.assertEqual(self.bigramTerms(query), set())
+                self.assertEqual(sorted(ids), ['1', '2', '3'])
+
+    def test_no_bigram_field(self):
+        wiki_searcher = self.open(bigrams=False)
+        ids, query = self.search(wiki_searcher, 'roman empire', group='OR')
+        self.assertEqual(self.bigramTerms(query), set())
+        self.assertNotIsInstance(query, AndMaybe)
+        self.assertEqual(sorted(ids), ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BulkStemmingAnalyzer_ deve produrre gli stessi termini, gli stessi valori di 'field.index' e gli
+stessi token (posizioni e caratteri) di StemmingAnalyzer_, su un corpus fisso: casi limite
+dell'unicode e della tokenizzazione, testo simile a quello delle pagine e stringhe casuali con
+seme fisso.
+
+Uso:  python -m unittest tests.test_bulkAnalyzer
+"""
+
+import random
+import unittest
+
+from whoosh.fields import TEXT
+
+from indexing.analysis.analyzers import StemmingAnalyzer_, BulkStemmingAnalyzer_
+
+
+CORPUS = ['',
+          '   \n\t ',
+          'The quick brown foxes were running and jumping over the lazy dogs',
+          'İSTANBUL İstanbul KELVİN',
+          'ΟΔΟΣ ΣΑΣ Σ ΟΔΟΣ. ΌΣΟΣ-ΣΟΦΟΣ',
+          'U.S.A. a.b.c. e.g. 3.14 1.000.000 ..dot.. end.',
+          'snake_case __init__ _ __ foo_bar_ 2nd 10th',
+          'Straße STRASSE ǅungla ǄUNGLA ﬁnancial ﬃ',
+          'Ⅻ ½ ٣٤ 𝔘𝔫𝔦𝔠𝔬𝔡𝔢 ＦＵＬＬＷＩＤＴＨ',
+          'a I an on of in it is to be',
+          "don't can't it's rock'n'roll",
+          'Ab AB aB ab ABC ABCs',
+          'naïve café résumé NAÏVE CAFÉ',
+          '\x00 \x01 nul\x00byte',
+          'Rome is the capital city of Italy. It is also the capital of the Lazio region, the centre of '
+          'the Metropolitan City of Rome, and a special comune named Comune di Roma Capitale. With '
+          '2,860,009 residents in 1,285 km2 (496.1 sq mi), Rome is the country\'s most populated comune.',
+          'Fortifications were built in the 3rd century; the fortified walls (Aurelian Walls) surrounded '
+          'the seven hills.\n\nSee also: History of Rome, Roman Empire, Roman Republic.',
+          ]
+
+ALPHABET = 'aeiouAEIOUbcdlmnrsStTyY .._\'-0123456789ÉéİıΣσςßẞǅǄﬁ\x00 \n'
+
+
+def randomCases(n, seed):
+    """
+    :param n: numero di stringhe
+    :param seed: seme
+    return lista di stringhe casuali
+    """
+    rnd = random.Random(seed)
+    return [''.join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 60))) for _ in range(n)]
+
+
+def terms(analyzer, text, **kwargs):
+    return [token.text for token in analyzer(text, **kwargs) if not token.stopped]
+
+
+def tokens(analyzer, text):
+    return [(token.text, token.pos, token.startchar, token.endchar, token.stopped)
+            for token in analyzer(text, positions=True, chars=True, removestops=False, mode='query')]
+
+
+class BulkAnalyzerTest(unittest.TestCase):
+
+    def assertSameTerms(self, reference, bulk):
+        field_reference = TEXT(analyzer=reference, phrase=False)
+        field_bulk = TEXT(analyzer=bulk, phrase=False)
+
+        for text in CORPUS + randomCases(500, 0):
+            with self.subTest(text=text):
+                self.assertEqual(terms(bulk, text), terms(reference, text))
+                self.assertEqual(terms(bulk, text, mode='query'), terms(reference, text, mode='query'))
+                self.assertEqual(sorted(field_bulk.index(text)), sorted(field_reference.index(text)))
+                self.assertEqual(tokens(bulk, text), tokens(reference, text))
+
+    def test_default(self):
+        self.assertSameTerms(StemmingAnalyzer_(), BulkStemmingAnalyzer_())
+
+    def test_without_stoplist(self):
+        self.assertSameTerms(StemmingAnalyzer_(stoplist=None), BulkStemmingAnalyzer_(stoplist=None))
+
+    def test_sizes(self):
+        self.assertSameTerms(StemmingAnalyzer_(minsize=3, maxsize=8), BulkStemmingAnalyzer_(minsize=3, maxsize=8))
+
+
+if __name__ == '__main__':
+    unittest.main()
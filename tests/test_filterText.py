@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lo scanner di FilterWikiText ('getCleanedScanner') deve rimuovere gli stessi template, blocchi e
+link della pulizia con le regex ('getCleanedLegacy'), distinguendo maiuscole e minuscole come le regex.
+La rimozione dei contenuti ('strip') è accettata solo con lo scanner.
+
+Uso:  python -m unittest tests.test_filterText
+"""
+
+import os
+import unittest
+
+from indexing.xmlParsing.filterText import FilterWikiText
+
+
+# Casi senza template annidati, dove scanner e regex devono dare lo stesso testo
+CASES = ['Greeting {{Lang|fr|bonjour}} in French.',
+         'Place {{Coord|44|N|11|E}} here.',
+         'See {{cite web|URL=http://example.org|title=Page}} for more.',
+         '{{Infobox country\n| Language = Italian\n| capital = Rome\n}}\nItaly is a country.',
+         'Text {{lang|fr|bonjour}} more {{coord|1|2}} and {{cite web|url=a|title=b}} end.',
+         '{{Reflist}} {{reflist}} {{Commons category|X}} {{commons|X}}',
+         'A [[file:Foo.jpg|thumb|cap]] B [[File:Bar.png|thumb|cap]] C [[media:x.ogg]] D [[Media:y.ogg]]',
+         'X <Gallery>a.jpg</Gallery> Y <gallery>b.jpg</gallery> Z',
+         'See [HTTP://example.org link] and [http://example.org link] done.',
+         ]
+
+
+class ScannerLegacyTest(unittest.TestCase):
+
+    def test_same_output(self):
+        for text in CASES:
+            with self.subTest(text=text):
+                scanned, exceeded = FilterWikiText.getCleanedScanner(text)
+                self.assertFalse(exceeded)
+                self.assertEqual(scanned, FilterWikiText.getCleanedLegacy(text))
+
+    def test_keeps_capitalized_keys(self):
+        scanned, _ = FilterWikiText.getCleanedScanner(CASES[3])
+        self.assertIn('Language', scanned)
+        self.assertIn('Rome', scanned)
+
+
+class StripOptionsTest(unittest.TestCase):
+
+    PREFIXES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'files', 'prefixes.json')
+
+    def test_regex_rejects_strip(self):
+        with self.assertRaises(ValueError):
+            FilterWikiText(self.PREFIXES, cleaner='regex', strip=['infobox'])
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            FilterWikiText(self.PREFIXES, strip=['sidebar'])
+
+    def test_accepted(self):
+        self.assertIsNone(FilterWikiText(self.PREFIXES, cleaner='regex').strip)
+        self.assertIsNotNone(FilterWikiText(self.PREFIXES, cleaner='scanner', strip=['infobox']).strip)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache dei risultati (indexing/searching/resultCache.py): hit e miss, scadenza (TTL), eliminazione
+LRU, invalidazione quando cambia la versione, e versione di WikiSearcher (generazione del reader
+aperto e table del pagerank).
+
+Uso:  python -m unittest tests.test_resultCache
+"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from whoosh import index
+from whoosh.fields import Schema, ID, TEXT
+
+from indexing.searching import resultCache, searcher
+from indexing.searching.resultCache import ResultCache
+
+
+def result(title):
+    return {'time_second': 0.1, 'expanded': [], 'n_res': 1, 'cached': False,
+            'docs': [{'title': title, 'score': 1.0}]}
+
+
+def store(cache, key, title, version):
+    """
+    Come WikiSearcher.search: 'get' (miss) e poi 'put' con la stessa versione.
+    """
+    cache.get(key, version)
+    cache.put(key, result(title), version)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = ResultCache(maxsize=4, ttl=0)
+        key = ResultCache.key('roman  empire', limit=10, exp=False)
+
+        store(cache, key, 'Rome', 1)
+        self.assertEqual(cache.get(ResultCache.key(' roman empire ', limit=10, exp=False), 1)['docs'][0]['title'],
+                         'Rome')
+        self.assertIsNone(cache.get(ResultCache.key('roman empire', limit=20, exp=False), 1))
+
+        info = cache.info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (1, 2, 1))
+
+    def test_copy(self):
+        cache = ResultCache(maxsize=4, ttl=0)
+        store(cache, 'k', 'Rome', 1)
+        cache.get('k', 1)['docs'][0]['title'] = 'changed'
+        self.assertEqual(cache.get('k', 1)['docs'][0]['title'], 'Rome')
+
+    def test_ttl(self):
+        cache = ResultCache(maxsize=4, ttl=10)
+        with mock.patch.object(resultCache.time, 'monotonic', return_value=100.0):
+            store(cache, 'k', 'Rome', 1)
+        with mock.patch.object(resultCache.time, 'monotonic', return_value=105.0):
+            self.assertIsNotNone(cache.get('k', 1))
+        with mock.patch.object(resultCache.time, 'monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('k', 1))
+        self.assertEqual(cache.info()['expired'], 1)
+
+    def test_lru(self):
+        cache = ResultCache(maxsize=2, ttl=0)
+        store(cache, 'a', 'A', 1)
+        store(cache, 'b', 'B', 1)
+        cache.get('a', 1)
+        store(cache, 'c', 'C', 1)
+
+        self.assertIsNone(cache.get('b', 1))
+        self.assertIsNotNone(cache.get('a', 1))
+        self.assertIsNotNone(cache.get('c', 1))
+
+    def test_version(self):
+        cache = ResultCache(maxsize=4, ttl=0)
+        store(cache, 'k', 'Rome', 1)
+
+        self.assertIsNone(cache.get('k', 2))
+        self.assertEqual(cache.info()['invalidations'], 1)
+        # risultato di un searcher che non è più quello in uso
+        cache.put('k', result('Rome'), 1)
+        self.assertIsNone(cache.get('k', 2))
+
+
+class Ranker:
+
+    def __init__(self, version):
+        self.version = version
+
+
+class SearcherVersionTest(unittest.TestCase):
+
+    SETTINGS = {'exp': False, 'page_rank': False, 'bigrams': False}
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        schema = Schema(id_page=ID(stored=True, unique=True), title=TEXT(stored=True), text=TEXT(stored=True))
+        self.ix = index.create_in(self.dir, schema)
+        self.add('1', 'Rome', 'rome is the capital of italy')
+        self.cache = ResultCache(maxsize=16, ttl=0)
+
+        patcher = mock.patch.object(searcher, 'Expander')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.ix.close()
+        shutil.rmtree(self.dir)
+
+    def add(self, id_page, title, text):
+        writer = self.ix.writer()
+        writer.add_document(id_page=id_page, title=title, text=text)
+        writer.commit()
+
+    def open(self, ranker_version='rank-1'):
+        return searcher.WikiSearcher(self.ix, Ranker(ranker_version), None, self.cache)
+
+    def test_same_searcher_hits(self):
+        wiki_searcher = self.open()
+        self.assertFalse(wiki_searcher.search('capital', **self.SETTINGS)['cached'])
+        self.assertTrue(wiki_searcher.search('capital', **self.SETTINGS)['cached'])
+
+    def test_new_generation_misses(self):
+        old = self.open()
+        old.search('capital', **self.SETTINGS)
+        self.add('2', 'Paris', 'paris is the capital of france')
+
+        # il searcher aperto prima del commit legge ancora la vecchia generazione
+        new = self.open()
+        self.assertEqual(old.version[1], old.reader.generation())
+        self.assertLess(old.version[1], new.version[1])
+
+        res = new.search('capital', **self.SETTINGS)
+        self.assertFalse(res['cached'])
+        self.assertEqual(res['n_res'], 2)
+
+    def test_new_rank_table_misses(self):
+        self.open('rank-1').search('capital', **self.SETTINGS)
+        self.assertFalse(self.open('rank-2').search('capital', **self.SETTINGS)['cached'])
+
+    def test_weighting_keeps_reader(self):
+        wiki_searcher = self.open()
+        version = wiki_searcher.version
+        self.add('2', 'Paris', 'paris is the capital of france')
+        wiki_searcher.search('capital', weighting='TF_IDF', **self.SETTINGS)
+        self.assertEqual(wiki_searcher.version, version)
+        self.assertEqual(wiki_searcher.searcher.reader().generation(), version[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
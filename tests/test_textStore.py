@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lettura del file del testo (indexing/textStore.py): id passati come stringa o come intero, pagine
+ripetute, id non presenti, e ripresa di un file chiuso o interrotto ('append').
+
+Uso:  python -m unittest tests.test_textStore
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from indexing import textStore
+
+
+class TextStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, textStore.STORE_FILE)
+        with textStore.TextStoreWriter(self.path, chunk_docs=4) as writer:
+            for n in range(20):
+                writer.add(str(n * 3), 'text '+str(n))
+            writer.add('9', 'new 9')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get(self):
+        with textStore.TextStoreReader(self.path) as reader:
+            self.assertEqual(reader.get('0'), 'text 0')
+            self.assertEqual(reader.get('57'), 'text 19')
+            self.assertIsNone(reader.get('1'))
+            self.assertIsNone(reader.get('1000'))
+
+    def test_int_and_str_ids(self):
+        with textStore.TextStoreReader(self.path) as reader:
+            self.assertEqual(reader.get(57), reader.get('57'))
+            self.assertEqual(reader.get(9), 'new 9')
+
+    def test_repeated_page(self):
+        with textStore.TextStoreReader(self.path) as reader:
+            self.assertEqual(reader.get('9'), 'new 9')
+            items = list(reader.iterItems())
+        self.assertEqual(len(items), 20)
+        self.assertIn(('9', 'new 9'), items)
+
+    def test_append(self):
+        writer = textStore.TextStoreWriter(self.path, append=True)
+        writer.add('1', 'one')
+        writer.flush()
+        writer.fp.write(b'incomplete chunk')
+        writer.fp.close()
+
+        with textStore.TextStoreWriter(self.path, append=True) as writer:
+            writer.add('2', 'two')
+
+        with textStore.TextStoreReader(self.path) as reader:
+            self.assertEqual(reader.get('1'), 'one')
+            self.assertEqual(reader.get('2'), 'two')
+            self.assertEqual(reader.get('9'), 'new 9')
+
+
+if __name__ == '__main__':
+    unittest.main()